@@ -0,0 +1,267 @@
+"""
+Extraction benchmark: services/extraction.py (lxml, single pass) vs the previous
+BeautifulSoup/html.parser implementation, on a corpus of saved real news pages.
+
+    # Save real pages once, then benchmark offline. Either the latest N articles
+    # of every feed in NICHE_FEED_MAP, or your own list (one URL per line)
+    python -m benchmarks.bench_extraction --capture-feeds 3
+    python -m benchmarks.bench_extraction --capture urls.txt
+    python -m benchmarks.bench_extraction --repeat 5
+
+The corpus lives in benchmarks/corpus/ (git-ignored: pages are third-party content).
+Reports per-page CPU time (process_time, best of --repeat) and peak Python heap
+(tracemalloc) for both extractors, plus how closely they agree: text similarity
+(word-sequence ratio after whitespace normalization, and how many pages match exactly),
+and exact image and canonical URL matches.
+tracemalloc does not see libxml2's C allocations, so the lxml figure is the Python-side
+peak only; the tree-free design keeps libxml2's own footprint to its input buffer.
+"""
+import argparse
+import asyncio
+import difflib
+import hashlib
+import json
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import httpx
+from apify import Actor
+from bs4 import BeautifulSoup
+
+from src.models import ScrapedPage
+from src.services.context import MAX_CONTEXT_CHARS
+from src.services.extraction import BLOCK_TAGS, SKIP_TAGS, extract_page
+from src.services.feeds import NICHE_FEED_MAP, parse_feed
+from src.services.scraper import HEADERS
+from src.services.urls import resolve_canonical
+
+CORPUS_DIR = Path(__file__).parent / "corpus"
+
+def legacy_extract(html: bytes, page_url: str = "") -> ScrapedPage:
+    """The BeautifulSoup (html.parser) extractor the scraper used before services/extraction.py."""
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # 0. Canonical URL (rel=canonical > og:url), so variants of one article dedup to the same key
+    canonical = soup.find('link', rel='canonical') or soup.find('meta', property='og:url')
+    canonical_url = resolve_canonical(page_url, canonical.get('href') or canonical.get('content')) if canonical else None
+    
+    # 1. Scrape Image (OpenGraph > Twitter > JSON-LD > Body Heuristic)
+    image_url = None
+    
+    # 1.1 OpenGraph
+    og_image = soup.find('meta', property='og:image')
+    if og_image:
+        image_url = og_image.get('content')
+        
+    # 1.2 Twitter Card
+    if not image_url:
+        twitter_image = soup.find('meta', attrs={'name': 'twitter:image'})
+        if twitter_image:
+             image_url = twitter_image.get('content')
+             
+    # 1.3 JSON-LD (Schema.org)
+    if not image_url:
+        try:
+            scripts = soup.find_all('script', type='application/ld+json')
+            for script in scripts:
+                if not script.string: continue
+                try:
+                    data = json.loads(script.string)
+                except json.JSONDecodeError:
+                    continue
+                    
+                # Handle both list and dict logic (some schemas are arrays)
+                items = data if isinstance(data, list) else [data]
+                
+                for item in items:
+                    # Direct ImageObject or Article.image
+                    img = item.get('image')
+                    if img:
+                        if isinstance(img, str):
+                            image_url = img
+                            break
+                        elif isinstance(img, dict) and 'url' in img:
+                            image_url = img['url']
+                            break
+                        elif isinstance(img, list) and len(img) > 0:
+                            # Could be a list of strings or objects
+                            first = img[0]
+                            if isinstance(first, str):
+                                image_url = first
+                            elif isinstance(first, dict) and 'url' in first:
+                                image_url = first['url']
+                            break
+                    
+                    # Check nested "thumbnailUrl"
+                    thumb = item.get('thumbnailUrl')
+                    if thumb:
+                        image_url = thumb
+                        break
+                        
+                if image_url: break
+        except Exception as e:
+            Actor.log.debug(f"JSON-LD parsing error: {e}")
+
+    # 1.4 Body Heuristic (First large image)
+    if not image_url:
+         article = soup.find('article') or soup.find('main') or soup.find(class_=re.compile(r'post|article|content'))
+         if article:
+             images = article.find_all('img')
+             for img in images:
+                 src = img.get('src')
+                 # Filter out common small icons/pixels
+                 if src and not src.endswith('.svg') and 'icon' not in src.lower() and 'logo' not in src.lower():
+                     image_url = src
+                     break
+    
+    # Heuristics for article body
+    article_body = soup.find('article') or soup.find('main') or soup.find(class_=re.compile(r'content|post|article'))
+    
+    root = article_body or soup
+    for tag in root.find_all(list(SKIP_TAGS)):
+        tag.decompose()
+    for tag in root.find_all(list(BLOCK_TAGS)):
+        tag.insert_after('\n')
+    text = root.get_text(separator=' ')
+        
+    # Cleanup: collapse whitespace but keep paragraph breaks
+    clean_text = re.sub(r'[^\S\n]+', ' ', text)
+    clean_text = re.sub(r' ?\n[\s]*', '\n', clean_text).strip()
+    
+    # Quality check: if text is too short, it's likely a cookie wall or error
+    if len(clean_text) < 300:
+        Actor.log.warning(f"⚠️ Scraped content too short ({len(clean_text)} chars). Likely failed.")
+        return ScrapedPage(canonical_url=canonical_url)
+
+    # Safety cap only: token budgeting happens in reduce_context before the LLM call
+    return ScrapedPage(text=clean_text[:MAX_CONTEXT_CHARS], image_url=image_url, canonical_url=canonical_url)
+
+async def feed_article_urls(per_feed: int) -> list:
+    """Latest `per_feed` article links of every feed in NICHE_FEED_MAP (real pages the scraper sees)."""
+    feeds = list(dict.fromkeys(url for feed_map in NICHE_FEED_MAP.values() for url in feed_map.values()))
+    urls = []
+    async with httpx.AsyncClient(headers=HEADERS, follow_redirects=True, timeout=20.0) as client:
+        for feed_url in feeds:
+            try:
+                response = await client.get(feed_url)
+            except httpx.HTTPError as e:
+                print(f"skip feed {feed_url}: {e!r}")
+                continue
+            entries = parse_feed(response.content, response.headers).entries
+            urls.extend(entry.link for entry in entries[:per_feed] if entry.get("link"))
+    return list(dict.fromkeys(urls))
+
+async def capture(urls: list, corpus: Path):
+    """Downloads each URL into the corpus as <sha1>.html with a <sha1>.json sidecar (url, content-type)."""
+    corpus.mkdir(parents=True, exist_ok=True)
+    async with httpx.AsyncClient(headers=HEADERS, follow_redirects=True, timeout=20.0) as client:
+        for url in urls:
+            name = hashlib.sha1(url.encode()).hexdigest()[:16]
+            try:
+                response = await client.get(url)
+            except httpx.HTTPError as e:
+                print(f"skip {url}: {e!r}")
+                continue
+            if response.status_code != 200:
+                print(f"skip {url}: HTTP {response.status_code}")
+                continue
+            (corpus / f"{name}.html").write_bytes(response.content)
+            (corpus / f"{name}.json").write_text(json.dumps({"url": str(response.url), "content_type": response.headers.get("content-type")}))
+            print(f"saved {url} ({len(response.content) / 1024:.0f} KB)")
+
+def load_corpus(corpus: Path):
+    pages = []
+    for path in sorted(corpus.glob("*.html")):
+        meta_path = path.with_suffix(".json")
+        meta = json.loads(meta_path.read_text()) if meta_path.exists() else {}
+        pages.append((path.name, path.read_bytes(), meta.get("url", "")))
+    return pages
+
+def cpu_time(func, html: bytes, url: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.process_time()
+        func(html, url)
+        best = min(best, time.process_time() - start)
+    return best
+
+def peak_memory(func, html: bytes, url: str) -> int:
+    tracemalloc.start()
+    try:
+        func(html, url)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def summarize(name: str, times, peaks):
+    times_ms = sorted(t * 1000 for t in times)
+    p95 = times_ms[min(len(times_ms) - 1, int(len(times_ms) * 0.95))]
+    print(
+        f"{name:<10} cpu/page median {statistics.median(times_ms):7.2f} ms  p95 {p95:7.2f} ms  "
+        f"total {sum(times_ms):8.1f} ms  peak heap mean {statistics.mean(peaks) / 1024:8.0f} KB  max {max(peaks) / 1024:8.0f} KB"
+    )
+
+def text_similarity(old: str, new: str) -> float:
+    """Word-sequence similarity (difflib ratio) of two extracted texts, whitespace-insensitive."""
+    if not old and not new:
+        return 1.0
+    old_words, new_words = (old or "").split(), (new or "").split()
+    return difflib.SequenceMatcher(None, old_words, new_words, autojunk=False).ratio()
+
+def run(corpus: Path, repeat: int):
+    pages = load_corpus(corpus)
+    if not pages:
+        sys.exit(f"No pages in {corpus}. Save some first with --capture urls.txt")
+
+    implementations = {"legacy": legacy_extract, "lxml": extract_page}
+    times = {name: [] for name in implementations}
+    peaks = {name: [] for name in implementations}
+    agree = {"text": 0, "image": 0, "canonical": 0}
+    similarity = []
+
+    for filename, html, url in pages:
+        results = {}
+        for name, func in implementations.items():
+            results[name] = func(html, url)
+            times[name].append(cpu_time(func, html, url, repeat))
+            peaks[name].append(peak_memory(func, html, url))
+        old, new = results["legacy"], results["lxml"]
+        similarity.append(text_similarity(old.text, new.text))
+        agree["text"] += (old.text or "").split() == (new.text or "").split()
+        agree["image"] += old.image_url == new.image_url
+        agree["canonical"] += old.canonical_url == new.canonical_url
+
+    total_kb = sum(len(html) for _, html, _ in pages) / 1024
+    print(f"{len(pages)} pages, {total_kb:.0f} KB, best of {repeat} runs")
+    for name in implementations:
+        summarize(name, times[name], peaks[name])
+    speedup = sum(times["legacy"]) / max(sum(times["lxml"]), 1e-9)
+    print(f"speedup   {speedup:.1f}x CPU")
+    print(
+        f"text      similarity mean {statistics.mean(similarity):.3f}  min {min(similarity):.3f}  "
+        f"pages >= 0.95: {sum(r >= 0.95 for r in similarity)}/{len(pages)}"
+    )
+    print("exact     " + ", ".join(f"{k} {v}/{len(pages)}" for k, v in agree.items()))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=Path, default=CORPUS_DIR, help="Directory of saved .html pages")
+    parser.add_argument("--capture", type=Path, help="File with one URL per line to download into the corpus")
+    parser.add_argument("--capture-feeds", type=int, metavar="N", help="Download the latest N articles of every configured feed into the corpus")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing runs per page (best is kept)")
+    args = parser.parse_args()
+
+    if args.capture:
+        urls = [u.strip() for u in args.capture.read_text().splitlines() if u.strip() and not u.startswith("#")]
+        asyncio.run(capture(urls, args.corpus))
+    if args.capture_feeds:
+        urls = asyncio.run(feed_article_urls(args.capture_feeds))
+        asyncio.run(capture(urls, args.corpus))
+    run(args.corpus, args.repeat)
+
+if __name__ == "__main__":
+    main()
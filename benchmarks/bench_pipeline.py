@@ -0,0 +1,388 @@
+"""
+Offline end-to-end benchmark: runs the real `src.main.main()` against local stand-ins for
+every external service and reports throughput, per-stage latency and round-trips.
+
+    python -m benchmarks.bench_pipeline
+    python -m benchmarks.bench_pipeline --feeds 12 --items 20 --max-articles 100 --streaming
+    python -m benchmarks.bench_pipeline --llm-latency 1.5 --llm-429-rate 0.1 --page-fail-rate 0.2
+
+Stand-ins (aiohttp, on their own event-loop thread so they don't compete with the pipeline):
+  RSS        /feeds/<n>.xml          --feeds feeds of --items entries, --feed-latency
+  Pages      /article/<feed>-<item>  pages from benchmarks/corpus/ (see bench_extraction --capture),
+                                     synthetic ones if the corpus is empty; --hosts loopback hosts
+                                     (127.0.0.1..N) so per-host limits apply as with real sites
+  OpenAI     /v1/chat/completions    --llm-latency, --llm-429-rate (429 + Retry-After / x-ratelimit-*)
+  Brave      /res/v1/*/search        web and image search
+  PostgREST  /rest/v1/<table>        empty tables: selects return [], writes are acknowledged
+
+The pipeline finds them through OPENROUTER_BASE_URL, BRAVE_API_BASE and SUPABASE_URL, and
+NICHE_FEED_MAP is pointed at the RSS stand-in. Every run uses a fresh local storage directory,
+so persistent caches start cold. Latencies are the pipeline's own METRICS (src/services/metrics.py).
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from collections import Counter
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List
+
+from aiohttp import web
+
+CORPUS_DIR = Path(__file__).parent / "corpus"
+
+WORDS = (
+    "grid solar tariff launch studio console token exchange funding round court minister budget "
+    "league transfer vehicle property market mining strike rand inflation drought harbour rail "
+    "airline vaccine clinic school festival award release patch server outage merger listing "
+    "pipeline refinery turbine battery charger satellite drone robot chip factory warehouse port "
+    "election coalition protest tender audit fraud arrest verdict appeal stadium coach record"
+).split()
+
+def stable_hash(value) -> int:
+    """Same value -> same number in every process (builtin hash() of str is salted per run)."""
+    return zlib.crc32(str(value).encode())
+
+# Rough shape of a real analysis (crime fields included so entity/incident writes are exercised)
+def fake_analysis(seed: int) -> dict:
+    rng = random.Random(seed)
+    return {
+        "sentiment": rng.choice(["High Hype", "Neutral", "Low Hype"]),
+        "category": rng.choice(["Launch", "Policy", "Markets", "Incident"]),
+        "key_entities": [rng.choice(WORDS).title() for _ in range(3)],
+        "summary": " ".join(rng.choice(WORDS) for _ in range(40)).capitalize() + ".",
+        "location": "Johannesburg",
+        "city": "Johannesburg",
+        "country": "South Africa",
+        "is_south_africa": True,
+        "people": [{"name": f"Person {rng.randint(1, 40)}", "role": "Official", "status": None}],
+        "organizations": [{"name": f"Org {rng.randint(1, 25)}", "type": "Company"}],
+    }
+
+class StubServices:
+    """All stand-in servers plus their request counters."""
+
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.counts: Counter = Counter()
+        self.llm_prompt_chars = 0
+        self.pages = self._load_pages()
+        self.loop = asyncio.new_event_loop()
+        self.runners: List[web.AppRunner] = []
+        self.ports: Dict[str, int] = {}
+
+    # --- Content ---
+
+    def _load_pages(self) -> List[bytes]:
+        pages = []
+        for path in sorted(CORPUS_DIR.glob("*.html")) if CORPUS_DIR.exists() else []:
+            html = path.read_bytes()
+            # Saved pages declare their real URL; every stand-in article must stay distinct
+            html = re.sub(rb'<link[^>]+rel=["\']?canonical[^>]*>', b"", html, flags=re.I)
+            html = re.sub(rb'<meta[^>]+og:url[^>]*>', b"", html, flags=re.I)
+            pages.append(html)
+        return pages
+
+    def _synthetic_page(self, key: str) -> bytes:
+        rng = random.Random(key)
+        title = " ".join(rng.choice(WORDS) for _ in range(7)).title()
+        paragraphs = "".join(
+            "<p>" + " ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 90))).capitalize() + ".</p>"
+            for _ in range(rng.randint(6, 14))
+        )
+        return (
+            f'<html><head><title>{title}</title><meta property="og:image" content="https://img.example/{key}.jpg">'
+            f'</head><body><nav><a href="/">Home</a></nav><article><h1>{title}</h1>{paragraphs}</article>'
+            f'<footer>© Example Media</footer></body></html>'
+        ).encode()
+
+    def _title(self, feed: int, item: int) -> str:
+        rng = random.Random(f"{self.args.seed}-{feed}-{item}")
+        return " ".join(rng.choice(WORDS) for _ in range(8)).capitalize() + f" ({feed}.{item})"
+
+    # --- Handlers ---
+
+    async def _delay(self, seconds: float):
+        if seconds > 0:
+            await asyncio.sleep(seconds * self.rng.uniform(0.5, 1.5))
+
+    async def feed(self, request: web.Request) -> web.Response:
+        self.counts["rss"] += 1
+        await self._delay(self.args.feed_latency)
+        feed = int(request.match_info["feed"])
+        now = datetime.now(timezone.utc)
+        items = []
+        for item in range(self.args.items):
+            host = f"127.0.0.{(feed + item) % self.args.hosts + 1}"
+            link = f"http://{host}:{self.ports['pages']}/article/{feed}-{item}"
+            items.append(
+                f"<item><title>{self._title(feed, item)}</title><link>{link}</link><guid>{link}</guid>"
+                f"<pubDate>{format_datetime(now - timedelta(minutes=5 * item + feed))}</pubDate>"
+                f"<description>{self._title(feed, item)} and more.</description></item>"
+            )
+        body = (
+            '<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>'
+            f"<title>Bench feed {feed}</title><link>http://127.0.0.1/</link><description>bench</description>"
+            + "".join(items) + "</channel></rss>"
+        )
+        return web.Response(text=body, content_type="application/rss+xml")
+
+    async def article(self, request: web.Request) -> web.Response:
+        self.counts["pages"] += 1
+        await self._delay(self.args.page_latency)
+        key = request.match_info["key"]
+        if self.rng.random() < self.args.page_fail_rate:
+            return web.Response(status=403, text="Forbidden")
+        body = self.pages[stable_hash(key) % len(self.pages)] if self.pages else self._synthetic_page(key)
+        self.counts["pages_served"] += 1
+        return web.Response(body=body, content_type="text/html")
+
+    async def chat(self, request: web.Request) -> web.Response:
+        self.counts["llm"] += 1
+        payload = await request.json()
+        user = payload["messages"][-1]["content"]
+        self.llm_prompt_chars += sum(len(m["content"]) for m in payload["messages"])
+        await self._delay(self.args.llm_latency)
+
+        if self.rng.random() < self.args.llm_429_rate:
+            self.counts["llm_429"] += 1
+            reset_ms = int((time.time() + 1) * 1000)
+            return web.json_response(
+                {"error": {"message": "Rate limit exceeded: free-models-per-min", "code": 429}},
+                status=429,
+                headers={"retry-after": "1", "x-ratelimit-remaining": "0", "x-ratelimit-reset": str(reset_ms)}
+            )
+
+        ids = re.findall(r"^### ARTICLE (\S+)", user, re.M)
+        if ids:
+            content = {"results": [{**fake_analysis(stable_hash(i)), "article_id": i} for i in ids]}
+        else:
+            content = fake_analysis(stable_hash(user[:200]))
+        return web.json_response({
+            "id": f"bench-{self.counts['llm']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "bench"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": json.dumps(content)}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(user) // 4, "completion_tokens": 200, "total_tokens": len(user) // 4 + 200},
+        }, headers={"x-ratelimit-remaining": "1000"})
+
+    async def brave(self, request: web.Request) -> web.Response:
+        kind = request.match_info["kind"]
+        self.counts[f"brave_{kind}"] += 1
+        await self._delay(self.args.search_latency)
+        headers = {"X-RateLimit-Remaining": "1, 1999", "X-RateLimit-Reset": "1, 86400"}
+        query = request.query.get("q", "")
+        if kind == "images":
+            return web.json_response({"results": [{"properties": {"url": f"https://img.example/{stable_hash(query)}.jpg"}}]}, headers=headers)
+        results = [
+            {"title": f"{query} ({n})", "description": " ".join(self.rng.choice(WORDS) for _ in range(30)),
+             "extra_snippets": [" ".join(self.rng.choice(WORDS) for _ in range(20))]}
+            for n in range(5)
+        ]
+        return web.json_response({"web": {"results": results}}, headers=headers)
+
+    async def postgrest(self, request: web.Request) -> web.Response:
+        table = request.match_info["table"]
+        schema = request.headers.get("Content-Profile") or request.headers.get("Accept-Profile") or "public"
+        self.counts["db"] += 1
+        self.counts[f"db {request.method} {schema}.{table}"] += 1
+        await self._delay(self.args.db_latency)
+        if request.method == "GET":
+            return web.json_response([])
+        if request.method == "POST":
+            rows = await request.json()
+            rows = rows if isinstance(rows, list) else [rows]
+            return web.json_response([{**row, "id": self.counts["db"] * 1000 + n} for n, row in enumerate(rows)], status=201)
+        return web.json_response([])
+
+    # --- Lifecycle ---
+
+    async def _serve(self, name: str, app: web.Application, hosts: List[str]):
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        port = self.ports.get(name, 0)
+        for host in hosts:
+            site = web.TCPSite(runner, host, port)
+            await site.start()
+            port = port or site._server.sockets[0].getsockname()[1]
+        self.ports[name] = port
+        self.runners.append(runner)
+
+    async def _start(self):
+        rss = web.Application()
+        rss.router.add_get("/feeds/{feed}.xml", self.feed)
+        pages = web.Application()
+        pages.router.add_get("/article/{key}", self.article)
+        llm = web.Application(client_max_size=16 * 1024 * 1024)
+        llm.router.add_post("/v1/chat/completions", self.chat)
+        brave = web.Application()
+        brave.router.add_get("/res/v1/{kind}/search", self.brave)
+        db = web.Application(client_max_size=16 * 1024 * 1024)
+        db.router.add_route("*", "/rest/v1/{table}", self.postgrest)
+
+        await self._serve("rss", rss, ["127.0.0.1"])
+        await self._serve("pages", pages, [f"127.0.0.{n + 1}" for n in range(self.args.hosts)])
+        await self._serve("llm", llm, ["127.0.0.1"])
+        await self._serve("brave", brave, ["127.0.0.1"])
+        await self._serve("db", db, ["127.0.0.1"])
+
+    def start(self):
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        asyncio.run_coroutine_threadsafe(self._start(), self.loop).result()
+
+    def stop(self):
+        async def cleanup():
+            for runner in self.runners:
+                await runner.cleanup()
+        asyncio.run_coroutine_threadsafe(cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+def configure_environment(stubs: StubServices, storage: Path, actor_input: dict):
+    """Points the pipeline at the stand-ins. Must run before src.* is imported."""
+    os.environ.update({
+        "OPENROUTER_API_KEY": "bench",
+        "OPENROUTER_BASE_URL": f"http://127.0.0.1:{stubs.ports['llm']}/v1",
+        "BRAVE_API_KEY": "bench",
+        "BRAVE_API_BASE": f"http://127.0.0.1:{stubs.ports['brave']}/res/v1",
+        "SUPABASE_URL": f"http://127.0.0.1:{stubs.ports['db']}",
+        "SUPABASE_KEY": "bench-service-key",
+        "CRAWLEE_STORAGE_DIR": str(storage),
+        "APIFY_LOCAL_STORAGE_DIR": str(storage),
+    })
+    for name in ("BRAVE_FREE_AI", "BRAVE_BASE_KEY", "SUPABASE_SERVICE_ROLE_KEY", "SUPABASE_ANON_KEY"):
+        os.environ.pop(name, None)
+    input_dir = storage / "key_value_stores" / "default"
+    input_dir.mkdir(parents=True, exist_ok=True)
+    (input_dir / "INPUT.json").write_text(json.dumps(actor_input))
+
+async def run_pipeline(stubs: StubServices, niche: str) -> float:
+    """Runs the real Actor entry point once. Returns wall-clock seconds."""
+    feeds = importlib.import_module("src.services.feeds")
+    feeds.NICHE_FEED_MAP.clear()
+    feeds.NICHE_FEED_MAP[niche] = {
+        f"bench-{n}": f"http://127.0.0.1:{stubs.ports['rss']}/feeds/{n}.xml" for n in range(stubs.args.feeds)
+    }
+    main = importlib.import_module("src.main").main
+
+    started = time.perf_counter()
+    try:
+        await main()
+    except SystemExit:
+        # Actor.exit() ends the process after a run; the report comes after it
+        pass
+    return time.perf_counter() - started
+
+def report(args, stubs: StubServices, storage: Path, elapsed: float) -> dict:
+    metrics = importlib.import_module("src.services.metrics").METRICS
+    dataset = storage / "datasets" / "default"
+    records = len([p for p in dataset.glob("*.json") if not p.name.startswith("__")]) if dataset.exists() else 0
+
+    stages = {
+        label.replace("call=", "").replace(",stage=", " @ "): summary
+        for label, summary in sorted(metrics.summary("stage_seconds").items())
+    }
+    round_trips = dict(sorted(stubs.counts.items()))
+    scraped = importlib.import_module("src.services.scraper").SCRAPE_STATS["pages"]
+
+    # A run that never reads a page still reports scrape timings (every article goes to the
+    # search fallback), so say so instead of letting the numbers pass for a real result
+    warnings = []
+    if records and args.page_fail_rate < 1 and (not stubs.counts["pages_served"] or not scraped):
+        warnings.append(
+            f"no article page was scraped ({stubs.counts['pages']} requested, {stubs.counts['pages_served']} served, "
+            f"{scraped} read): every article used the search fallback"
+        )
+    return {
+        "records": records,
+        "elapsed_s": round(elapsed, 2),
+        "articles_per_s": round(records / elapsed, 2) if elapsed else 0.0,
+        "stages": stages,
+        "llm_models": metrics.summary("llm_request_seconds"),
+        "db_tables": metrics.summary("db_seconds"),
+        "cache_hit_rate": metrics.hit_rates(),
+        "round_trips": round_trips,
+        "llm_prompt_chars": stubs.llm_prompt_chars,
+        "pages_scraped": scraped,
+        "warnings": warnings,
+    }
+
+def print_report(result: dict):
+    print(f"\n📊 {result['records']} records in {result['elapsed_s']}s = {result['articles_per_s']} articles/s")
+    for title, rows in (("stage call", result["stages"]), ("llm model", result["llm_models"]), ("db table", result["db_tables"])):
+        print(f"\n{title:<56}{'calls':>7}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+        for label, s in rows.items():
+            print(f"{label:<56}{s['count']:>7}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['max_ms']:>10}")
+    if result["cache_hit_rate"]:
+        print("\nCache hit rate: " + ", ".join(f"{cache} {rate:.0%}" for cache, rate in result["cache_hit_rate"].items()))
+    print("\nRound-trips:")
+    for name, count in result["round_trips"].items():
+        print(f"  {name:<48}{count:>6}")
+    print(f"\nLLM prompt characters: {result['llm_prompt_chars']:,}")
+    print(f"Pages scraped: {result['pages_scraped']}")
+    for warning in result["warnings"]:
+        print(f"\n⚠️⚠️⚠️ BENCHMARK INVALID: {warning}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--feeds", type=int, default=8)
+    parser.add_argument("--items", type=int, default=15, help="entries per feed")
+    parser.add_argument("--max-articles", type=int, default=40)
+    parser.add_argument("--hosts", type=int, default=4, help="loopback hosts serving article pages")
+    parser.add_argument("--feed-latency", type=float, default=0.2)
+    parser.add_argument("--page-latency", type=float, default=0.15)
+    parser.add_argument("--page-fail-rate", type=float, default=0.1, help="share of pages answering 403 (search fallback)")
+    parser.add_argument("--llm-latency", type=float, default=0.8)
+    parser.add_argument("--llm-429-rate", type=float, default=0.05)
+    parser.add_argument("--search-latency", type=float, default=0.3)
+    parser.add_argument("--db-latency", type=float, default=0.03)
+    parser.add_argument("--streaming", action="store_true", help="run with streamingMode")
+    parser.add_argument("--input", type=json.loads, default={}, help="extra Actor input as JSON, e.g. '{\"llmBatchSize\": 4}'")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--keep-storage", action="store_true")
+    args = parser.parse_args()
+
+    niche = "gaming"
+    actor_input = {
+        "niche": niche,
+        "source": "all",
+        "maxArticles": args.max_articles,
+        "streamingMode": args.streaming,
+        "enableBraveImageBackfill": True,
+        "resumeInterruptedRuns": False,
+        **args.input,
+    }
+
+    stubs = StubServices(args)
+    stubs.start()
+    storage = Path(tempfile.mkdtemp(prefix="bench-pipeline-"))
+    try:
+        configure_environment(stubs, storage, actor_input)
+        elapsed = asyncio.run(run_pipeline(stubs, niche))
+        result = report(args, stubs, storage, elapsed)
+    finally:
+        stubs.stop()
+        if not args.keep_storage:
+            shutil.rmtree(storage, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+    return 0 if result["records"] and not result["warnings"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+"""In-memory stand-in for the Supabase client, shared by the write-path tests (no network)."""
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+class FakeQuery:
+    def __init__(self, db, table):
+        self.db, self.table, self.op, self.payload = db, table, None, None
+        self.column, self.values = None, None
+
+    def select(self, columns):
+        self.op = "select"
+        return self
+
+    def insert(self, rows):
+        self.op, self.payload = "insert", rows
+        return self
+
+    def upsert(self, rows, on_conflict=None):
+        self.op, self.payload = "upsert", rows
+        return self
+
+    def update(self, data):
+        self.op, self.payload = "update", data
+        return self
+
+    def in_(self, column, values):
+        self.column, self.values = column, values
+        return self
+
+    def execute(self):
+        written = self.payload if self.op in ("insert", "upsert") else []
+        self.db.calls.append((self.table, self.op, len(written)))
+        rows = self.db.rows.setdefault(self.table, [])
+        if self.op == "select":
+            return FakeResponse([r for r in rows if r[self.column] in self.values])
+        if any(row.get("bad") for row in written):
+            raise RuntimeError("violates check constraint")
+        new = [{**row, "id": len(rows) + i + 1} for i, row in enumerate(written)]
+        rows.extend(new)
+        return FakeResponse(new)
+
+class FakeClient:
+    """`calls` records (table, op, rows written) per round-trip; `rows` holds every table's rows."""
+
+    def __init__(self, rows=None):
+        self.calls, self.rows = [], rows or {}
+
+    def schema(self, name):
+        return self
+
+    def table(self, name):
+        return FakeQuery(self, name)
@@ -0,0 +1,94 @@
+"""
+One-time migration to canonical URL keys (see src/services/urls.py).
+
+Rows written before canonical keys still carry the feed's raw link (tracking parameters,
+trailing slashes, http/www/AMP variants) and feed_items rows hashed title + url. Runs now look
+up canonicalize_url() / dedup_hash(), so without this those articles are scraped and analyzed
+once more and stored as a second row.
+
+For every content table the url/source_url column is rewritten to its canonical form, and
+feed_items.dedup_hash is recomputed from the row's url. Where a row already exists under the
+canonical key, the older variant is deleted.
+
+Dry run by default:  python migrate_canonical_urls.py [--apply]
+"""
+import argparse
+from src.services.ingestor import SupabaseIngestor
+from src.services.urls import canonicalize_url, dedup_hash
+
+PAGE_SIZE = 1000
+NICHES = [
+    "general", "energy", "motoring", "brics", "gaming", "crypto", "tech", "nuclear", "education",
+    "foodtech", "health", "luxury", "realestate", "retail", "social", "vc", "semiconductors",
+    "politics", "sport", "crime",
+]
+
+def content_tables(ingestor: SupabaseIngestor) -> list:
+    """(schema, table, key column, key function) of every table keyed by article URL, then feed_items."""
+    tables = {ingestor._get_target_table(niche) for niche in NICHES}
+    tables.add(("crime_intelligence", "incidents"))
+    keyed = [
+        (schema, table, "source_url" if table in ("election_news", "incidents") else "url", canonicalize_url)
+        for schema, table in sorted(tables)
+    ]
+    keyed.append(("ai_intelligence", "feed_items", "dedup_hash", None))
+    return keyed
+
+def load_rows(client, schema: str, table: str, columns: str) -> list:
+    rows, start = [], 0
+    while True:
+        res = client.schema(schema).table(table).select(columns).range(start, start + PAGE_SIZE - 1).execute()
+        rows.extend(res.data)
+        if len(res.data) < PAGE_SIZE:
+            return rows
+        start += PAGE_SIZE
+
+def migrate_table(client, schema: str, table: str, column: str, key_of, apply: bool) -> tuple:
+    """Returns (rewritten, deleted) row counts."""
+    if key_of is None:
+        # feed_items: the key is derived from the url column
+        rows = load_rows(client, schema, table, "dedup_hash,url")
+        pairs = [(row["dedup_hash"], dedup_hash(row["url"])) for row in rows if row.get("url")]
+    else:
+        rows = load_rows(client, schema, table, column)
+        pairs = [(row[column], key_of(row[column])) for row in rows if row.get(column)]
+
+    existing = {old for old, _ in pairs}
+    rewritten = deleted = 0
+    for old, new in pairs:
+        if old == new:
+            continue
+        query = client.schema(schema).table(table)
+        if new in existing:
+            deleted += 1
+            if apply:
+                query.delete().eq(column, old).execute()
+        else:
+            rewritten += 1
+            existing.add(new)
+            if apply:
+                query.update({column: new}).eq(column, old).execute()
+        existing.discard(old)
+    return rewritten, deleted
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apply", action="store_true", help="write the changes (default: report only)")
+    args = parser.parse_args()
+
+    ingestor = SupabaseIngestor()
+    client = ingestor.supabase
+    if client is None:
+        raise SystemExit("SUPABASE_URL / SUPABASE_KEY are required.")
+
+    for schema, table, column, key_of in content_tables(ingestor):
+        try:
+            rewritten, deleted = migrate_table(client, schema, table, column, key_of, args.apply)
+        except Exception as e:
+            print(f"⚠️ {schema}.{table}: {e}")
+            continue
+        verb = "" if args.apply else " (dry run)"
+        print(f"✅ {schema}.{table}: {rewritten} keys rewritten, {deleted} duplicate rows deleted{verb}")
+
+if __name__ == "__main__":
+    main()
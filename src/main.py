@@ -1,203 +1,91 @@
 import asyncio
-from typing import TypedDict, List
+import operator
+from typing import Annotated, TypedDict, List
 from apify import Actor
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END
+from langgraph.types import Send
 import os 
 
-from .models import InputConfig, ArticleCandidate, DatasetRecord, AnalysisResult
-from .services.feeds import fetch_feed_data
-from .services.scraper import scrape_article_content
-from .services.search import brave_search_fallback, find_relevant_image
-from .services.llm import analyze_content
-from .services.notifications import send_discord_alert
-from .services.ingestor import SupabaseIngestor
+from .models import InputConfig, ArticleCandidate
+from .services.feeds import fetch_feed_data, stream_feed_data
+from .services.cache import FeedCache
+from .services.pipeline import ArticlePipeline, dedup_articles
 
 # --- State Definition ---
 class WorkflowState(TypedDict):
     config: InputConfig
-    articles: List[ArticleCandidate]
-    current_index: int
+    articles: List[ArticleCandidate] # Written by fetch_feeds/dedup, never updated per article
+    processed: Annotated[int, operator.add]
+
+class ArticleState(TypedDict):
+    """Payload of a single fan-out branch. Carries only its own article."""
+    config: InputConfig
+    article: ArticleCandidate
+    position: int
+    total: int
 
 # --- Nodes ---
 
-async def fetch_feeds_node(state: WorkflowState):
+async def fetch_feeds_node(state: WorkflowState, config: RunnableConfig):
     """Initializes, fetches RSS data, and buffers to Supabase."""
-    config = state['config']
-    articles = fetch_feed_data(config)
+    pipeline: ArticlePipeline = config["configurable"]["pipeline"]
+    cfg = state['config']
+    # Restarted run: continue the interrupted queue instead of fetching again
+    resumed = await pipeline.resume()
+    if resumed is not None:
+        return {"articles": resumed}
+
+    feed_cache = None if cfg.runTestMode else await FeedCache.load()
+    articles = await fetch_feed_data(cfg, feed_cache)
+    if feed_cache is not None:
+        await feed_cache.save()
     
     # Pre-processing: Buffer raw articles to traceability table
-    ingestor = SupabaseIngestor()
-    await ingestor.ingest_raw_feed_items(articles)
+    await pipeline.ingestor.ingest_raw_feed_items(articles)
     
     Actor.log.info(f"📚 Queued and Buffered {len(articles)} articles.")
-    return {"articles": articles, "current_index": 0}
-
-async def process_article_node(state: WorkflowState):
-    """The Core Logic: Scrape -> Fallback -> AI -> Save"""
-    config = state['config']
-    idx = state['current_index']
+    return {"articles": articles}
+
+async def dedup_node(state: WorkflowState, config: RunnableConfig):
+    """Bulk pre-pass: drops articles whose URL already exists in their target table."""
+    pipeline: ArticlePipeline = config["configurable"]["pipeline"]
+    articles = await dedup_articles(state['articles'], state['config'], pipeline.ingestor)
+    pipeline.track(articles)
+    return {"articles": articles}
+
+async def stream_articles_node(state: WorkflowState, config: RunnableConfig):
+    """Streaming mode: fetch, dedup, select and process overlap instead of running as phases."""
+    pipeline: ArticlePipeline = config["configurable"]["pipeline"]
+    cfg = state['config']
+    resumed = await pipeline.resume()
+    if resumed is not None:
+        await pipeline.run(resumed)
+        return {"processed": len(resumed)}
+
+    feed_cache = None if cfg.runTestMode else await FeedCache.load()
+    processed = await pipeline.run_stream(stream_feed_data(cfg, feed_cache))
+    if feed_cache is not None:
+        await feed_cache.save()
+    return {"processed": processed}
+
+def fan_out_articles(state: WorkflowState):
+    """Map step: one parallel branch per article, all in the same graph super-step."""
     articles = state['articles']
-    
-    if idx >= len(articles):
-        return {"current_index": idx} 
-
-    article = articles[idx]
-    Actor.log.info(f"👉 [{idx+1}/{len(articles)}] Processing: {article.title}")
-
-    # Initialize Ingestor
-    ingestor = SupabaseIngestor()
-
-    # 0. STRATEGY: Deduplication Check
-    # Determine table based on article niche or config niche
-    article_niche = getattr(article, 'niche', None) or config.niche
-    # If niche is 'all', specific article niche should be set. If not, fallback to general.
-    if article_niche == 'all':
-        article_niche = 'general' 
-
-    # Check for existing unless Force Refresh is ON
-    if not config.runTestMode and not config.forceRefresh:
-        exists = ingestor.check_exists(article.url, niche=article_niche)
-        if exists:
-            Actor.log.info(f"⏭️ Skipping duplicate: {article.title}")
-            return {"current_index": idx + 1}
-
-    # 1. STRATEGY: Scrape First
-    context, scraped_image = scrape_article_content(article.url, config.runTestMode)
-    method = "scraped"
-    
-    # Image Priority: Feed > Scraped > Brave Backfill
-    final_image_url = article.image_url or scraped_image
-
-    # 2. STRATEGY: Search Fallback
-    if not context:
-        Actor.log.info("⚠️ Scraping failed/blocked. Engaging Brave Search Fallback.")
-        context = brave_search_fallback(article.title, config.runTestMode)
-        method = "search_fallback"
-        
-    # 3. STRATEGY: Brave Image Backfill (If enabled and still no image)
-    if not final_image_url and config.enableBraveImageBackfill:
-         Actor.log.info(f"🖼️ Backfilling image for: {article.title}")
-         final_image_url = find_relevant_image(article.title, config.runTestMode)
-
-    # 3. STRATEGY: AI Analysis
-    if context:
-        try:
-            analysis = analyze_content(context, niche=article_niche, run_test_mode=config.runTestMode)
-            
-            # --- DYNAMIC ROUTING ---
-            # If the LLM detects a better niche, we re-route.
-            if analysis.detected_niche:
-                valid_niches = ['general', 'gaming', 'crypto', 'tech', 'nuclear', 'energy', 'education', 'foodtech', 'health', 'luxury', 'realestate', 'retail', 'social', 'vc', 'brics', 'politics', 'crime', 'sport', 'business', 'semiconductors']
-                clean_detected = analysis.detected_niche.lower().strip()
-                if clean_detected in valid_niches and clean_detected != article_niche:
-                    Actor.log.info(f"🔀 Re-routing article: '{article_niche}' -> '{clean_detected}'")
-                    article_niche = clean_detected
-            
-            # 4. 💰 MONETIZATION 💰
-            # We charge the user only when the 'summarize_snippets_with_llm' event succeeds.
-            if not config.runTestMode:
-                await Actor.charge(event_name="summarize_snippets_with_llm") 
-
-            if analysis.sentiment == "Error" or "Analysis failed: <html>" in str(analysis.summary):
-                Actor.log.warning(f"⚠️ Analysis returned Error, skipping ingestion to DB: {article.title}")
-                # We still update the feed item status to reflect the error
-                await ingestor._update_feed_item_status(analysis, article)
-            else:
-                # 5. INGESTION (to Feed Items & Specific Tables)
-                await ingestor.ingest(analysis, article)
-            
-            # Create Dataset Record (Standardized)
-            record = DatasetRecord(
-                niche=article_niche, # Use specific niche
-                source_feed=article.source,
-                title=article.title,
-                url=article.url,
-                image_url=final_image_url,
-                published=article.published,
-                method=method,
-                sentiment=analysis.sentiment,
-                category=analysis.category,
-                key_entities=analysis.key_entities,
-                ai_summary=analysis.summary,
-                location=analysis.location,
-                city=analysis.city,
-                country=analysis.country,
-                is_south_africa=analysis.is_south_africa,
-                raw_context_source=context[:200] + "...",
-
-                # Rich Data (Dicts for dataset compatibility)
-                incidents=[i.model_dump() for i in analysis.incidents] if analysis.incidents else None,
-                people=[p.model_dump() for p in analysis.people] if analysis.people else None,
-                organizations=[o.model_dump() for o in analysis.organizations] if analysis.organizations else None,
-
-                # Niche Specific Mapping
-                game_studio=analysis.game_studio,
-                game_genre=analysis.game_genre,
-                platform=analysis.platform,
-                release_status=analysis.release_status,
-                
-                property_type=analysis.property_type,
-                listing_price=analysis.listing_price,
-                sqft=analysis.sqft,
-                market_status=analysis.market_status,
-                
-                company_name=analysis.company_name,
-                round_type=analysis.round_type,
-                funding_amount=analysis.funding_amount,
-                investor_list=analysis.investor_list,
-                
-                token_symbol=analysis.token_symbol,
-                market_trend=analysis.market_trend,
-                regulatory_impact=analysis.regulatory_impact,
-                
-                energy_type=analysis.energy_type,
-                infrastructure_project=analysis.infrastructure_project,
-                capacity=analysis.capacity,
-                status=analysis.status,
-
-                # Motoring
-                vehicle_make=analysis.vehicle_make,
-                vehicle_model=analysis.vehicle_model,
-                vehicle_type=analysis.vehicle_type,
-                price_range=analysis.price_range,
-
-                # Sport
-                sport_category=analysis.sport_category,
-                subcategories=analysis.subcategories
-            )
-            
-            # Push to Apify Dataset
-            await Actor.push_data(record.model_dump(mode='json'))
-            
-            # 6. 📢 NOTIFICATIONS
-            if config.discordWebhookUrl and "High Hype" in record.sentiment:
-                await send_discord_alert(config.discordWebhookUrl, record.model_dump())
-            
-        except Exception as e:
-            Actor.log.error(f"Analysis loop failed for {article.title}: {e}")
-            # Track failure in feed_items
-            error_analysis = AnalysisResult(
-                sentiment="Error",
-                summary=f"Processing failed: {str(e)}",
-                category="Error"
-            )
-            await ingestor._update_feed_item_status(error_analysis, article)
-    else:
-        # Scraping/Search failed case
-        Actor.log.warning(f"❌ Content extraction failed for: {article.title}")
-        error_analysis = AnalysisResult(
-            sentiment="Error",
-            summary="Failed to extract content (Scraping/Search blocked)",
-            category="Error"
-        )
-        await ingestor._update_feed_item_status(error_analysis, article)
-
-    return {"current_index": idx + 1}
-
-def should_continue(state: WorkflowState):
-    if state['current_index'] < len(state['articles']):
-        return "process_article"
-    return END
+    if not articles:
+        return END
+    total = len(articles)
+    Actor.log.info(f"🔀 Fanning out {total} articles into parallel branches.")
+    return [
+        Send("process_article", {"config": state['config'], "article": article, "position": idx, "total": total})
+        for idx, article in enumerate(articles)
+    ]
+
+async def process_article_node(state: ArticleState, config: RunnableConfig):
+    """The Core Logic: Scrape -> Fallback -> AI -> Save for one article branch."""
+    pipeline: ArticlePipeline = config["configurable"]["pipeline"]
+    await pipeline.process(state['article'], state['position'], state['total'])
+    return {"processed": 1}
 
 # --- Main Entry ---
 
@@ -214,22 +102,42 @@ async def main():
             elif not os.getenv("BRAVE_API_KEY"):
                 Actor.log.warning("⚠️ BRAVE_API_KEY missing. Search fallback disabled.")
 
+        # Shared engine: its stage limits bound all fan-out branches together
+        pipeline = ArticlePipeline(config)
+
         # Graph Setup
         workflow = StateGraph(WorkflowState)
-        workflow.add_node("fetch_feeds", fetch_feeds_node)
-        workflow.add_node("process_article", process_article_node)
-        
-        workflow.set_entry_point("fetch_feeds")
-        workflow.add_conditional_edges("fetch_feeds", lambda x: "process_article")
-        workflow.add_conditional_edges("process_article", should_continue)
+        if config.streamingMode:
+            # Single streaming node: processing starts on the first feed that completes
+            workflow.add_node("stream_articles", stream_articles_node)
+            workflow.set_entry_point("stream_articles")
+            workflow.add_edge("stream_articles", END)
+        else:
+            workflow.add_node("fetch_feeds", fetch_feeds_node)
+            workflow.add_node("dedup", dedup_node)
+            workflow.add_node("process_article", process_article_node)
+            
+            workflow.set_entry_point("fetch_feeds")
+            workflow.add_edge("fetch_feeds", "dedup")
+            workflow.add_conditional_edges("dedup", fan_out_articles, ["process_article", END])
+            workflow.add_edge("process_article", END)
         
         app = workflow.compile()
         
-        await app.ainvoke({
-            "config": config,
-            "articles": [],
-            "current_index": 0
-        })
+        try:
+            await pipeline.start()
+            final_state = await app.ainvoke(
+                {
+                    "config": config,
+                    "articles": [],
+                    "processed": 0
+                },
+                config={"configurable": {"pipeline": pipeline}}
+            )
+            await pipeline.complete()
+        finally:
+            await pipeline.close()
+        Actor.log.info(f"🏁 Run complete: {final_state.get('processed', 0)} articles processed.")
 
 if __name__ == '__main__':
     asyncio.run(main())
\ No newline at end of file
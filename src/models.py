@@ -11,7 +11,24 @@ class InputConfig(BaseModel):
     discordWebhookUrl: Optional[str] = None
     enableBraveImageBackfill: bool = False
     forceRefresh: bool = False
+    resumeInterruptedRuns: bool = True # Checkpoint progress and resume it after a migration/crash
     runTestMode: bool = False
+    streamingMode: bool = False
+    clusterNearDuplicates: bool = True
+
+    # Concurrency limits per processing stage
+    feedConcurrency: int = 20
+    scrapeConcurrency: int = 10
+    scrapePerHostConcurrency: int = 4
+    scrapeMaxBytes: int = 2_000_000
+    searchConcurrency: int = 2
+    llmConcurrency: int = 4
+    llmTokenBudget: int = 2500 # max input tokens of article context per LLM call (models without their own budget)
+    llmModelTokenBudgets: Dict[str, int] = Field(default_factory=dict) # per-model overrides, keyed by OpenRouter model id
+    llmBatchSize: int = 1 # >1 packs short same-niche articles into one LLM request
+    dbConcurrency: int = 4
+    dbBatchSize: int = 50 # Rows per buffered bulk upsert
+    dbFlushInterval: float = 5.0 # Seconds before a partial batch is written anyway
 
 class ArticleCandidate(BaseModel):
     title: str
@@ -21,6 +38,13 @@ class ArticleCandidate(BaseModel):
     original_summary: Optional[str] = None
     niche: Optional[str] = None
     image_url: Optional[str] = None
+    related_urls: List[str] = Field(default_factory=list, description="Near-duplicate copies of this story")
+    canonical_url: Optional[str] = None # rel=canonical of the fetched page, when it differs from url
+
+class ScrapedPage(BaseModel):
+    text: Optional[str] = None # None if the page was blocked or had no usable content
+    image_url: Optional[str] = None
+    canonical_url: Optional[str] = None
 
 class Incident(BaseModel):
     type: str = Field(description="Type of incident (e.g. Robbery, Protest)")
@@ -110,6 +134,7 @@ class DatasetRecord(BaseModel):
     country: Optional[str]
     is_south_africa: bool
     raw_context_source: Optional[str] = None
+    related_urls: List[str] = Field(default_factory=list, description="Other outlets' copies of the same story")
 
     # Rich data for export/debugging if needed
     incidents: Optional[List[Dict]] = None
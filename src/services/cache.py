@@ -0,0 +1,150 @@
+import hashlib
+import json
+import threading
+import time
+from apify import Actor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+# Named store: unlike the default (per-run) store it survives across runs on the platform,
+# and is kept under ./storage/key_value_stores/<name> when running locally.
+CACHE_STORE_NAME = "niche-intelligence-cache"
+
+class PersistentCache:
+    """
+    Dict-backed cache persisted as a single JSON record in the cache key-value store.
+    Subclasses set RECORD_KEY and add their own accessors.
+    """
+
+    RECORD_KEY = "CACHE"
+
+    def __init__(self, data: Optional[Dict[str, Any]] = None):
+        self.data: Dict[str, Any] = data or {}
+        self.dirty = False
+
+    @classmethod
+    async def load(cls):
+        """Loads the cache record. A missing or unreadable record yields an empty cache."""
+        try:
+            store = await Actor.open_key_value_store(name=CACHE_STORE_NAME)
+            data = await store.get_value(cls.RECORD_KEY)
+        except Exception as e:
+            Actor.log.warning(f"Cache load failed for {cls.RECORD_KEY}: {e}")
+            data = None
+        return cls(data if isinstance(data, dict) else None)
+
+    async def save(self):
+        """Persists the cache if anything changed."""
+        if not self.dirty:
+            return
+        try:
+            store = await Actor.open_key_value_store(name=CACHE_STORE_NAME)
+            await store.set_value(self.RECORD_KEY, self.data)
+            self.dirty = False
+        except Exception as e:
+            Actor.log.warning(f"Cache save failed for {self.RECORD_KEY}: {e}")
+
+class FeedCache(PersistentCache):
+    """
+    Conditional-GET state per feed URL: ETag, Last-Modified and the last parsed entry set.
+    Lets unchanged feeds answer 304 and skip parsing.
+    """
+
+    RECORD_KEY = "FEED_CACHE"
+
+    def __init__(self, data: Optional[Dict[str, Any]] = None):
+        super().__init__(data)
+        self.not_modified = 0
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        return self.data.get(url)
+
+    def put(self, url: str, etag: Optional[str], modified: Optional[str], entries: List[Dict[str, Any]]):
+        self.data[url] = {
+            "etag": etag,
+            "modified": modified,
+            "entries": entries,
+            "fetched_at": datetime.now(timezone.utc).isoformat()
+        }
+        self.dirty = True
+
+class TTLCache(PersistentCache):
+    """
+    Persistent cache with per-entry TTL and LRU eviction above MAX_ENTRIES.
+    Safe to use from worker threads. Tracks hits/misses for the end-of-run report.
+    """
+
+    RECORD_KEY = "TTL_CACHE"
+    TTL_SECONDS = 7 * 24 * 3600
+    MAX_ENTRIES = 2000
+
+    def __init__(self, data: Optional[Dict[str, Any]] = None):
+        super().__init__(data)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._evict_expired()
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Stable hash of the key parts."""
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _evict_expired(self):
+        now = time.time()
+        expired = [k for k, v in self.data.items() if now - v.get("at", 0) > self.TTL_SECONDS]
+        for k in expired:
+            del self.data[k]
+        if expired:
+            self.dirty = True
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.get_any([key])
+
+    def get_any(self, keys: List[str]) -> Optional[Any]:
+        """Returns the first live entry among keys. Counts as one lookup for hit-rate stats."""
+        with self._lock:
+            now = time.time()
+            for key in keys:
+                entry = self.data.get(key)
+                if entry is not None and now - entry.get("at", 0) <= self.TTL_SECONDS:
+                    # LRU: move to the end (dicts keep insertion order)
+                    self.data[key] = self.data.pop(key)
+                    self.dirty = True
+                    self.hits += 1
+                    return entry["value"]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: Any):
+        with self._lock:
+            self.data.pop(key, None)
+            self.data[key] = {"value": value, "at": time.time()}
+            while len(self.data) > self.MAX_ENTRIES:
+                # Oldest (least recently used) entry first
+                del self.data[next(iter(self.data))]
+            self.dirty = True
+
+    def stats(self) -> str:
+        lookups = self.hits + self.misses
+        rate = (self.hits / lookups * 100) if lookups else 0.0
+        return f"{self.hits}/{lookups} hits ({rate:.0f}%), {len(self.data)} entries"
+
+class AnalysisCache(TTLCache):
+    """Validated AnalysisResult dicts keyed by (niche, prompt version, model, normalized content)."""
+
+    RECORD_KEY = "ANALYSIS_CACHE"
+
+class SearchCache(TTLCache):
+    """Brave web-search context strings keyed by normalized query. News results go stale quickly."""
+
+    RECORD_KEY = "SEARCH_CACHE"
+    TTL_SECONDS = 3 * 24 * 3600
+    MAX_ENTRIES = 3000
+
+class ImageCache(TTLCache):
+    """Brave image-backfill URLs keyed by normalized query ("" = searched, nothing found)."""
+
+    RECORD_KEY = "IMAGE_CACHE"
+    TTL_SECONDS = 30 * 24 * 3600
+    MAX_ENTRIES = 3000
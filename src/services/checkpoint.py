@@ -0,0 +1,111 @@
+import hashlib
+import json
+import time
+from typing import Any, Dict, List, Optional
+from apify import Actor
+from ..models import InputConfig, ArticleCandidate
+from .cache import CACHE_STORE_NAME
+
+# Checkpoints older than this are ignored (the feeds have moved on)
+MAX_CHECKPOINT_AGE = 24 * 3600
+# Failed articles are retried on resume (the failure may come from the incident that
+# interrupted the run) until they have failed this many times
+MAX_FAILURES = 3
+
+class RunCheckpoint:
+    """
+    Resumable state of one run: the article queue, each article's stage
+    (queued -> scraping -> analyzing -> ingesting -> done/failed) and the dataset records
+    produced so far. Stored in the cache key-value store under a key derived from the run
+    input, so a restarted run with the same input (migration, OOM, timeout) picks it up
+    and only redoes unfinished and failed articles.
+    """
+
+    def __init__(self, key: str, data: Optional[Dict[str, Any]] = None):
+        data = data or {}
+        self.key = key
+        self.run_id: Optional[str] = data.get("run_id")
+        # url -> {"article": ArticleCandidate dict, "stage": str, "failures": int}
+        self.articles: Dict[str, Dict[str, Any]] = data.get("articles", {})
+        # url -> DatasetRecord dict
+        self.records: Dict[str, Dict[str, Any]] = data.get("records", {})
+        self.resumed = bool(self.pending())
+
+    @staticmethod
+    def key_for(config: InputConfig) -> str:
+        """Same input => same checkpoint."""
+        digest = hashlib.sha256(json.dumps(config.model_dump(mode="json"), sort_keys=True).encode()).hexdigest()
+        return f"CHECKPOINT_{digest[:16]}"
+
+    @classmethod
+    async def load(cls, config: InputConfig) -> "RunCheckpoint":
+        key = cls.key_for(config)
+        try:
+            store = await Actor.open_key_value_store(name=CACHE_STORE_NAME)
+            data = await store.get_value(key)
+        except Exception as e:
+            Actor.log.warning(f"Checkpoint load failed: {e}")
+            data = None
+        if not isinstance(data, dict) or time.time() - data.get("saved_at", 0) > MAX_CHECKPOINT_AGE:
+            data = None
+        return cls(key, data)
+
+    def track(self, articles: List[ArticleCandidate]):
+        """Adds articles to the queue (already known ones keep their stage)."""
+        for article in articles:
+            self.articles.setdefault(article.url, {"article": article.model_dump(mode="json"), "stage": "queued"})
+
+    def mark(self, url: str, stage: str, record: Optional[Dict[str, Any]] = None):
+        entry = self.articles.get(url)
+        if entry is None:
+            return
+        entry["stage"] = stage
+        if stage == "failed":
+            entry["failures"] = entry.get("failures", 0) + 1
+        if record is not None:
+            self.records[url] = record
+
+    @staticmethod
+    def _finished(entry: Dict[str, Any]) -> bool:
+        return entry["stage"] == "done" or entry.get("failures", 0) >= MAX_FAILURES
+
+    def pending(self) -> List[ArticleCandidate]:
+        """Articles that still need (re)processing, in queue order."""
+        return [ArticleCandidate(**entry["article"]) for entry in self.articles.values() if not self._finished(entry)]
+
+    def records_to_restore(self, run_id: Optional[str]) -> List[Dict[str, Any]]:
+        """
+        Records the interrupted run already produced. After a migration (same run, same
+        dataset) they are in the dataset already; a new run has to push them again.
+        """
+        if run_id and run_id == self.run_id:
+            return []
+        return list(self.records.values())
+
+    def snapshot(self, run_id: Optional[str]) -> Dict[str, Any]:
+        """Copy of the current state (taken before the DB flush that makes it true)."""
+        return {
+            "run_id": run_id,
+            "saved_at": time.time(),
+            "articles": {url: dict(entry) for url, entry in self.articles.items()},
+            "records": dict(self.records),
+        }
+
+    async def save(self, snapshot: Dict[str, Any]):
+        try:
+            store = await Actor.open_key_value_store(name=CACHE_STORE_NAME)
+            await store.set_value(self.key, snapshot)
+        except Exception as e:
+            Actor.log.warning(f"Checkpoint save failed: {e}")
+
+    async def clear(self):
+        """Run finished: nothing left to resume."""
+        try:
+            store = await Actor.open_key_value_store(name=CACHE_STORE_NAME)
+            await store.delete_value(self.key)
+        except Exception as e:
+            Actor.log.warning(f"Checkpoint clear failed: {e}")
+
+    def stats(self) -> str:
+        done = sum(1 for entry in self.articles.values() if self._finished(entry))
+        return f"{done}/{len(self.articles)} articles finished"
@@ -0,0 +1,162 @@
+import hashlib
+import html
+import random
+import re
+from typing import Dict, List, Optional, Set
+from apify import Actor
+from ..models import ArticleCandidate
+
+# Same story if the titles' character shingles overlap this much (Jaccard) on their own ...
+TITLE_THRESHOLD = 0.8
+# ... or at least this much with the summaries corroborating it. Titles alone at this level
+# also match distinct stories ("... energy crisis" / "... water crisis" score 0.56)
+TITLE_CANDIDATE_THRESHOLD = 0.35
+SUMMARY_CORROBORATION = 0.3
+# ... or the feed summaries match on their own (wire copies often share the lede verbatim)
+SUMMARY_THRESHOLD = 0.6
+# Summaries shorter than this (in words) are too generic to match on
+MIN_SUMMARY_WORDS = 15
+SUMMARY_WORDS = 60
+SHINGLE_SIZE = 4
+
+# MinHash LSH: BANDS x ROWS signature. With 24 bands of 2 rows a pair at the candidate
+# title threshold becomes a candidate ~96% of the time, unrelated titles rarely do.
+BANDS = 24
+ROWS = 2
+_PRIME = (1 << 61) - 1
+_rng = random.Random(42)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(BANDS * ROWS)]
+
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "but", "of", "to", "in", "on", "at", "for", "with", "by", "from", "as",
+    "is", "are", "was", "were", "be", "been", "it", "its", "this", "that", "after", "over", "says", "said",
+    "new", "news", "live", "update", "updates", "watch", "video", "breaking"
+}
+
+NUMBER_WORDS = {
+    "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+    "eleven", "twelve", "hundred", "thousand", "million", "billion"
+}
+
+def normalize(text: Optional[str]) -> List[str]:
+    """Lowercased words without HTML, punctuation, stopwords or plural 's'."""
+    text = html.unescape(re.sub(r"<[^>]+>", " ", text or "")).lower()
+    words = [w for w in re.findall(r"[a-z0-9]+", text) if w not in STOPWORDS]
+    return [w[:-1] if w.endswith("s") and len(w) > 3 else w for w in words]
+
+def shingles(words: List[str]) -> Set[str]:
+    """Character shingles over the joined words (so 'load shedding' ~ 'loadshedding')."""
+    joined = "".join(words)
+    if len(joined) <= SHINGLE_SIZE:
+        return {joined} if joined else set()
+    return {joined[i:i + SHINGLE_SIZE] for i in range(len(joined) - SHINGLE_SIZE + 1)}
+
+def numbers(words: List[str]) -> Set[str]:
+    """Figures in a title ('stage 4', '5pm', 'three suspects'): differing figures mean different stories."""
+    return {w for w in words if w in NUMBER_WORDS or any(c.isdigit() for c in w)}
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+def minhash(features: Set[str]) -> List[int]:
+    hashes = [int.from_bytes(hashlib.blake2b(f.encode(), digest_size=8).digest(), "big") for f in features]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+class _LSHIndex:
+    """Band buckets over MinHash signatures; returns ids that share at least one band."""
+
+    def __init__(self):
+        self.buckets: Dict[tuple, List[int]] = {}
+
+    def _keys(self, signature: List[int]):
+        for band in range(BANDS):
+            yield (band, *signature[band * ROWS:(band + 1) * ROWS])
+
+    def candidates(self, signature: List[int]) -> Set[int]:
+        return {idx for key in self._keys(signature) for idx in self.buckets.get(key, [])}
+
+    def add(self, idx: int, signature: List[int]):
+        for key in self._keys(signature):
+            self.buckets.setdefault(key, []).append(idx)
+
+class StoryClusterer:
+    """
+    Incremental near-duplicate clustering of feed candidates (same wire story, different outlets).
+    The first article of a cluster is its representative; later near-duplicates are attached
+    to its `related_urls` instead of being analyzed again. Works batch by batch, so streaming
+    mode can keep one clusterer for the whole run.
+    """
+
+    def __init__(self, title_threshold: float = TITLE_THRESHOLD, summary_threshold: float = SUMMARY_THRESHOLD):
+        self.title_threshold = title_threshold
+        self.summary_threshold = summary_threshold
+        self.representatives: List[ArticleCandidate] = []
+        self.title_sets: List[Set[str]] = []
+        self.title_numbers: List[Set[str]] = []
+        self.summary_sets: List[Set[str]] = []
+        self.title_index = _LSHIndex()
+        self.summary_index = _LSHIndex()
+        self.collapsed = 0
+
+    def _title_match(self, idx: int, title_set: Set[str], title_numbers: Set[str], summary_set: Set[str]) -> bool:
+        other_numbers = self.title_numbers[idx]
+        if title_numbers and other_numbers and title_numbers != other_numbers:
+            return False
+        score = jaccard(title_set, self.title_sets[idx])
+        if score >= self.title_threshold:
+            return True
+        # Similar titles only count when the summaries tell the same story
+        return score >= TITLE_CANDIDATE_THRESHOLD and jaccard(summary_set, self.summary_sets[idx]) >= SUMMARY_CORROBORATION
+
+    def _match(self, title_set: Set[str], title_numbers: Set[str], title_sig: List[int], summary_set: Set[str], summary_sig: Optional[List[int]]) -> Optional[int]:
+        for idx in sorted(self.title_index.candidates(title_sig)):
+            if self._title_match(idx, title_set, title_numbers, summary_set):
+                return idx
+        if summary_sig is not None:
+            for idx in sorted(self.summary_index.candidates(summary_sig)):
+                if jaccard(summary_set, self.summary_sets[idx]) >= self.summary_threshold:
+                    return idx
+        return None
+
+    def add(self, article: ArticleCandidate) -> bool:
+        """True if the article starts a new cluster (analyze it), False if it joined one."""
+        title_words = normalize(article.title)
+        title_set = shingles(title_words)
+        if not title_set:
+            return True
+        title_numbers = numbers(title_words)
+        summary_words = normalize(article.original_summary)[:SUMMARY_WORDS]
+        summary_set = shingles(summary_words) if len(summary_words) >= MIN_SUMMARY_WORDS else set()
+
+        title_sig = minhash(title_set)
+        summary_sig = minhash(summary_set) if summary_set else None
+
+        idx = self._match(title_set, title_numbers, title_sig, summary_set, summary_sig)
+        if idx is not None:
+            representative = self.representatives[idx]
+            if article.url != representative.url and article.url not in representative.related_urls:
+                representative.related_urls.append(article.url)
+            self.collapsed += 1
+            return False
+
+        idx = len(self.representatives)
+        self.representatives.append(article)
+        self.title_sets.append(title_set)
+        self.title_numbers.append(title_numbers)
+        self.summary_sets.append(summary_set)
+        self.title_index.add(idx, title_sig)
+        if summary_sig is not None:
+            self.summary_index.add(idx, summary_sig)
+        return True
+
+    def filter(self, articles: List[ArticleCandidate]) -> List[ArticleCandidate]:
+        """Keeps one representative per story, attaching the others' URLs to it."""
+        return [a for a in articles if self.add(a)]
+
+def cluster_articles(articles: List[ArticleCandidate]) -> List[ArticleCandidate]:
+    """One-shot clustering for batch mode."""
+    clusterer = StoryClusterer()
+    representatives = clusterer.filter(articles)
+    if clusterer.collapsed:
+        Actor.log.info(f"🧬 Collapsed {clusterer.collapsed} near-duplicate articles into {len(representatives)} stories.")
+    return representatives
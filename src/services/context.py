@@ -0,0 +1,157 @@
+import re
+from collections import Counter
+from typing import List, Optional, Set
+from .tokens import count_tokens
+
+# Safety cap on raw extracted text (chars). Real trimming happens in reduce_context.
+MAX_CONTEXT_CHARS = 50000
+# Default LLM input budget (tokens) when the run doesn't configure one
+DEFAULT_TOKEN_BUDGET = 2500
+# Share of the budget reserved for the opening paragraphs, kept verbatim
+LEAD_SHARE = 0.4
+
+# Short link-like blocks matching these are site furniture, not article content
+BOILERPLATE_PATTERNS = re.compile(
+    r"cookie|privacy policy|terms of (use|service)|all rights reserved|subscribe|newsletter|sign up|sign in|log in"
+    r"|advertisement|sponsored|related (articles|stories|posts)|read more|recommended for you|you may also like"
+    r"|share (this|on)|follow us|click here|javascript|enable notifications|©",
+    re.IGNORECASE
+)
+# Only blocks this short can be furniture (banners, link labels), never article paragraphs
+BOILERPLATE_MAX_WORDS = 12
+# ...and only if the pattern comes up front ("Subscribe to...", "We use cookies", "© 2025")
+BOILERPLATE_LEAD_WORDS = 3
+# Menu items: a few words, no punctuation at all...
+MENU_MAX_WORDS = 4
+# ...that are a known navigation/UI label, or repeat on the page (menus echoed in header and
+# footer). Anything else this short is kept: subheadings and datelines look the same.
+MENU_LABELS = re.compile(
+    r"home|menu|search|news|latest( news)?|trending|most (read|popular)|top stories|more|(show|load) more"
+    r"|(view|see) all|next|previous|back to top|skip to (main )?content|share|tweet|e-?mail|print|comments?"
+    r"|whatsapp|facebook|twitter|linkedin|telegram|copy link|advertise( with us)?|contact( us)?|about( us)?"
+    r"|careers|sitemap|log ?in|log ?out|register|subscribe|listen|watch|close",
+    re.IGNORECASE
+)
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'“])")
+WORD = re.compile(r"[a-z0-9]{3,}")
+
+STOPWORDS = {
+    "the", "and", "for", "are", "but", "not", "you", "all", "any", "can", "her", "was", "one", "our", "out",
+    "has", "have", "had", "his", "how", "its", "may", "new", "now", "say", "says", "said", "she", "that", "this",
+    "with", "from", "they", "will", "would", "there", "their", "what", "when", "which", "who", "why", "been",
+    "into", "more", "than", "then", "them", "were", "also", "after", "over", "about", "just", "like", "some"
+}
+
+# Extra relevance terms per niche (the niche name and article title always count)
+NICHE_TERMS = {
+    "crypto": "bitcoin ethereum token blockchain exchange price market sec regulation wallet defi",
+    "gaming": "game studio release platform console trailer developer publisher launch",
+    "vc": "funding round raised series seed investors valuation startup acquisition",
+    "realestate": "property price market listing sqm sqft housing rent sale development",
+    "energy": "power grid solar wind coal nuclear gas capacity project eskom electricity",
+    "crime": "police arrested suspect victim robbery murder court charged incident",
+    "politics": "party minister government election parliament president policy vote",
+    "sport": "match fight title champion league season coach transfer win",
+    "tech": "software company product launch model chip platform users",
+    "motoring": "vehicle car model price engine suv launch brand",
+}
+
+def _terms(text: str) -> Set[str]:
+    return {w for w in WORD.findall(text.lower()) if w not in STOPWORDS}
+
+def _is_boilerplate(block: str, repeats: int = 1) -> bool:
+    """
+    Site furniture: a menu item (a few words, no punctuation, and a known label or repeated
+    `repeats` times on the page), or a short link-like block that leads with a furniture pattern.
+    Prose mentioning "sign up" or "©", subheadings and datelines are kept.
+    """
+    words = block.split()
+    if len(words) <= MENU_MAX_WORDS and not re.search(r"[.,:;!?\"”]", block):
+        return repeats > 1 or MENU_LABELS.fullmatch(block) is not None
+    if len(words) > BOILERPLATE_MAX_WORDS:
+        return False
+    match = BOILERPLATE_PATTERNS.search(block)
+    return match is not None and match.start() < len(" ".join(words[:BOILERPLATE_LEAD_WORDS]))
+
+def clean_blocks(text: str, drop_boilerplate: bool = True) -> List[str]:
+    """Splits text into paragraphs, dropping repeated blocks and (by default) boilerplate."""
+    lines = [re.sub(r"\s+", " ", line).strip() for line in text.split("\n")]
+    counts = Counter(lines)
+    blocks, seen = [], set()
+    for block in lines:
+        if not block or block in seen or (drop_boilerplate and _is_boilerplate(block, counts[block])):
+            continue
+        seen.add(block)
+        blocks.append(block)
+    return blocks
+
+def reduce_context(
+    text: str,
+    title: str = "",
+    niche: str = "general",
+    budget: int = DEFAULT_TOKEN_BUDGET,
+    model: Optional[str] = None,
+    drop_boilerplate: bool = True
+) -> str:
+    """
+    Fits article text into a token budget for the LLM, counted with `model`'s tokenizer.
+    Boilerplate is dropped first (unless `drop_boilerplate` is off, e.g. for search results).
+    If the text is still too long, the lead paragraphs are kept verbatim and the rest is
+    filled with the sentences most relevant to the title and niche, in their original order.
+    """
+    if not text:
+        return text
+    blocks = clean_blocks(text, drop_boilerplate)
+    if not blocks:
+        # Nothing survived the filter (e.g. one long run-on block with a footer); don't lose the text
+        blocks = [re.sub(r"\s+", " ", text).strip()]
+
+    reduced = "\n".join(blocks)
+    if count_tokens(reduced, model) <= budget:
+        return reduced
+
+    sentences = [
+        (b_idx, s_idx, sentence)
+        for b_idx, block in enumerate(blocks)
+        for s_idx, sentence in enumerate(SENTENCE_SPLIT.split(block))
+    ]
+
+    # 1. Lead: opening sentences in order, up to LEAD_SHARE of the budget
+    selected = []
+    used = 0
+    lead_budget = budget * LEAD_SHARE
+    for candidate in sentences:
+        tokens = count_tokens(candidate[2], model)
+        if used + tokens > lead_budget:
+            break
+        selected.append(candidate)
+        used += tokens
+
+    # 2. The rest ranked by overlap with title + niche terms
+    candidates = sentences[len(selected):]
+    query = _terms(f"{title} {niche} {NICHE_TERMS.get(niche, '')}")
+    def score(candidate):
+        b_idx, _, sentence = candidate
+        words = _terms(sentence)
+        relevance = len(words & query) / (1 + len(words)) ** 0.5
+        facts = 0.3 if re.search(r"\d", sentence) else 0.0
+        # Slight preference for earlier text when relevance ties
+        return relevance + facts - b_idx * 0.001
+
+    for candidate in sorted(candidates, key=score, reverse=True):
+        tokens = count_tokens(candidate[2], model)
+        if used + tokens > budget:
+            continue
+        selected.append(candidate)
+        used += tokens
+
+    if not selected:
+        # A single huge first sentence: fall back to a proportional cut
+        return reduced[:budget * 4]
+
+    # 3. Reassemble in document order, one paragraph per source block
+    paragraphs = {}
+    for b_idx, _, sentence in sorted(selected):
+        paragraphs.setdefault(b_idx, []).append(sentence)
+    return "\n".join(" ".join(parts) for _, parts in sorted(paragraphs.items()))
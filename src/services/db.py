@@ -0,0 +1,117 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+from apify import Actor
+from supabase import create_client, Client
+from .metrics import METRICS
+
+# Worker threads for blocking PostgREST calls (stage calls plus background flushes)
+DB_WORKERS = 8
+
+_client: Optional["SharedClient"] = None
+_client_ready = False
+_executor: Optional[ThreadPoolExecutor] = None
+
+class SharedClient:
+    """
+    Process-wide Supabase client.
+    `Client.schema()` builds a new PostgREST client (and HTTP session) on every call;
+    here each schema gets one, created on first use and reused, so connections stay pooled.
+    """
+
+    def __init__(self, client: Client):
+        self.client = client
+        self._schemas: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def schema(self, name: str):
+        with self._lock:
+            if name not in self._schemas:
+                self._schemas[name] = self.client.schema(name)
+            return self._schemas[name]
+
+    def table(self, name: str):
+        return self.schema("public").table(name)
+
+    def close(self):
+        for postgrest in self._schemas.values():
+            try:
+                postgrest.aclose()
+            except Exception:
+                pass
+        self._schemas.clear()
+
+def get_client() -> Optional[SharedClient]:
+    """The shared client, created on first call. None if credentials are missing or invalid."""
+    global _client, _client_ready
+    if _client_ready:
+        return _client
+    _client_ready = True
+
+    url = os.getenv("SUPABASE_URL")
+    # Check standard key, then service role key, then anon key
+    key = os.getenv("SUPABASE_KEY") or os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_ANON_KEY")
+    if not url or not key:
+        Actor.log.warning(f"Supabase credentials missing (URL={bool(url)}, Key={bool(key)}). Ingestion will fail.")
+        return None
+    try:
+        _client = SharedClient(create_client(url, key))
+    except Exception as e:
+        Actor.log.error(f"Failed to connect to Supabase: {e}")
+    return _client
+
+def configure_db(max_workers: int):
+    """Sizes the DB thread pool. Call before the first query."""
+    global DB_WORKERS
+    if _executor is None:
+        DB_WORKERS = max(1, max_workers)
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="supabase")
+    return _executor
+
+async def run_blocking(func: Callable, *args, **kwargs) -> Any:
+    """Runs a blocking DB function on the dedicated pool, so DB latency never stalls the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), partial(func, *args, **kwargs))
+
+def _table_of(query) -> str:
+    """`schema.table` a PostgREST query builder targets (metrics label)."""
+    request = getattr(query, "request", None)
+    if request is None:
+        return "unknown"
+    headers = request.headers
+    schema = headers.get("Content-Profile") or headers.get("Accept-Profile") or "public"
+    return f"{schema}.{str(request.path).rsplit('/', 1)[-1]}"
+
+def execute_sync(query) -> Any:
+    """`.execute()` of a PostgREST query builder, timed per table and method."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        result = query.execute()
+        outcome = "ok"
+        return result
+    finally:
+        labels = {"table": _table_of(query), "method": getattr(getattr(query, "request", None), "http_method", None)}
+        METRICS.observe("db_seconds", time.perf_counter() - started, outcome=outcome, **labels)
+
+async def execute(query) -> Any:
+    """Awaitable `.execute()` of a PostgREST query builder."""
+    return await run_blocking(execute_sync, query)
+
+async def close_db():
+    """Releases the pool and the HTTP sessions. Called once at the end of the run."""
+    global _client, _client_ready, _executor
+    if _executor is not None:
+        await asyncio.to_thread(_executor.shutdown, wait=True)
+        _executor = None
+    if _client is not None:
+        _client.close()
+    _client, _client_ready = None, False
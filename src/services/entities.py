@@ -0,0 +1,100 @@
+import asyncio
+from typing import Any, Dict
+from apify import Actor
+from .db import execute
+from .metrics import METRICS
+from .writer import WriteBehind
+
+# kind -> (schema, table, name column, has last_seen_at)
+ENTITY_TABLES = {
+    "person": ("people_intelligence", "master_identities", "full_name", True),
+    "organization": ("business_intelligence", "organizations", "registered_name", False),
+    "syndicate": ("crime_intelligence", "syndicates", "name", False),
+}
+# Names per `in_` lookup (keeps the PostgREST query string well under URL limits)
+LOOKUP_CHUNK = 100
+
+class EntitySink(WriteBehind):
+    """
+    Batched entity resolution for people, organizations and syndicates.
+
+    Names are deduplicated per run: each flush resolves the pending names of a table with
+    one `in_` select, bulk-inserts the missing ones and touches `last_seen_at` of the
+    existing ones in one update. A failing insert is retried and split like BulkWriter
+    upserts, so one bad row only loses that name. Resolved name -> id pairs are cached for
+    the life of the process, so a name seen again never reaches the database.
+    """
+
+    def __init__(self, client, max_names: int = 50, max_delay: float = 5.0, retries: int = 2):
+        super().__init__(client, max_delay=max_delay, retries=retries)
+        self.max_names = max(1, max_names)
+        self.ids: Dict[str, Dict[str, Any]] = {kind: {} for kind in ENTITY_TABLES}
+        self.queued: Dict[str, Dict[str, Dict[str, Any]]] = {kind: {} for kind in ENTITY_TABLES}
+        self._lock = asyncio.Lock()
+        self.cache_hits = 0
+        self.inserted = 0
+
+    def add(self, kind: str, name: str, row: Dict[str, Any]):
+        """Queues an entity for resolution unless it was already resolved or queued this run."""
+        name = (name or "").strip()
+        if not name:
+            return
+        if name in self.ids[kind] or name in self.queued[kind]:
+            self.cache_hits += 1
+            METRICS.inc("entities_total", kind=kind, result="cached")
+            return
+        self.queued[kind][name] = row
+
+        if sum(len(q) for q in self.queued.values()) >= self.max_names:
+            self._spawn(self.flush())
+        else:
+            self._flush_soon()
+
+    async def _execute(self, query):
+        self.round_trips += 1
+        return await execute(query)
+
+    async def flush(self):
+        """Resolves every queued name now (one lookup, one insert and one touch per table at most)."""
+        # Serialized so two flushes can't both insert the same new name
+        async with self._lock:
+            for kind, queued in self.queued.items():
+                if not queued:
+                    continue
+                self.queued[kind] = {}
+                try:
+                    await self._resolve(kind, queued)
+                except Exception as e:
+                    Actor.log.warning(f"Entity ingest warning ({kind}): {e}")
+
+    async def _resolve(self, kind: str, queued: Dict[str, Dict[str, Any]]):
+        schema, table, name_col, touch = ENTITY_TABLES[kind]
+        names = list(queued)
+
+        existing: Dict[str, Any] = {}
+        for start in range(0, len(names), LOOKUP_CHUNK):
+            chunk = names[start:start + LOOKUP_CHUNK]
+            res = await self._execute(self.client.schema(schema).table(table).select(f"id,{name_col}").in_(name_col, chunk))
+            for row in res.data or []:
+                existing.setdefault(row[name_col], row["id"])
+
+        if touch and existing:
+            await self._execute(
+                self.client.schema(schema).table(table).update({"last_seen_at": "now()"}).in_("id", list(existing.values()))
+            )
+        self.ids[kind].update(existing)
+        METRICS.inc("entities_total", len(existing), kind=kind, result="existing")
+
+        new_rows = [row for name, row in queued.items() if name not in existing]
+        if new_rows:
+            query_for = lambda batch: self.client.schema(schema).table(table).insert(batch)
+            for inserted, res in await self._send(f"{schema}.{table}", query_for, new_rows):
+                self.inserted += len(inserted)
+                METRICS.inc("entities_total", len(inserted), kind=kind, result="new")
+                for row in res.data or []:
+                    self.ids[kind][row[name_col]] = row.get("id")
+
+    def stats(self) -> str:
+        resolved = sum(len(ids) for ids in self.ids.values())
+        failed = f", {self.rows_failed} failed" if self.rows_failed else ""
+        return f"{resolved} resolved, {self.inserted} new, {self.cache_hits} cache hits, {self.round_trips} round-trips{failed}"
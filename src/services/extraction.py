@@ -0,0 +1,220 @@
+import json
+import re
+from typing import List, Optional
+from lxml import etree
+from apify import Actor
+from ..models import ScrapedPage
+from .context import MAX_CONTEXT_CHARS
+from .urls import resolve_canonical
+
+# Paragraph-level tags: a line break is kept after each so the context reducer sees paragraphs
+BLOCK_TAGS = {'p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li', 'blockquote', 'pre', 'figcaption', 'tr', 'div', 'br'}
+# Page furniture that is never article content. Not 'form': ASP.NET WebForms and some CMS
+# templates wrap the whole page body in one
+SKIP_TAGS = {'script', 'style', 'noscript', 'nav', 'footer', 'aside', 'template', 'svg'}
+# Containers that usually hold the article body, in order of preference
+CONTENT_CLASS = re.compile(r'content|post|article')
+# Below this the page is likely a cookie wall or error page
+MIN_TEXT_CHARS = 300
+
+class _Container:
+    """Text and first usable image of one candidate body container."""
+
+    def __init__(self, depth: int):
+        self.depth = depth
+        self.open = True
+        self.parts: List[str] = []
+        self.chars = 0
+        self.image: Optional[str] = None
+
+class PageCollector:
+    """
+    lxml parser target: receives start/end/data events in document order and collects,
+    in a single pass and without building a tree, everything the scraper needs:
+    OpenGraph/Twitter/JSON-LD images, the canonical URL and the text of the
+    <article>, <main> and first content-class containers (plus the whole page as a fallback).
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.skip_depth = 0
+        self.meta = {}
+        self.canonical: Optional[str] = None
+        self.jsonld_image: Optional[str] = None
+        self._jsonld: Optional[List[str]] = None
+        self.containers = {"article": None, "main": None, "class": None}
+        self.page = _Container(0)
+
+    @property
+    def text_chars(self) -> int:
+        """Characters collected for the best container so far (lets streaming callers stop early)."""
+        best = self._best()
+        return best.chars if best else 0
+
+    @property
+    def body_closed(self) -> bool:
+        """True once the preferred body container (<article>) has been fully parsed."""
+        article = self.containers["article"]
+        return article is not None and not article.open
+
+    def _active(self):
+        if self.skip_depth:
+            return
+        yield self.page
+        for container in self.containers.values():
+            if container is not None and container.open:
+                yield container
+
+    def _emit(self, text: str):
+        for container in self._active():
+            container.parts.append(text)
+            container.chars += len(text)
+
+    def start(self, tag, attrib):
+        self.depth += 1
+        if not isinstance(tag, str):
+            return
+        tag = tag.lower()
+
+        if self.skip_depth:
+            self.skip_depth += 1
+            return
+
+        if tag == 'meta':
+            key = (attrib.get('property') or attrib.get('name') or '').lower()
+            if key in ('og:image', 'twitter:image', 'og:url') and key not in self.meta:
+                self.meta[key] = attrib.get('content')
+            return
+        if tag == 'link':
+            if self.canonical is None and 'canonical' in (attrib.get('rel') or '').lower().split():
+                self.canonical = attrib.get('href')
+            return
+        if tag == 'img':
+            self._offer_image(attrib.get('src'))
+            return
+        if tag in SKIP_TAGS:
+            if tag == 'script' and (attrib.get('type') or '').lower() == 'application/ld+json':
+                self._jsonld = []
+            self.skip_depth = 1
+            return
+
+        if tag in ('article', 'main') and self.containers[tag] is None:
+            self.containers[tag] = _Container(self.depth)
+        elif self.containers["class"] is None and CONTENT_CLASS.search(attrib.get('class') or ''):
+            self.containers["class"] = _Container(self.depth)
+
+        self._emit(' ')
+        if tag == 'br':
+            self._emit('\n')
+
+    def end(self, tag):
+        self.depth -= 1
+        if not isinstance(tag, str):
+            return
+        if self.skip_depth:
+            self.skip_depth -= 1
+            if self.skip_depth == 0 and self._jsonld is not None:
+                self._read_jsonld(''.join(self._jsonld))
+                self._jsonld = None
+            return
+
+        tag = tag.lower()
+        self._emit('\n' if tag in BLOCK_TAGS else ' ')
+        for container in self.containers.values():
+            if container is not None and container.open and container.depth == self.depth + 1:
+                container.open = False
+
+    def data(self, text):
+        if self.skip_depth:
+            if self._jsonld is not None:
+                self._jsonld.append(text)
+            return
+        self._emit(text)
+
+    def comment(self, text):
+        pass
+
+    def close(self):
+        return self
+
+    def _offer_image(self, src: Optional[str]):
+        """Body heuristic: first non-icon image inside each candidate container."""
+        if not src or src.endswith('.svg') or 'icon' in src.lower() or 'logo' in src.lower():
+            return
+        for container in self.containers.values():
+            if container is not None and container.open and container.image is None:
+                container.image = src
+
+    def _read_jsonld(self, raw: str):
+        if self.jsonld_image:
+            return
+        try:
+            data = json.loads(raw)
+        except (json.JSONDecodeError, ValueError):
+            return
+        self.jsonld_image = jsonld_image(data)
+
+    def _best(self) -> Optional[_Container]:
+        for key in ("article", "main", "class"):
+            if self.containers[key] is not None:
+                return self.containers[key]
+        return None
+
+    def result(self, page_url: str = "") -> ScrapedPage:
+        """Builds the ScrapedPage (same priorities as the scraper has always used)."""
+        canonical_url = resolve_canonical(page_url, self.canonical or self.meta.get('og:url'))
+        # Image priority: OpenGraph > Twitter Card > JSON-LD > first body image
+        best = self._best()
+        image_url = (
+            self.meta.get('og:image')
+            or self.meta.get('twitter:image')
+            or self.jsonld_image
+            or (best.image if best else None)
+        )
+
+        text = ''.join((best or self.page).parts)
+        # Cleanup: collapse whitespace but keep paragraph breaks
+        clean_text = re.sub(r'[^\S\n]+', ' ', text)
+        clean_text = re.sub(r' ?\n\s*', '\n', clean_text).strip()
+
+        if len(clean_text) < MIN_TEXT_CHARS:
+            Actor.log.warning(f"⚠️ Scraped content too short ({len(clean_text)} chars). Likely failed.")
+            return ScrapedPage(canonical_url=canonical_url)
+
+        # Safety cap only: token budgeting happens in reduce_context before the LLM call
+        return ScrapedPage(text=clean_text[:MAX_CONTEXT_CHARS], image_url=image_url, canonical_url=canonical_url)
+
+def jsonld_image(data) -> Optional[str]:
+    """First image (or thumbnailUrl) in a Schema.org JSON-LD document."""
+    # Handle both list and dict logic (some schemas are arrays)
+    items = data if isinstance(data, list) else [data]
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        img = item.get('image')
+        if isinstance(img, str):
+            return img
+        if isinstance(img, dict) and 'url' in img:
+            return img['url']
+        if isinstance(img, list) and img:
+            first = img[0]
+            if isinstance(first, str):
+                return first
+            if isinstance(first, dict) and 'url' in first:
+                return first['url']
+        thumb = item.get('thumbnailUrl')
+        if thumb:
+            return thumb
+    return None
+
+def new_parser(collector: PageCollector, encoding: Optional[str] = None) -> etree.HTMLParser:
+    """Incremental lxml (libxml2) HTML parser feeding `collector`. Call .feed(chunk) then .close()."""
+    return etree.HTMLParser(target=collector, encoding=encoding, recover=True, no_network=True)
+
+def extract_page(html: bytes, page_url: str = "", encoding: Optional[str] = None) -> ScrapedPage:
+    """Parses a downloaded page into a ScrapedPage in one pass."""
+    collector = PageCollector()
+    parser = new_parser(collector, encoding)
+    parser.feed(html)
+    parser.close()
+    return collector.result(page_url)
@@ -1,10 +1,16 @@
 import feedparser
 from apify import Actor
-from typing import List
+from typing import AsyncIterator, List, Optional
 from ..models import ArticleCandidate, InputConfig
-import concurrent.futures
+from .cache import FeedCache
+from .clustering import cluster_articles
+from .urls import canonicalize_url
+from .metrics import METRICS
+import asyncio
+import httpx
+import math
 import random
-import socket
+import time
 from dateutil import parser
 from datetime import datetime, timedelta, timezone
 from collections import defaultdict
@@ -283,34 +289,14 @@ NICHE_FEED_MAP = {
     }
 }
 
-def fetch_feed_data(config: InputConfig) -> List[ArticleCandidate]:
-    """Fetches articles from RSS feeds based on niche."""
-    
-    # Set global default timeout for socket operations (underlying feedparser usage)
-    socket.setdefaulttimeout(15)
+# Per-request deadlines for feed downloads (seconds). The total deadline bounds slow-drip servers
+# that keep sending bytes just fast enough to dodge the read timeout.
+FEED_CONNECT_TIMEOUT = 5.0
+FEED_READ_TIMEOUT = 10.0
+FEED_TOTAL_TIMEOUT = 20.0
 
-    # 1. TEST MODE
-    if config.runTestMode:
-        Actor.log.info(f"🧪 TEST MODE: Generating dummy feed data for niche '{config.niche}'.")
-        return [
-            ArticleCandidate(
-                title=f"[{config.niche.upper()}] Major Industry Annoucement",
-                url="https://example.com/breaking-news",
-                source="TestFeed",
-                published="Fri, 01 Dec 2025 12:00:00 GMT",
-                original_summary="A major event has occurred in the industry.",
-                image_url="https://placehold.co/600x400/png"
-            ),
-             ArticleCandidate(
-                title=f"[{config.niche.upper()}] New Innovation Revealed",
-                url="https://example.com/innovation",
-                source="TestFeed",
-                published="Fri, 01 Dec 2025 14:00:00 GMT",
-                image_url="https://placehold.co/600x400/png"
-            )
-        ]
-
-    # 2. REAL MODE
+def get_feed_targets(config: InputConfig) -> List[dict]:
+    """Resolves the list of {url, niche} feed targets for the configured niche/source."""
     urls = []
     
     # Logic to determine which niches to fetch
@@ -337,110 +323,152 @@ def fetch_feed_data(config: InputConfig) -> List[ArticleCandidate]:
         elif config.source in feed_map:
             urls.append({"url": feed_map[config.source], "niche": niche})
 
-    total_feeds = len(urls)
-    Actor.log.info(f"So, we found {total_feeds} feeds to process. Starting parallel fetch with 20 workers...")
-
     # Shuffle initially to prevent hitting one slow domain concurrently
     random.shuffle(urls)
+    return urls
+
+def create_feed_client(config: InputConfig) -> httpx.AsyncClient:
+    """HTTP client for feed downloads with real connect/read deadlines."""
+    return httpx.AsyncClient(
+        headers={"User-Agent": feedparser.USER_AGENT, "Accept": feedparser.http.ACCEPT_HEADER},
+        timeout=httpx.Timeout(FEED_READ_TIMEOUT, connect=FEED_CONNECT_TIMEOUT),
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=max(1, config.feedConcurrency))
+    )
+
+async def download_feed(client: httpx.AsyncClient, url: str, cached: Optional[dict]) -> httpx.Response:
+    """Downloads one feed. Sends stored validators so unchanged feeds answer 304."""
+    headers = {}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("modified"):
+            headers["If-Modified-Since"] = cached["modified"]
+    return await asyncio.wait_for(client.get(url, headers=headers), timeout=FEED_TOTAL_TIMEOUT)
+
+def parse_feed(content: bytes, headers: httpx.Headers):
+    """Parses downloaded feed bytes. CPU-bound, runs in a worker thread."""
+    return feedparser.parse(content, response_headers={k.lower(): v for k, v in headers.items()})
+
+async def fetch_feed(
+    client: httpx.AsyncClient,
+    target: dict,
+    config: InputConfig,
+    limit: asyncio.Semaphore,
+    cache: Optional[FeedCache] = None
+) -> List[ArticleCandidate]:
+    """Downloads (under the concurrency limit) and parses (off the loop) a single feed."""
+    url = target["url"]
+    niche_context = target["niche"]
+    try:
+        cached = cache.get(url) if cache else None
+        
+        # Only the download holds a concurrency slot; parsing happens after release
+        async with limit:
+            started = time.perf_counter()
+            status = "error"
+            try:
+                response = await download_feed(client, url, cached)
+                status = str(response.status_code)
+            except asyncio.TimeoutError:
+                status = "timeout"
+                raise
+            finally:
+                METRICS.observe("feed_seconds", time.perf_counter() - started, feed=url, status=status)
+        METRICS.inc("feed_bytes_total", response.num_bytes_downloaded, feed=url)
+        
+        if cached and response.status_code == 304:
+            # Unchanged since last run: reuse the last parsed entry set
+            cache.not_modified += 1
+            candidates = [
+                ArticleCandidate(**{**data, "niche": niche_context})
+                for data in cached.get("entries", [])
+            ]
+        elif response.status_code != 200:
+            Actor.log.warning(f"⚠️ Feed {url} returned {response.status_code}")
+            return []
+        else:
+            feed = await asyncio.to_thread(parse_feed, response.content, response.headers)
+            # Malformed XML (bozo) is tolerated as long as entries were recovered
+            candidates = parse_feed_entries(feed, niche_context)
+            etag = response.headers.get("etag")
+            modified = response.headers.get("last-modified")
+            if cache is not None and (etag or modified):
+                cache.put(url, etag, modified, [c.model_dump() for c in candidates])
+
+        # TIME FILTERING (re-applied to cached entries too, they age between runs)
+        return [c for c in candidates if is_recent(c.published, config.timeLimit)]
+    except asyncio.TimeoutError:
+        Actor.log.warning(f"⚠️ Feed {url} timed out after {FEED_TOTAL_TIMEOUT}s.")
+    except Exception as e:
+        Actor.log.error(f"Failed to fetch {url}: {e!r}")
+    return []
+
+def get_test_articles(config: InputConfig) -> List[ArticleCandidate]:
+    """Dummy feed data used in test mode."""
+    Actor.log.info(f"🧪 TEST MODE: Generating dummy feed data for niche '{config.niche}'.")
+    return [
+        ArticleCandidate(
+            title=f"[{config.niche.upper()}] Major Industry Annoucement",
+            url="https://example.com/breaking-news",
+            source="TestFeed",
+            published="Fri, 01 Dec 2025 12:00:00 GMT",
+            original_summary="A major event has occurred in the industry.",
+            image_url="https://placehold.co/600x400/png"
+        ),
+         ArticleCandidate(
+            title=f"[{config.niche.upper()}] New Innovation Revealed",
+            url="https://example.com/innovation",
+            source="TestFeed",
+            published="Fri, 01 Dec 2025 14:00:00 GMT",
+            image_url="https://placehold.co/600x400/png"
+        )
+    ]
+
+async def fetch_feed_data(config: InputConfig, cache: Optional[FeedCache] = None) -> List[ArticleCandidate]:
+    """
+    Fetches articles from RSS feeds based on niche.
+    With a FeedCache, feeds are requested conditionally (ETag/Last-Modified) and
+    unchanged feeds reuse their last parsed entries.
+    """
+
+    # 1. TEST MODE
+    if config.runTestMode:
+        return get_test_articles(config)
+
+    # 2. REAL MODE
+    urls = get_feed_targets(config)
+    total_feeds = len(urls)
+    Actor.log.info(f"So, we found {total_feeds} feeds to process. Starting async fetch with {config.feedConcurrency} connections...")
 
     feed_data = []
-    
-    # helper for parallel execution
-    def process_feed_url(entry):
-        url = entry["url"]
-        niche_context = entry["niche"]
-        local_results = []
-        try:
-            # Verbose logging to debug stalling
-            # Actor.log.info(f"⏳ processing: {url} [{niche_context}]")
-            
-            # feedparser can timeout if socket timeout is set globally (above)
-            feed = feedparser.parse(url)
-            
-            # Check for bozo (malformed XML) or errors
-            if feed.bozo and hasattr(feed, 'bozo_exception'):
-                # Log but try to continue if entries exist
-                 pass 
-
-            for entry_data in feed.entries:
-                # Basic validation
-                if not hasattr(entry_data, 'title') or not hasattr(entry_data, 'link'):
-                    continue
-
-                # TIME FILTERING
-                if not is_recent(entry_data.get('published'), config.timeLimit):
-                    continue
-                    
-                # IMAGE EXTRACTION
-                image_url = None
-                
-                # Check 1: Media Content (often in standard RSS)
-                if 'media_content' in entry_data:
-                    media = entry_data.media_content
-                    if isinstance(media, list) and len(media) > 0:
-                         image_url = media[0].get('url')
-
-                # Check 2: Media Thumbnail (YouTube/News style)
-                if not image_url and 'media_thumbnail' in entry_data:
-                    thumbnails = entry_data.media_thumbnail
-                    if isinstance(thumbnails, list) and len(thumbnails) > 0:
-                        image_url = thumbnails[0].get('url')
-
-                # Check 3: Enclosures (Podcasts/legacy)
-                if not image_url and 'enclosures' in entry_data:
-                     for enc in entry_data.enclosures:
-                         if enc.get('type', '').startswith('image/'):
-                             image_url = enc.get('href')
-                             break
-
-                # Check 4: Links (Atom style)
-                if not image_url and 'links' in entry_data:
-                     for link in entry_data.links:
-                         if link.get('type', '').startswith('image/'):
-                             image_url = link.get('href')
-                             break
-
-                local_results.append(
-                    ArticleCandidate(
-                        title=entry_data.title,
-                        url=entry_data.link,
-                        source=feed.feed.get('title', 'Unknown Feed'),
-                        published=normalize_date(entry_data.get('published')),
-                        original_summary=entry_data.get('summary') or entry_data.get('description'),
-                        niche=niche_context,
-                        image_url=image_url
-                    )
-                )
-        except Exception as e:
-            Actor.log.error(f"Failed to fetch {url}: {e}")
-            
-        return local_results
+    limit = asyncio.Semaphore(max(1, config.feedConcurrency))
 
-    # Increased workers to 20 to prevent bottlenecks
-    with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
-        futures = {executor.submit(process_feed_url, u): u for u in urls}
+    async with create_feed_client(config) as client:
+        tasks = [fetch_feed(client, u, config, limit, cache) for u in urls]
         
         completed_count = 0
-        for future in concurrent.futures.as_completed(futures):
+        for next_done in asyncio.as_completed(tasks):
+            feed_data.extend(await next_done)
             completed_count += 1
             if completed_count % 20 == 0:
                 Actor.log.info(f"📊 Progress: {completed_count}/{total_feeds} feeds processed...")
-            
-            try:
-                res = future.result(timeout=20) # Enforce a timeout on getting valid result
-                feed_data.extend(res)
-            except concurrent.futures.TimeoutError:
-                Actor.log.warning(f"⚠️ A feed task timed out.")
-            except Exception as e:
-                Actor.log.error(f"⚠️ Worker exception: {e}")
 
-    # Deduplicate by URL
+    if cache is not None and cache.not_modified:
+        Actor.log.info(f"♻️ {cache.not_modified}/{total_feeds} feeds unchanged since last run (304), parsing skipped.")
+
+    # Deduplicate by canonical URL (tracking/AMP/mobile variants collapse)
     seen = set()
     unique_articles = []
     for art in feed_data:
-        if art.url not in seen:
+        key = canonicalize_url(art.url)
+        if key not in seen:
             unique_articles.append(art)
-            seen.add(art.url)
+            seen.add(key)
+
+    # Same story from several outlets: keep one representative per cluster
+    if config.clusterNearDuplicates:
+        unique_articles = await asyncio.to_thread(cluster_articles, unique_articles)
             
     # BALANCED SELECTION for 'all' mode
     if config.niche == "all":
@@ -473,6 +501,175 @@ def fetch_feed_data(config: InputConfig) -> List[ArticleCandidate]:
     Actor.log.info(f"✅ Fetched {len(unique_articles)} recent unique articles (after time filter).")
     return unique_articles[:config.maxArticles]
 
+async def stream_feed_data(config: InputConfig, cache: Optional[FeedCache] = None) -> AsyncIterator[List[ArticleCandidate]]:
+    """
+    Streaming variant of fetch_feed_data.
+    Yields each feed's recent, URL-unique candidates as soon as that feed completes,
+    through a bounded queue (backpressure on the downloaders). No selection is applied
+    here: pair it with BalancedSelector so duplicates can be dropped before they take a slot.
+    Closing the generator early cancels the remaining downloads.
+    """
+    if config.runTestMode:
+        yield get_test_articles(config)
+        return
+
+    urls = get_feed_targets(config)
+    total_feeds = len(urls)
+    Actor.log.info(f"So, we found {total_feeds} feeds to process. Streaming with {config.feedConcurrency} connections...")
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, config.feedConcurrency))
+    limit = asyncio.Semaphore(max(1, config.feedConcurrency))
+    seen = set()
+
+    async with create_feed_client(config) as client:
+        async def produce(target: dict):
+            batch = []
+            try:
+                batch = await fetch_feed(client, target, config, limit, cache)
+            except Exception as e:
+                # Still counts as completed. A cancelled producer (CancelledError) puts nothing:
+                # nobody reads the queue any more, and a blocking put would hang the cleanup
+                Actor.log.error(f"Failed to fetch {target.get('url')}: {e!r}")
+            await queue.put(batch)
+
+        producers = [asyncio.create_task(produce(u)) for u in urls]
+        try:
+            for completed_count in range(1, total_feeds + 1):
+                batch = await queue.get()
+                if completed_count % 20 == 0:
+                    Actor.log.info(f"📊 Progress: {completed_count}/{total_feeds} feeds processed...")
+
+                # Deduplicate by URL across feeds
+                fresh = []
+                for art in batch:
+                    key = canonicalize_url(art.url)
+                    if key not in seen:
+                        seen.add(key)
+                        fresh.append(art)
+                if fresh:
+                    yield fresh
+        finally:
+            for task in producers:
+                task.cancel()
+            await asyncio.gather(*producers, return_exceptions=True)
+
+    if cache is not None and cache.not_modified:
+        Actor.log.info(f"♻️ {cache.not_modified}/{total_feeds} feeds unchanged since last run (304), parsing skipped.")
+
+class BalancedSelector:
+    """
+    Incremental form of the balanced selection in fetch_feed_data.
+
+    Each group (niche in 'all' mode, source feed otherwise) may take up to an equal share
+    of maxArticles as candidates arrive. Anything over its share is held in reserve and
+    used round-robin at the end of the stream to fill the slots that quieter groups left open.
+    """
+
+    def __init__(self, config: InputConfig):
+        self.max_articles = config.maxArticles
+        self.by_niche = config.niche == "all"
+        if self.by_niche:
+            groups = len([k for k in NICHE_FEED_MAP.keys() if k != "all"])
+        elif config.source == "all":
+            groups = len(NICHE_FEED_MAP.get(config.niche, {}))
+        else:
+            groups = 1
+        self.share = max(1, math.ceil(self.max_articles / max(1, groups)))
+        self.counts = defaultdict(int)
+        self.reserve = defaultdict(list)
+        self.selected = 0
+
+    def _key(self, article: ArticleCandidate) -> str:
+        return (article.niche if self.by_niche else article.source) or "unknown"
+
+    @property
+    def full(self) -> bool:
+        return self.selected >= self.max_articles
+
+    def offer(self, articles: List[ArticleCandidate]) -> List[ArticleCandidate]:
+        """Returns the candidates accepted right away; the rest go to reserve."""
+        accepted = []
+        articles = list(articles)
+        # Shuffle within the batch to avoid feed-order bias
+        random.shuffle(articles)
+        for art in articles:
+            key = self._key(art)
+            if not self.full and self.counts[key] < self.share:
+                self.counts[key] += 1
+                self.selected += 1
+                accepted.append(art)
+            else:
+                self.reserve[key].append(art)
+        return accepted
+
+    def drain(self) -> List[ArticleCandidate]:
+        """Round-robin fill of the remaining slots from the reserve, once the stream has ended."""
+        for key in self.reserve:
+            random.shuffle(self.reserve[key])
+        filled = []
+        depth = max((len(l) for l in self.reserve.values()), default=0)
+        for i in range(depth):
+            for key, pool in self.reserve.items():
+                if self.full:
+                    break
+                if i < len(pool):
+                    filled.append(pool[i])
+                    self.selected += 1
+            if self.full:
+                break
+        self.reserve.clear()
+        return filled
+
+def parse_feed_entries(feed, niche_context: str) -> List[ArticleCandidate]:
+    """Converts parsed feed entries into ArticleCandidates (no time filtering)."""
+    results = []
+    for entry_data in feed.entries:
+        # Basic validation
+        if not hasattr(entry_data, 'title') or not hasattr(entry_data, 'link'):
+            continue
+            
+        # IMAGE EXTRACTION
+        image_url = None
+        
+        # Check 1: Media Content (often in standard RSS)
+        if 'media_content' in entry_data:
+            media = entry_data.media_content
+            if isinstance(media, list) and len(media) > 0:
+                 image_url = media[0].get('url')
+
+        # Check 2: Media Thumbnail (YouTube/News style)
+        if not image_url and 'media_thumbnail' in entry_data:
+            thumbnails = entry_data.media_thumbnail
+            if isinstance(thumbnails, list) and len(thumbnails) > 0:
+                image_url = thumbnails[0].get('url')
+
+        # Check 3: Enclosures (Podcasts/legacy)
+        if not image_url and 'enclosures' in entry_data:
+             for enc in entry_data.enclosures:
+                 if enc.get('type', '').startswith('image/'):
+                     image_url = enc.get('href')
+                     break
+
+        # Check 4: Links (Atom style)
+        if not image_url and 'links' in entry_data:
+             for link in entry_data.links:
+                 if link.get('type', '').startswith('image/'):
+                     image_url = link.get('href')
+                     break
+
+        results.append(
+            ArticleCandidate(
+                title=entry_data.title,
+                url=entry_data.link,
+                source=feed.feed.get('title', 'Unknown Feed'),
+                published=normalize_date(entry_data.get('published')),
+                original_summary=entry_data.get('summary') or entry_data.get('description'),
+                niche=niche_context,
+                image_url=image_url
+            )
+        )
+    return results
+
 def is_recent(date_str: str, time_limit: str) -> bool:
     """
     Checks if article date is within the time limit.
@@ -1,15 +1,20 @@
 import os
 import logging
-import hashlib
 from typing import Dict, Any, List, Optional
 from datetime import datetime
-from supabase import create_client, Client
 from apify import Actor
 from ..models import AnalysisResult, ArticleCandidate
+from .db import get_client, execute, execute_sync
+from .urls import canonicalize_url, dedup_hash
+from .writer import BulkWriter
+from .entities import EntitySink
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Max URLs per `in_` filter. Keeps the PostgREST query string well under URL length limits.
+DEDUP_CHUNK_SIZE = 50
+
 class SupabaseIngestor:
     """
     Ingests analyzed news data into Visita Intelligence Supabase tables.
@@ -19,20 +24,49 @@ class SupabaseIngestor:
         self.url = os.getenv("SUPABASE_URL")
         # Check standard key, then service role key, then anon key
         self.key = os.getenv("SUPABASE_KEY") or os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_ANON_KEY")
-        
-        if not self.url or not self.key:
-            Actor.log.warning(f"Supabase credentials missing (URL={bool(self.url)}, Key={bool(self.key)}). Ingestion will fail.")
-            self.supabase: Client = None
+        # One pooled client per process, shared by every ingestor (see db.get_client)
+        self.supabase = get_client()
+        self.writer: Optional[BulkWriter] = None
+        self.entities: Optional[EntitySink] = None
+
+    def enable_bulk_writes(self, max_rows: int = 50, max_delay: float = 5.0):
+        """
+        Routes content, incident and feed_items status writes through a write-behind BulkWriter,
+        and entity resolution through a run-wide EntitySink.
+        """
+        if self.supabase and self.writer is None:
+            self.writer = BulkWriter(self.supabase, max_rows=max_rows, max_delay=max_delay)
+            self.entities = EntitySink(self.supabase, max_names=max_rows, max_delay=max_delay)
+
+    async def flush(self):
+        """Writes everything buffered so far (entities first, then rows)."""
+        if self.entities is not None:
+            await self.entities.flush()
+        if self.writer is not None:
+            await self.writer.flush()
+
+    async def close(self):
+        """Flushes buffered writes. Called once at the end of the run."""
+        if self.entities is not None:
+            await self.entities.close()
+            Actor.log.info(f"👥 Entities: {self.entities.stats()}")
+        if self.writer is not None:
+            await self.writer.close()
+            Actor.log.info(f"💾 Bulk writes: {self.writer.stats()}")
+
+    async def _upsert(self, schema: str, table: str, data: Dict[str, Any], on_conflict: str):
+        """Buffered upsert when bulk writes are enabled, otherwise an immediate one."""
+        if self.writer is not None:
+            self.writer.add(schema, table, data, on_conflict)
         else:
-            try:
-                self.supabase: Client = create_client(self.url, self.key)
-            except Exception as e:
-                Actor.log.error(f"Failed to connect to Supabase: {e}")
-                self.supabase = None
+            await execute(self.supabase.schema(schema).table(table).upsert(data, on_conflict=on_conflict))
 
-    def _generate_dedup_hash(self, title: str, url: str) -> str:
-        """Generates a consistent MD5 hash for deduplication."""
-        return hashlib.md5(f"{title}{url}".encode()).hexdigest()
+    def _generate_dedup_hash(self, url: str) -> str:
+        """
+        Generates a consistent MD5 hash for deduplication from the canonical URL.
+        Title edits and tracking/AMP variants of the same page map to the same row.
+        """
+        return dedup_hash(url)
 
     def _get_target_table(self, niche: str) -> tuple[str, str]:
         """
@@ -75,20 +109,132 @@ class SupabaseIngestor:
             return False
 
         schema, table = self._get_target_table(niche)
+        url = canonicalize_url(url)
 
         try:
             # Special check for crime news (since it used to be entries)
             if niche == "crime":
                  # Check the new table
-                 res = self.supabase.schema("crime_intelligence").table("news").select("url").eq("url", url).execute()
+                 res = execute_sync(self.supabase.schema("crime_intelligence").table("news").select("url").eq("url", url))
                  if len(res.data) > 0: return True
                  
-            res = self.supabase.schema(schema).table(table).select("url").eq("url", url).execute()
+            column = self._get_url_column(table)
+            res = execute_sync(self.supabase.schema(schema).table(table).select(column).eq(column, url))
             return len(res.data) > 0
         except Exception as e:
             # Fallback check in generic entries if specific table check fails (e.g. table doesn't exist yet)
             return False
         
+    def _get_url_column(self, table: str) -> str:
+        """Returns the column holding the article URL (also the upsert conflict key)."""
+        return "source_url" if table == "election_news" else "url"
+
+    def find_existing_urls(self, schema: str, table: str, urls: List[str]) -> set:
+        """
+        Resolves which of the given URL keys (canonicalize_url) already exist in a table.
+        Uses chunked `in_` queries: one round-trip per DEDUP_CHUNK_SIZE URLs.
+        """
+        if not self.supabase or not urls:
+            return set()
+
+        column = self._get_url_column(table)
+        existing = set()
+        for i in range(0, len(urls), DEDUP_CHUNK_SIZE):
+            chunk = urls[i:i + DEDUP_CHUNK_SIZE]
+            try:
+                res = execute_sync(self.supabase.schema(schema).table(table).select(column).in_(column, chunk))
+                existing.update(row[column] for row in res.data if row.get(column))
+            except Exception as e:
+                # Same policy as check_exists: if the table can't be queried, treat URLs as new
+                Actor.log.warning(f"Dedup lookup failed for {schema}.{table}: {e}")
+        return existing
+
+    def find_feed_canonicals(self, urls: List[str]) -> Dict[str, str]:
+        """
+        Maps feed URLs to the rel=canonical URL their content was stored under on an earlier run
+        (recorded in feed_items.metadata). Chunked `in_` lookups on dedup_hash.
+        """
+        if not self.supabase or not urls:
+            return {}
+
+        by_hash = {self._generate_dedup_hash(url): url for url in urls}
+        hashes = list(by_hash)
+        canonicals = {}
+        for i in range(0, len(hashes), DEDUP_CHUNK_SIZE):
+            chunk = hashes[i:i + DEDUP_CHUNK_SIZE]
+            try:
+                res = execute_sync(self.supabase.schema("ai_intelligence").table("feed_items").select("dedup_hash,metadata").in_("dedup_hash", chunk))
+                for row in res.data:
+                    canonical = (row.get("metadata") or {}).get("canonical_url")
+                    if canonical and row.get("dedup_hash") in by_hash:
+                        canonicals[by_hash[row["dedup_hash"]]] = canonical
+            except Exception as e:
+                Actor.log.warning(f"Canonical lookup failed for feed_items: {e}")
+        return canonicals
+
+    def filter_existing(self, articles: List[ArticleCandidate], niches: List[str]) -> List[ArticleCandidate]:
+        """
+        Bulk deduplication pre-pass. Groups articles by target table (from their niche),
+        resolves existence per table and returns only the articles not yet stored.
+        An article counts as stored under its feed URL or under the rel=canonical URL an
+        earlier run stored its content under.
+        """
+        if not self.supabase or not articles:
+            return articles
+
+        canonicals = self.find_feed_canonicals([article.url for article in articles])
+
+        def stored_urls(article: ArticleCandidate) -> List[str]:
+            key = canonicalize_url(article.url)
+            return [key] + ([canonicals[article.url]] if article.url in canonicals else [])
+
+        by_table: Dict[tuple, List[str]] = {}
+        for article, niche in zip(articles, niches):
+            by_table.setdefault(self._get_target_table(niche), []).extend(stored_urls(article))
+
+        known = set()
+        for (schema, table), urls in by_table.items():
+            found = self.find_existing_urls(schema, table, list(dict.fromkeys(urls)))
+            known.update((schema, table, url) for url in found)
+
+        return [
+            article for article, niche in zip(articles, niches)
+            if not any((*self._get_target_table(niche), url) in known for url in stored_urls(article))
+        ]
+
+    def feed_item_metadata(self, article: ArticleCandidate) -> Optional[Dict[str, Any]]:
+        """
+        Metadata of the article's feed_items row if an earlier run analyzed it
+        (sentiment set and not Error/Duplicate), otherwise None.
+        """
+        if not self.supabase:
+            return None
+        try:
+            res = execute_sync(
+                self.supabase.schema("ai_intelligence").table("feed_items")
+                .select("sentiment_label,metadata").eq("dedup_hash", self._generate_dedup_hash(article.url))
+            )
+        except Exception as e:
+            Actor.log.warning(f"Feed item lookup failed: {e}")
+            return None
+        for row in res.data:
+            if row.get("sentiment_label") not in (None, "Error", "Duplicate"):
+                return row.get("metadata") or {}
+        return None
+
+    async def record_canonical(self, article: ArticleCandidate, metadata: Dict[str, Any]):
+        """Stores the feed URL -> rel=canonical mapping on an already analyzed feed_items row."""
+        if not self.supabase or not article.canonical_url:
+            return
+        try:
+            await execute(
+                self.supabase.schema("ai_intelligence").table("feed_items")
+                .update({"metadata": {**metadata, "canonical_url": article.canonical_url}})
+                .eq("dedup_hash", self._generate_dedup_hash(article.url))
+            )
+        except Exception as e:
+            Actor.log.warning(f"Failed to record canonical URL: {e}")
+
     def _parse_date(self, date_str: str) -> str:
         """
         Validates and parses a date string. Returns None if invalid format.
@@ -110,6 +256,7 @@ class SupabaseIngestor:
         """
         Saves raw RSS articles to feed_items table before analysis.
         Ensures traceability even if processing fails later.
+        Rows that already exist are left untouched, so an earlier run's analysis is never reset.
         """
         if not self.supabase or not articles:
             return
@@ -122,14 +269,14 @@ class SupabaseIngestor:
                 "origin_feed": art.source,
                 "published_at": self._parse_date(art.published) or "now()",
                 "image_url": art.image_url,
-                "dedup_hash": self._generate_dedup_hash(art.title, art.url),
+                "dedup_hash": self._generate_dedup_hash(art.url),
                 "sentiment_label": None, # Unprocessed
                 "created_at": "now()"
             })
 
         try:
-            # Batch upsert by dedup_hash
-            self.supabase.schema("ai_intelligence").table("feed_items").upsert(payloads, on_conflict="dedup_hash").execute()
+            # Batch insert by dedup_hash, skipping rows already there
+            await execute(self.supabase.schema("ai_intelligence").table("feed_items").upsert(payloads, on_conflict="dedup_hash", ignore_duplicates=True))
             Actor.log.info(f"📥 Buffered {len(payloads)} raw articles to feed_items.")
         except Exception as e:
             Actor.log.warning(f"Failed to buffer raw articles: {e}")
@@ -158,10 +305,18 @@ class SupabaseIngestor:
         await self._route_content(analysis, raw_data)
 
     async def _update_feed_item_status(self, analysis: AnalysisResult, article: ArticleCandidate):
-        """Updates the feed_items record with analysis results."""
+        """
+        Updates the feed_items record with analysis results.
+        Written as an upsert on dedup_hash (with the row's required columns) so it can be batched.
+        """
+        if not self.supabase:
+            return
         try:
-            dedup_hash = self._generate_dedup_hash(article.title, article.url)
             update_data = {
+                "dedup_hash": self._generate_dedup_hash(article.url),
+                "title": article.title,
+                "url": article.url,
+                "origin_feed": article.source,
                 "sentiment_label": analysis.sentiment,
                 "summary": analysis.summary,
                 "entities_mentioned": analysis.key_entities,
@@ -169,14 +324,18 @@ class SupabaseIngestor:
                 "region": analysis.location,
                 "metadata": {
                     "detected_niche": analysis.detected_niche,
+                    "canonical_url": article.canonical_url,
                     "processed_at": datetime.now().isoformat()
                 }
             }
-            self.supabase.schema("ai_intelligence").table("feed_items").update(update_data).eq("dedup_hash", dedup_hash).execute()
+            await self._upsert("ai_intelligence", "feed_items", update_data, on_conflict="dedup_hash")
         except Exception as e:
             Actor.log.warning(f"Failed to update feed_item status: {e}")
 
     async def _ingest_rich_entities(self, analysis: AnalysisResult):
+        """Queues people, organizations and syndicates on the EntitySink (resolved in bulk)."""
+        sink = self.entities or EntitySink(self.supabase)
+
         # People
         if analysis.people:
             for p in analysis.people:
@@ -185,63 +344,35 @@ class SupabaseIngestor:
                     await self._ingest_special_person(p, analysis)
                 else:
                     # General master identity
-                    await self._ingest_person_identity(p)
+                    sink.add("person", p.name, {
+                        "full_name": p.name,
+                        "type": p.role,
+                        "contact_verified": False,
+                        "data_sources_count": 1,
+                        "last_seen_at": "now()"
+                    })
 
         # Organizations
         if analysis.organizations:
             for o in analysis.organizations:
-                await self._ingest_organization(o)
-
-    async def _ingest_person_identity(self, person):
-        try:
-            data = {
-                "full_name": person.name,
-                "type": person.role,
-                "contact_verified": False,
-                "data_sources_count": 1,
-                "last_seen_at": "now()"
-            }
-            # Check exist first
-            res = self.supabase.schema("people_intelligence").table("master_identities").select("id").eq("full_name", person.name).execute()
-            if res.data:
-                self.supabase.schema("people_intelligence").table("master_identities").update({"last_seen_at": "now()"}).eq("id", res.data[0]['id']).execute()
-            else:
-                self.supabase.schema("people_intelligence").table("master_identities").insert(data).execute()
-        except Exception as e:
-            Actor.log.warning(f"Person ingest warning: {e}")
-
-    async def _ingest_organization(self, org):
-        try:
-            if org.type in ["Syndicate", "Gang"]:
-                # Syndicate table
-                await self._ingest_syndicate(org)
-                return
-
-            data = {
-                "registered_name": org.name,
-                "type": org.type,
-                "created_at": "now()"
-            }
-            res = self.supabase.schema("business_intelligence").table("organizations").select("id").eq("registered_name", org.name).execute()
-            if not res.data:
-                self.supabase.schema("business_intelligence").table("organizations").insert(data).execute()
-        except Exception as e:
-             Actor.log.warning(f"Org ingest warning: {e}")
+                if o.type in ["Syndicate", "Gang"]:
+                    sink.add("syndicate", o.name, {
+                        "name": o.name,
+                        "type": o.type,
+                        "primary_territory": "South Africa",
+                        "metadata": {"details": o.details},
+                        "created_at": "now()"
+                    })
+                else:
+                    sink.add("organization", o.name, {
+                        "registered_name": o.name,
+                        "type": o.type,
+                        "created_at": "now()"
+                    })
 
-    async def _ingest_syndicate(self, org):
-        try:
-            payload = {
-                "name": org.name,
-                "type": org.type, 
-                "primary_territory": "South Africa", 
-                "metadata": {"details": org.details},
-                "created_at": "now()"
-            }
-            res = self.supabase.schema("crime_intelligence").table("syndicates").select("id").eq("name", payload["name"]).execute()
-            if not res.data:
-                 self.supabase.schema("crime_intelligence").table("syndicates").insert(payload).execute()
-        except Exception as e:
-            Actor.log.warning(f"Syndicate ingest warning: {e}")
+        if sink is not self.entities:
+            # No run-wide sink: still one lookup/insert per table for this article
+            await sink.close()
 
     async def _ingest_special_person(self, person, analysis):
         # Wanted or Missing
@@ -266,14 +397,14 @@ class SupabaseIngestor:
                 "occurred_at": occurred_at,
                 "type": incident.type,
                 "severity_level": incident.severity,
-                "source_url": raw.get("url"),
+                "source_url": canonicalize_url(raw.get("canonical_url") or raw.get("url")),
                 "status": "reported",
                 "location": incident.location or analysis.location,
                 "published_at": self._parse_date(raw.get("published")) or "now()",
                 "image_url": raw.get("image_url")
             }
             # source_url is unique in schema
-            self.supabase.schema("crime_intelligence").table("incidents").upsert(data, on_conflict="source_url").execute()
+            await self._upsert("crime_intelligence", "incidents", data, on_conflict="source_url")
             Actor.log.info(f"🚨 Ingested Incident: {data['title']}")
         except Exception as e:
             Actor.log.warning(f"Error ingesting incident: {e}")
@@ -298,7 +429,7 @@ class SupabaseIngestor:
         # Prepare Payload
         data = {
             "title": raw.get("title"),
-            "url": raw.get("url"),
+            "url": canonicalize_url(raw.get("canonical_url") or raw.get("url")),
             "published_at": self._parse_date(raw.get("published")) or "now()",
             "category": analysis.category,
             "summary": analysis.summary,
@@ -419,7 +550,7 @@ class SupabaseIngestor:
                       data["sentiment"] = 0
 
             # Standard Upsert
-            self.supabase.schema(target_schema).table(target_table).upsert(data, on_conflict=conflict_col).execute()
+            await self._upsert(target_schema, target_table, data, on_conflict=conflict_col)
             Actor.log.info(f"{icon} Upserted {target_schema}.{target_table}")
 
         except Exception as e:
@@ -1,186 +1,203 @@
 import os
+import re
+import asyncio
 import json
-from openai import OpenAI, RateLimitError
+import time
+from typing import Any, Callable, Dict, Optional
+from openai import AsyncOpenAI, RateLimitError
 from apify import Actor
 from ..models import AnalysisResult
-from langchain_core.output_parsers import PydanticOutputParser
-from langchain_core.prompts import ChatPromptTemplate
+from .cache import AnalysisCache
+from .ratelimit import TokenBucket, CircuitBreaker
+from .prompts import get_prompt
+from .context import reduce_context, DEFAULT_TOKEN_BUDGET
+from .tokens import encoding_name
+from .metrics import METRICS
 
-# Global set to track models that have failed (404, 400) or been rate-limited (429)
-FAILED_MODELS = set()
+# Overridable so the offline benchmark (benchmarks/bench_pipeline.py) can point at a local stand-in
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
 
-# --- HELPER: Niche Prompts ---
-def get_niche_instructions(niche: str) -> str:
-    niche = niche.lower()
-    
-    if niche == "gaming":
-        return """
-        EXTRACT GAMING INTEL:
-        - game_studio: Developer or Publisher name.
-        - game_genre: E.g., RPG, FPS, Strategy.
-        - platform: List of platforms (PC, PS5, Xbox, Switch, Mobile).
-        - release_status: Announced, Released, Delayed, Cancelled.
-        """
-    elif niche == "crime":
-        return """
-        EXTRACT CRIME & SAFETY INTEL:
-        - incidents: List of specific events (Robbery, Protest, Hijacking) with:
-            - type: The crime/incident type.
-            - description: Brief summary of what happened.
-            - location: Specific street/suburb/city.
-            - severity: 1 (Minor) to 3 (Critical/Fatal).
-        - people: Suspects (Wanted/Arrested), Victims, Officials.
-        - organizations: Gangs (e.g. 'Fast Guns'), Security Companies, Police Units.
-        """
-    elif niche == "politics" or niche == "gov":
-        return """
-        EXTRACT POLITICAL INTEL:
-        - people: Politicians, Government Officials.
-        - organizations: Political Parties (ANC, DA, EFF), Government Departments.
-        - sentiment: Analyze if this is positive/negative for the ruling party or opposition.
-        """
-    elif niche == "realestate":
-        return """
-        EXTRACT REAL ESTATE INTEL:
-        - property_type: Residential, Commercial, Industrial, etc.
-        - listing_price: Extracted price string (e.g., "$1.5M").
-        - sqft: Square footage/meterage size context.
-        - market_status: Hot, Cooling, Crash, Boom.
-        """
-    elif niche == "vc":
-        return """
-        EXTRACT VC / STARTUP INTEL:
-        - company_name: The main startup being funded or discussed.
-        - round_type: Seed, Series A, IPO, Acquisition.
-        - funding_amount: Amount raised (e.g., "$10M").
-        - investor_list: List of VC firms or angels mentioned.
-        """
-    elif niche == "crypto":
-        return """
-        EXTRACT CRYPTO INTEL:
-        - token_symbol: Ticker symbol (BTC, ETH, SOL).
-        - market_trend: Bullish, Bearish, Neutral.
-        - regulatory_impact: High, Medium, Low (regarding laws/sec).
-        """
-    elif niche == "energy":
-        return """
-        EXTRACT ENERGY INTEL:
-        - energy_type: Solar, Wind, Hydro, Coal, Nuclear, Gas, Grid.
-        - infrastructure_project: Name of power plant or project.
-        - capacity: Capacity in MW or GW (e.g. "500MW").
-        - status: Planned, Construction, Operational, Decommissioned.
-        - organizations: Energy companies (Eskom), IPPs.
-        """
-    elif niche == "motoring":
-        return """
-        EXTRACT MOTORING INTEL:
-        - vehicle_make: Toyota, BMW, Ford, etc.
-        - vehicle_model: Corolla, M3, F-150.
-        - vehicle_type: SUV, Sedan, EV, Truck, Hatchback.
-        - price_range: Estimated cost or listed price (e.g. "R500,000", "$30k").
-        """
-    elif niche == "sport":
-        return """
-        EXTRACT SPORT INTEL:
-        - sport_category: Classify the major domain (e.g., MMA, Boxing, BJJ, Karate, Football, Rugby).
-        - subcategories: Relevant tags (e.g., "Heavyweight", "Title Fight", "Submission Grappling", "Transfer").
-        """
-    
-    return "Extract People and Organizations mentioned."
+# Pacing per model. OpenRouter free models allow ~20 requests/minute; paid ones far more.
+FREE_MODEL_RATE = 20 / 60
+PAID_MODEL_RATE = 5.0
+# Longest we'll wait for a model's quota before moving on to the next model (seconds)
+MAX_PACING_WAIT = 5.0
+# Cooldown for models that answer 404/400 (removed or renamed upstream)
+INVALID_MODEL_COOLDOWN = 3600.0
+
+# Article-context token budget per model (llmModelTokenBudgets), TOKEN_BUDGET for the rest (llmTokenBudget)
+TOKEN_BUDGET = DEFAULT_TOKEN_BUDGET
+MODEL_TOKEN_BUDGETS: Dict[str, int] = {}
+
+# Shared client plus per-model pacing and circuit breakers (replace the old run-long FAILED_MODELS ban)
+_client: Optional[AsyncOpenAI] = None
+MODEL_BUCKETS: Dict[str, TokenBucket] = {}
+MODEL_BREAKERS: Dict[str, CircuitBreaker] = {}
+
+# Models to try in sequence (OpenRouter Free -> Cheap Capable)
+# Updated based on availability and reliability
+MODELS_SEQUENCE = [
+    "google/gemma-3-27b-it:free",              # Free - New Google model
+    "meta-llama/llama-3.3-70b-instruct:free",  # Free - Llama 3.3
+    "openai/gpt-oss-120b:free",               # Free - OpenAI OSS
+    "nvidia/nemotron-3-nano-30b-a3b:free",     # Free - Nvidia
+    "google/gemini-2.0-flash-001",             # Cheap Fallback - Reliable
+    "meta-llama/llama-3.3-70b-instruct"        # Cheap Fallback
+]
+
+def get_llm_client(api_key: str) -> AsyncOpenAI:
+    """Returns the process-wide async client (one connection pool for all analyses)."""
+    global _client
+    if _client is None:
+        _client = AsyncOpenAI(
+            base_url=OPENROUTER_BASE_URL,
+            api_key=api_key,
+            timeout=60.0,
+            max_retries=0 # Retries are handled by model fallback + breakers
+        )
+    return _client
+
+async def close_llm_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+def configure_token_budgets(default: int, per_model: Optional[Dict[str, int]] = None):
+    """Sets the context token budget for models without their own entry, and the per-model entries."""
+    global TOKEN_BUDGET
+    TOKEN_BUDGET = max(1, default)
+    MODEL_TOKEN_BUDGETS.clear()
+    MODEL_TOKEN_BUDGETS.update(per_model or {})
 
-def analyze_content(content: str, niche: str = "general", run_test_mode: bool = False) -> AnalysisResult:
+def token_budget(model_name: str) -> int:
+    return MODEL_TOKEN_BUDGETS.get(model_name, TOKEN_BUDGET)
+
+def max_token_budget() -> int:
+    """Largest budget of any model in the sequence (the pipeline pre-reduces to this once)."""
+    return max(token_budget(model_name) for model_name in MODELS_SEQUENCE)
+
+def fit_context(content: str, title: str = "", niche: str = "general") -> Dict[str, str]:
     """
-    Analyzes content using LLM to extract structured intelligence.
+    Article context for each model in the sequence, reduced to that model's budget and counted
+    with its tokenizer. One reduction per distinct (budget, tokenizer) pair.
+    Boilerplate was already dropped by the pipeline (and must stay for search-fallback context).
     """
-    if run_test_mode:
-        # Return mock data based on niche
-        if niche == "gaming":
-            return AnalysisResult(
-                sentiment="High Hype",
-                category="New Release",
-                key_entities=["Bethesda", "Elder Scrolls 6"],
-                summary="Bethesda announces new delay for Elder Scrolls 6.",
-                location="USA", city="Rockville", country="USA", is_south_africa=False,
-                game_studio="Bethesda", game_genre="RPG", platform=["PC", "Xbox"], release_status="Delayed"
-            )
-        # Default mock
-        return AnalysisResult(
-            sentiment="Neutral",
-            category="General News",
-            key_entities=["Test Entity"],
-            summary="This is a test summary.",
-            location="Global",
-            city=None,
-            country=None,
-            is_south_africa=False
-        )
+    fitted, reduced = {}, {}
+    for model_name in MODELS_SEQUENCE:
+        key = (token_budget(model_name), encoding_name(model_name))
+        if key not in reduced:
+            reduced[key] = reduce_context(content, title, niche, key[0], model_name, drop_boilerplate=False)
+        fitted[model_name] = reduced[key]
+    return fitted
 
-    parser = PydanticOutputParser(pydantic_object=AnalysisResult)
-    
-    niche_instructions = get_niche_instructions(niche)
-
-    # Construct the System Prompt
-    system_prompt = f"""
-    You are an expert Intelligence Analyst designated to the '{niche}' sector. 
-    Your goal is to extract structured, actionable intelligence from the provided article content.
-
-    MANDATORY EXTRACTION:
-    1. Sentiment: Is this 'High Hype' (viral/major news) or 'Low Hype'?
-    2. Category: Thematic classification (Technology, Business, Politics, Sports, etc.).
-    3. Entities: Key organizations, people, or products.
-    4. Geolocation: Identify the location context (City, Country). If relevant to South Africa, flag is_south_africa=True.
-    5. Detected Niche: If the article clearly belongs to a specific niche different from '{niche}', specify it (e.g. 'gaming', 'crypto', 'tech', 'nuclear', 'energy', 'education', 'foodtech', 'health', 'luxury', 'realestate', 'retail', 'social', 'vc', 'web3', 'politics', 'crime', 'sport'). Otherwise, leave null or repeat '{niche}'.
-    
-    RICH INTELLIGENCE (Populate these lists if applicable):
-    - incidents: detailed list of crime/safety incidents (type, description, severity 1-3 from context).
-    - people: detailed list of key figures (name, role, status e.g. 'Suspect', 'Official').
-    - organizations: detailed list of companies/groups (name, type e.g. 'Syndicate', 'Party').
+def get_bucket(model_name: str) -> TokenBucket:
+    if model_name not in MODEL_BUCKETS:
+        rate = FREE_MODEL_RATE if model_name.endswith(":free") else PAID_MODEL_RATE
+        MODEL_BUCKETS[model_name] = TokenBucket(rate=rate, capacity=max(1.0, rate * 5))
+    return MODEL_BUCKETS[model_name]
 
-    NICHE SPECIFIC INSTRUCTIONS:
-    {niche_instructions}
+def get_breaker(model_name: str) -> CircuitBreaker:
+    if model_name not in MODEL_BREAKERS:
+        MODEL_BREAKERS[model_name] = CircuitBreaker(threshold=3, cooldown=60.0)
+    return MODEL_BREAKERS[model_name]
 
-    OUTPUT FORMAT:
-    {parser.get_format_instructions()}
+def _observe_rate_headers(bucket: TokenBucket, headers, limited: bool = False) -> Optional[float]:
+    """
+    Feeds OpenRouter rate-limit headers into the model's bucket.
+    Returns the seconds until the quota resets (Retry-After wins), if known.
     """
+    reset_in = None
+    try:
+        if headers.get("retry-after"):
+            reset_in = float(headers["retry-after"])
+        elif headers.get("x-ratelimit-reset"):
+            # Epoch milliseconds
+            reset_in = max(0.0, float(headers["x-ratelimit-reset"]) / 1000 - time.time())
+        remaining = headers.get("x-ratelimit-remaining")
+        if remaining is not None:
+            bucket.observe(float(remaining), reset_in)
+        elif limited:
+            bucket.observe(0, reset_in)
+    except (TypeError, ValueError):
+        pass
+    return reset_in
+
+def analysis_cache_key(niche: str, prompt_version: str, model_name: str, content: str) -> str:
+    """Cache key over (niche, prompt template version, model, normalized content)."""
+    normalized = re.sub(r'\s+', ' ', content).strip()
+    return AnalysisCache.make_key(niche.lower(), prompt_version, model_name, normalized)
+
+def _mock_analysis(niche: str) -> AnalysisResult:
+    """Mock data used in test mode, based on niche."""
+    if niche == "gaming":
+        return AnalysisResult(
+            sentiment="High Hype",
+            category="New Release",
+            key_entities=["Bethesda", "Elder Scrolls 6"],
+            summary="Bethesda announces new delay for Elder Scrolls 6.",
+            location="USA", city="Rockville", country="USA", is_south_africa=False,
+            game_studio="Bethesda", game_genre="RPG", platform=["PC", "Xbox"], release_status="Delayed"
+        )
+    # Default mock
+    return AnalysisResult(
+        sentiment="Neutral",
+        category="General News",
+        key_entities=["Test Entity"],
+        summary="This is a test summary.",
+        location="Global",
+        city=None,
+        country=None,
+        is_south_africa=False
+    )
+
+def _cache_keys(niche: str, prompt_version: str, llm_inputs: Dict[str, str]) -> Dict[str, str]:
+    """Cache key for each candidate model (over that model's input), in preference order."""
+    return {
+        model_name: analysis_cache_key(niche, prompt_version, model_name, llm_inputs[model_name])
+        for model_name in MODELS_SEQUENCE
+    }
 
+async def _complete(system_prompt: str, user_content: Callable[[str], str]) -> tuple[Optional[str], Optional[str], Optional[Exception]]:
+    """
+    Runs one completion through the model sequence (pacing, breakers, fallback).
+    `user_content(model_name)` builds the user message for the model being tried.
+    Returns (llm_content, used_model, last_exception).
+    """
     openrouter_key = os.getenv("OPENROUTER_API_KEY")
 
     if not openrouter_key:
         Actor.log.error("❌ OPENROUTER_API_KEY missing.")
-        return AnalysisResult(sentiment="Error", category="Error", key_entities=[], summary="Missing API Keys", is_south_africa=False)
+        return None, None, ValueError("Missing API Keys")
 
-    client = OpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        api_key=openrouter_key,
-    )
-
-    llm_content = None
-    
-    # Models to try in sequence (OpenRouter Free -> Cheap Capable)
-    # Updated based on availability and reliability
-    models_sequence = [
-        "google/gemma-3-27b-it:free",              # Free - New Google model
-        "meta-llama/llama-3.3-70b-instruct:free",  # Free - Llama 3.3
-        "openai/gpt-oss-120b:free",               # Free - OpenAI OSS
-        "nvidia/nemotron-3-nano-30b-a3b:free",     # Free - Nvidia
-        "google/gemini-2.0-flash-001",             # Cheap Fallback - Reliable
-        "meta-llama/llama-3.3-70b-instruct"        # Cheap Fallback
-    ]
+    client = get_llm_client(openrouter_key)
 
     last_exception = None
-    for attempt_idx, model_name in enumerate(models_sequence):
-        # Skip if model is already marked as failed/rate-limited
-        if model_name in FAILED_MODELS:
-            Actor.log.info(f"⏭️ Skipping failed/rate-limited model: {model_name}")
+    for attempt_idx, model_name in enumerate(MODELS_SEQUENCE):
+        breaker = get_breaker(model_name)
+        bucket = get_bucket(model_name)
+
+        # Skip models whose quota won't free up soon, or whose breaker is cooling down
+        wait = bucket.reserve(MAX_PACING_WAIT)
+        if wait is None:
+            Actor.log.debug(f"⏭️ Skipping rate-limited model: {model_name}")
+            continue
+        if not breaker.allow():
+            bucket.refund()
+            Actor.log.debug(f"⏭️ Skipping cooling-down model: {model_name} ({breaker.remaining():.0f}s left)")
             continue
+        probe = breaker.probing
 
         try:
+            if wait > 0:
+                await asyncio.sleep(wait)
             Actor.log.info(f"🤖 Attempting analysis with OpenRouter Model: {model_name}")
-            completion = client.chat.completions.create(
+            started = time.perf_counter()
+            raw = await client.chat.completions.with_raw_response.create(
                 model=model_name,
                 messages=[
                     {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"Analyze this content:\n\n{content[:15000]}"}
+                    {"role": "user", "content": user_content(model_name)}
                 ],
                 extra_headers={
                     "HTTP-Referer": "https://github.com/MisterSeitz/niche-intelligence",
@@ -188,27 +205,90 @@ def analyze_content(content: str, niche: str = "general", run_test_mode: bool =
                 },
                 response_format={"type": "json_object"}
             )
-            llm_content = completion.choices[0].message.content
+            _observe_rate_headers(bucket, raw.headers)
+            completion = raw.parse()
+            METRICS.observe("llm_request_seconds", time.perf_counter() - started, model=model_name, outcome="ok")
+            if completion.usage is not None:
+                METRICS.inc("llm_tokens_total", completion.usage.prompt_tokens or 0, model=model_name, kind="prompt")
+                METRICS.inc("llm_tokens_total", completion.usage.completion_tokens or 0, model=model_name, kind="completion")
+            breaker.record_success()
             Actor.log.info(f"✅ Successfully used model: {model_name}")
-            break # Success!
+            return completion.choices[0].message.content, model_name, None
         except RateLimitError as e:
             last_exception = e
-            Actor.log.warning(f"⏳ RateLimitError with {model_name}: {e}. Marking as failed for this run.")
-            FAILED_MODELS.add(model_name)
+            METRICS.observe("llm_request_seconds", time.perf_counter() - started, model=model_name, outcome="rate_limited")
+            cooldown = _observe_rate_headers(bucket, e.response.headers, limited=True)
+            breaker.trip(cooldown)
+            Actor.log.warning(f"⏳ RateLimitError with {model_name}: {e}. Cooling down for {breaker.remaining():.0f}s.")
             continue # Try the next model
         except Exception as e:
             last_exception = e
-            # If 404 (Not Found) or 400 (Bad Request), mark as failed permanently
+            METRICS.observe("llm_request_seconds", time.perf_counter() - started, model=model_name, outcome="error")
+            # If 404 (Not Found) or 400 (Bad Request), the model is unusable: long cooldown
             error_str = str(e)
             if "404" in error_str or "400" in error_str or "not a valid model ID" in error_str:
-                 Actor.log.error(f"❌ Invalid Model {model_name}: {e}. Marking as failed for this run.")
-                 FAILED_MODELS.add(model_name)
+                 Actor.log.error(f"❌ Invalid Model {model_name}: {e}. Disabling for {INVALID_MODEL_COOLDOWN:.0f}s.")
+                 breaker.trip(INVALID_MODEL_COOLDOWN)
             else:
+                 breaker.record_failure()
                  Actor.log.error(f"❌ Error with {model_name}: {e}. Trying next model...")
             continue # Try the next model
+        finally:
+            if probe:
+                # Cancelled mid-probe: no outcome was recorded
+                breaker.release()
+
+    Actor.log.error(f"❌ All OpenRouter Models failed. Last error: {last_exception}")
+    return None, None, last_exception
+
+def _extract_json(llm_content: str) -> Any:
+    """Strips markdown fences and surrounding chatter, then parses the JSON object."""
+    # Check if content is wrapped in markdown code blocks
+    clean_content = llm_content.strip()
+    if clean_content.startswith('```json'):
+        clean_content = clean_content[7:]
+    if clean_content.startswith('```'):
+        clean_content = clean_content[3:]
+    if clean_content.endswith('```'):
+        clean_content = clean_content[:-3]
+    
+    # Only take the FIRST valid JSON block if multiple exist
+    # Sometimes LLMs output explanations after the code block
+    if "```" in clean_content:
+         clean_content = clean_content.split("```")[0]
+
+    # Use regex to extract the JSON object if there's still garbage around it
+    json_match = re.search(r'(\{.*\})', clean_content, re.DOTALL)
+    if json_match:
+        clean_content = json_match.group(1)
+
+    return json.loads(clean_content.strip())
+
+async def analyze_content(content: str, niche: str = "general", run_test_mode: bool = False, cache: Optional[AnalysisCache] = None, title: str = "") -> AnalysisResult:
+    """
+    Analyzes content using LLM to extract structured intelligence.
+    The content is fitted to each model's token budget (see fit_context).
+    With an AnalysisCache, previously validated results for the same input are reused.
+    """
+    if run_test_mode:
+        return _mock_analysis(niche)
+
+    prompt = get_prompt(niche)
+    llm_inputs = await asyncio.to_thread(fit_context, content, title, niche)
+
+    # Content-addressed cache: same niche + prompt + model + content => same analysis
+    cache_keys = _cache_keys(niche, prompt.version, llm_inputs) if cache is not None else {}
+    if cache is not None:
+        cached = cache.get_any(list(cache_keys.values()))
+        if cached is not None:
+            Actor.log.info(f"🧠 Analysis cache hit ({niche}).")
+            return AnalysisResult(**cached)
+
+    llm_content, used_model, last_exception = await _complete(
+        prompt.system_prompt, lambda model_name: f"Analyze this content:\n\n{llm_inputs[model_name]}"
+    )
             
     if llm_content is None:
-        Actor.log.error(f"❌ All OpenRouter Models failed. Last error: {last_exception}")
         return AnalysisResult(
             sentiment="Error",
             category="Error",
@@ -218,28 +298,12 @@ def analyze_content(content: str, niche: str = "general", run_test_mode: bool =
         )
 
     try:
-        # Check if content is wrapped in markdown code blocks
-        clean_content = llm_content.strip()
-        if clean_content.startswith('```json'):
-            clean_content = clean_content[7:]
-        if clean_content.startswith('```'):
-            clean_content = clean_content[3:]
-        if clean_content.endswith('```'):
-            clean_content = clean_content[:-3]
-        
-        # Only take the FIRST valid JSON block if multiple exist
-        # Sometimes LLMs output explanations after the code block
-        if "```" in clean_content:
-             clean_content = clean_content.split("```")[0]
-
-        # Use regex to extract the JSON object if there's still garbage around it
-        import re
-        json_match = re.search(r'(\{.*\})', clean_content, re.DOTALL)
-        if json_match:
-            clean_content = json_match.group(1)
-
-        data = json.loads(clean_content.strip())
-        return AnalysisResult(**data)
+        data = _extract_json(llm_content)
+        result = AnalysisResult(**data)
+        if cache is not None:
+            # Only validated results are cached, under the model that produced them
+            cache.put(cache_keys[used_model], result.model_dump(mode='json'))
+        return result
     except Exception as e:
         # If the LLM refused to answer (e.g. encrypted content), return a specific error result
         if "I cannot analyze" in llm_content or "encrypted" in llm_content.lower():
@@ -258,4 +322,132 @@ def analyze_content(content: str, niche: str = "general", run_test_mode: bool =
             key_entities=[],
             summary="Invalid JSON response from LLM",
             location=None, city=None, country=None, is_south_africa=False
-        )
\ No newline at end of file
+        )
+
+# --- BATCH MODE ---
+
+async def analyze_batch(items: Dict[str, str], niche: str = "general", cache: Optional[AnalysisCache] = None, titles: Optional[Dict[str, str]] = None) -> Dict[str, Optional[AnalysisResult]]:
+    """
+    Analyzes several same-niche articles in one request.
+    Returns {article_id: result}; items that are missing or fail validation map to None
+    so the caller can re-run only those individually.
+    """
+    results: Dict[str, Optional[AnalysisResult]] = {item_id: None for item_id in items}
+    titles = titles or {}
+    # Fitted per model like analyze_content; the cache is keyed on exactly what is sent
+    inputs = await asyncio.to_thread(
+        lambda: {item_id: fit_context(content, titles.get(item_id, ""), niche) for item_id, content in items.items()}
+    )
+
+    # Keyed on the batch prompt's version: results produced under it are cached under it
+    prompt = get_prompt(niche)
+    keys = {}
+    if cache is not None:
+        for item_id, llm_inputs in inputs.items():
+            keys[item_id] = _cache_keys(niche, prompt.batch_version, llm_inputs)
+            cached = cache.get_any(list(keys[item_id].values()))
+            if cached is not None:
+                results[item_id] = AnalysisResult(**cached)
+
+    pending = [item_id for item_id in inputs if results[item_id] is None]
+    if not pending:
+        return results
+
+    def user_content(model_name: str) -> str:
+        return "Analyze these articles:\n\n" + "\n\n".join(
+            f"### ARTICLE {item_id}\n{inputs[item_id][model_name]}" for item_id in pending
+        )
+
+    Actor.log.info(f"📦 Batched analysis: {len(pending)} '{niche}' articles in one request.")
+    llm_content, used_model, _ = await _complete(prompt.batch_prompt, user_content)
+    if llm_content is None:
+        return results
+
+    try:
+        data = _extract_json(llm_content)
+        entries = data.get("results", []) if isinstance(data, dict) else data
+    except Exception as e:
+        Actor.log.warning(f"Batch JSON Parse failed: {e}")
+        return results
+
+    # Validate each item on its own: one bad entry does not sink the batch
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        item_id = str(entry.pop("article_id", ""))
+        if item_id not in pending or results[item_id] is not None:
+            continue
+        try:
+            results[item_id] = AnalysisResult(**entry)
+            if cache is not None:
+                cache.put(keys[item_id][used_model], results[item_id].model_dump(mode='json'))
+        except Exception as e:
+            Actor.log.warning(f"Batch item {item_id} failed validation: {e}")
+    return results
+
+class AnalysisBatcher:
+    """
+    Micro-batcher for analyze_batch. Articles wait per niche until `batch_size`
+    have arrived or `linger` seconds pass, then go out as one request under the
+    shared LLM limit. Items the batch could not answer are re-run with analyze_content.
+    Content longer than `max_chars` is analyzed individually straight away.
+    """
+
+    def __init__(self, batch_size: int, limit: asyncio.Semaphore, cache: Optional[AnalysisCache] = None, linger: float = 3.0, max_chars: int = 4000):
+        self.batch_size = batch_size
+        self.limit = limit
+        self.cache = cache
+        self.linger = linger
+        self.max_chars = max_chars
+        self.pending: Dict[str, list] = {}
+        self.timers: Dict[str, asyncio.TimerHandle] = {}
+        self.tasks = set()
+        self.counter = 0
+
+    async def analyze(self, content: str, niche: str, title: str = "") -> AnalysisResult:
+        if len(content) > self.max_chars:
+            async with self.limit:
+                return await analyze_content(content, niche=niche, cache=self.cache, title=title)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.counter += 1
+        self.pending.setdefault(niche, []).append((f"a{self.counter}", content, title, future))
+
+        if len(self.pending[niche]) >= self.batch_size:
+            self._flush(niche)
+        elif niche not in self.timers:
+            self.timers[niche] = loop.call_later(self.linger, self._flush, niche)
+        return await future
+
+    def _flush(self, niche: str):
+        timer = self.timers.pop(niche, None)
+        if timer:
+            timer.cancel()
+        items = self.pending.pop(niche, [])
+        if items:
+            task = asyncio.create_task(self._run(items, niche))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _run(self, items: list, niche: str):
+        try:
+            results = {}
+            if len(items) > 1:
+                async with self.limit:
+                    results = await analyze_batch(
+                        {item_id: content for item_id, content, _, _ in items}, niche, self.cache,
+                        titles={item_id: title for item_id, _, title, _ in items},
+                    )
+            for item_id, content, title, future in items:
+                result = results.get(item_id)
+                if result is None:
+                    # Re-run only the items the batch could not answer
+                    async with self.limit:
+                        result = await analyze_content(content, niche=niche, cache=self.cache, title=title)
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            for _, _, _, future in items:
+                if not future.done():
+                    future.set_exception(e)
@@ -0,0 +1,154 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Tuple
+from apify import Actor
+
+# Latency buckets (seconds) for the Prometheus histograms
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, math.inf)
+# Records in the run's default key-value store
+REPORT_KEY = "PERFORMANCE_REPORT"
+PROMETHEUS_KEY = "PERFORMANCE_METRICS"
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _labels(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _percentile(ordered: List[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+class Histogram:
+    """Latency samples of one series. Samples are kept: a run observes thousands, not millions."""
+
+    def __init__(self):
+        self.samples: List[float] = []
+
+    def observe(self, value: float):
+        self.samples.append(value)
+
+    def summary(self) -> Dict[str, float]:
+        ordered = sorted(self.samples)
+        return {
+            "count": len(ordered),
+            "sum_s": round(sum(ordered), 4),
+            "p50_ms": round(_percentile(ordered, 0.5) * 1000, 1),
+            "p95_ms": round(_percentile(ordered, 0.95) * 1000, 1),
+            "max_ms": round(ordered[-1] * 1000, 1),
+        }
+
+    def buckets(self) -> List[Tuple[float, int]]:
+        return [(bound, sum(1 for v in self.samples if v <= bound)) for bound in BUCKETS]
+
+class Metrics:
+    """
+    Process-wide latency histograms and counters, labelled like Prometheus series
+    (e.g. stage_seconds{stage="scrape"}, llm_request_seconds{model=...}, db_seconds{table=...}).
+    `report()` builds the structured end-of-run report, `prometheus()` the text exposition.
+    Safe to record from worker threads.
+    """
+
+    def __init__(self):
+        self.histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def observe(self, name: str, seconds: float, **labels):
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            series.setdefault(_labels(labels), Histogram()).observe(seconds)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            key = _labels(labels)
+            series[key] = series.get(key, 0) + value
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Times the block (also across awaits) into the `name` histogram."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def summary(self, name: str) -> Dict[str, Dict[str, float]]:
+        """{label string: latency summary} for one histogram, slowest (by p95) first."""
+        series = self.histograms.get(name, {})
+        rows = {",".join(f"{k}={v}" for k, v in key) or "all": hist.summary() for key, hist in series.items()}
+        return dict(sorted(rows.items(), key=lambda item: item[1]["p95_ms"], reverse=True))
+
+    def hit_rates(self) -> Dict[str, float]:
+        """Hit rate per cache from cache_lookups_total{cache, result}."""
+        totals: Dict[str, List[float]] = {}
+        for key, value in self.counters.get("cache_lookups_total", {}).items():
+            labels = dict(key)
+            hits_lookups = totals.setdefault(labels.get("cache", "all"), [0, 0])
+            hits_lookups[1] += value
+            if labels.get("result") == "hit":
+                hits_lookups[0] += value
+        return {cache: round(hits / lookups, 3) for cache, (hits, lookups) in sorted(totals.items()) if lookups}
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "started_at": self.started,
+            "wall_seconds": round(time.time() - self.started, 2),
+            "latency": {name: self.summary(name) for name in sorted(self.histograms)},
+            "counters": {
+                name: {",".join(f"{k}={v}" for k, v in key) or "all": value for key, value in sorted(series.items())}
+                for name, series in sorted(self.counters.items())
+            },
+            "cache_hit_rate": self.hit_rates(),
+        }
+
+    def prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        def fmt(key: LabelKey, extra: str = "") -> str:
+            parts = [f'{k}="{_escape(v)}"' for k, v in key] + ([extra] if extra else [])
+            return "{" + ",".join(parts) + "}" if parts else ""
+
+        lines = []
+        for name, series in sorted(self.histograms.items()):
+            metric = f"niche_{name}"
+            lines.append(f"# TYPE {metric} histogram")
+            for key, hist in sorted(series.items()):
+                for bound, count in hist.buckets():
+                    le = "+Inf" if bound == math.inf else repr(bound)
+                    lines.append(f"{metric}_bucket{fmt(key, 'le=' + chr(34) + le + chr(34))} {count}")
+                lines.append(f"{metric}_sum{fmt(key)} {sum(hist.samples)}")
+                lines.append(f"{metric}_count{fmt(key)} {len(hist.samples)}")
+        for name, series in sorted(self.counters.items()):
+            metric = f"niche_{name}"
+            lines.append(f"# TYPE {metric} counter")
+            for key, value in sorted(series.items()):
+                lines.append(f"{metric}{fmt(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def log_summary(self):
+        """Short end-of-run summary: the slowest series of each kind."""
+        for name in ("stage_seconds", "feed_seconds", "llm_request_seconds", "db_seconds"):
+            rows = list(self.summary(name).items())[:3]
+            if rows:
+                slowest = "; ".join(f"{label} p50={s['p50_ms']:.0f}ms p95={s['p95_ms']:.0f}ms (n={s['count']})" for label, s in rows)
+                Actor.log.info(f"⏱️ {name}: {slowest}")
+        rates = self.hit_rates()
+        if rates:
+            Actor.log.info("⏱️ cache hit rate: " + ", ".join(f"{cache} {rate:.0%}" for cache, rate in rates.items()))
+
+    async def save(self):
+        """Writes the JSON report and the Prometheus text to the run's key-value store."""
+        try:
+            store = await Actor.open_key_value_store()
+            await store.set_value(REPORT_KEY, self.report())
+            await store.set_value(PROMETHEUS_KEY, self.prometheus(), content_type="text/plain; version=0.0.4")
+            Actor.log.info(f"📈 Performance report saved ({REPORT_KEY}, {PROMETHEUS_KEY}).")
+        except Exception as e:
+            Actor.log.warning(f"Performance report save failed: {e}")
+
+METRICS = Metrics()
@@ -1,15 +1,22 @@
+import asyncio
+import time
 import aiohttp
 from apify import Actor
-import os
+from typing import Any, Dict, List, Optional
+from .metrics import METRICS
 
-async def send_discord_alert(webhook_url: str, article_data: dict):
-    """
-    Sends a rich embed to Discord for High Hype articles.
-    """
-    if not webhook_url:
-        return
+# Discord webhook limits: 10 embeds and 6000 embed characters per message
+MAX_EMBEDS = 10
+MAX_MESSAGE_CHARS = 6000
+# How long the first alert of a burst waits for company before it is sent (seconds)
+LINGER_SECONDS = 2.0
+MAX_ATTEMPTS = 5
+# Longest close() waits for queued alerts to go out (seconds)
+DRAIN_TIMEOUT = 30.0
 
-    embed = {
+def build_embed(article_data: dict) -> Dict[str, Any]:
+    """Rich embed for a High Hype article."""
+    return {
         "title": f"🔥 {article_data.get('category', 'News')} Alert: {article_data.get('sentiment', 'High Hype')}",
         "description": article_data.get('ai_summary', "No summary available."),
         "url": article_data.get('url'),
@@ -36,17 +43,152 @@ async def send_discord_alert(webhook_url: str, article_data: dict):
         }
     }
 
-    payload = {
-        "username": "Niche Scout",
-        "embeds": [embed]
-    }
+def _embed_chars(embed: Dict[str, Any]) -> int:
+    """Characters Discord counts toward the per-message embed limit."""
+    chars = len(embed.get("title") or "") + len(embed.get("description") or "") + len(embed["footer"]["text"])
+    return chars + sum(len(f["name"]) + len(f["value"]) for f in embed.get("fields", []))
+
+class AlertDispatcher:
+    """
+    Background Discord webhook sender with one shared HTTP session.
+    `send()` only queues the alert, so the article never waits on Discord. A worker task
+    packs queued alerts into messages of up to MAX_EMBEDS embeds, waits out 429s for the
+    `retry_after` Discord reports and pauses when the webhook bucket is empty.
+    `close()` drains the queue on shutdown.
+    """
+
+    def __init__(self, webhook_url: str, linger: float = LINGER_SECONDS):
+        self.webhook_url = webhook_url
+        self.linger = linger
+        self.queue: List[Dict[str, Any]] = []
+        self.closing = False
+        self._wake = asyncio.Event()
+        self._worker: Optional[asyncio.Task] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.sent = 0
+        self.messages = 0
+        self.dropped = 0
+
+    def send(self, article_data: dict):
+        """Queues an alert for the article."""
+        self.queue.append(build_embed(article_data))
+        self._wake.set()
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def _wait(self, timeout: Optional[float] = None) -> bool:
+        """Waits for the next send()/close(). False on timeout."""
+        self._wake.clear()
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def _take_batch(self) -> List[Dict[str, Any]]:
+        batch, chars = [], 0
+        while self.queue and len(batch) < MAX_EMBEDS:
+            size = _embed_chars(self.queue[0])
+            if batch and chars + size > MAX_MESSAGE_CHARS:
+                break
+            batch.append(self.queue.pop(0))
+            chars += size
+        return batch
+
+    async def _run(self):
+        self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=15))
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self.queue:
+                if self.closing:
+                    return
+                await self._wait()
+                continue
+
+            # Let a burst build up so it goes out as one message
+            deadline = loop.time() + self.linger
+            while not self.closing and len(self.queue) < MAX_EMBEDS and loop.time() < deadline:
+                if not await self._wait(deadline - loop.time()):
+                    break
+
+            batch = self._take_batch()
+            if await self._post(batch):
+                self.sent += len(batch)
+                self.messages += 1
+                METRICS.inc("alerts_total", len(batch), outcome="sent")
+                Actor.log.info(f"📢 Discord notification sent ({len(batch)} alerts).")
+            else:
+                self.dropped += len(batch)
+                METRICS.inc("alerts_total", len(batch), outcome="dropped")
+
+    async def _post(self, embeds: List[Dict[str, Any]]) -> bool:
+        payload = {
+            "username": "Niche Scout",
+            "embeds": embeds
+        }
+        for attempt in range(MAX_ATTEMPTS):
+            started = time.perf_counter()
+            refill = None
+            try:
+                async with self._session.post(self.webhook_url, json=payload) as response:
+                    METRICS.observe("notify_seconds", time.perf_counter() - started, status=response.status)
+                    if response.status in (200, 204):
+                        refill = self._refill_wait(response.headers)
+                    elif response.status == 429:
+                        retry_after = await self._retry_after(response)
+                        Actor.log.warning(f"⏳ Discord rate limited. Retrying in {retry_after:.1f}s.")
+                        await asyncio.sleep(retry_after)
+                        continue
+                    elif response.status < 500:
+                        Actor.log.warning(f"⚠️ Discord webhook failed: {response.status}")
+                        return False
+                    else:
+                        Actor.log.warning(f"⚠️ Discord webhook failed: {response.status}. Retrying...")
+            except Exception as e:
+                METRICS.observe("notify_seconds", time.perf_counter() - started, status="error")
+                Actor.log.error(f"❌ Discord notification error: {e}")
+            if refill is not None:
+                # Delivered: nothing past this point may lead to a re-post
+                await asyncio.sleep(refill)
+                return True
+            await asyncio.sleep(2 ** attempt)
+        return False
+
+    @staticmethod
+    def _refill_wait(headers) -> float:
+        """Seconds to wait after a delivered message: the bucket's reset time once it is empty."""
+        if headers.get("X-RateLimit-Remaining") != "0":
+            return 0.0
+        try:
+            return float(headers.get("X-RateLimit-Reset-After") or 1)
+        except ValueError:
+            return 1.0
+
+    @staticmethod
+    async def _retry_after(response: aiohttp.ClientResponse) -> float:
+        """Seconds to wait after a 429: JSON `retry_after`, then the Retry-After header."""
+        try:
+            body = await response.json(content_type=None)
+            return float(body["retry_after"])
+        except Exception:
+            pass
+        try:
+            return float(response.headers.get("Retry-After") or 1)
+        except ValueError:
+            return 1.0
 
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(webhook_url, json=payload) as response:
-                if response.status == 204:
-                    Actor.log.info("📢 Discord notification sent.")
-                else:
-                    Actor.log.warning(f"⚠️ Discord webhook failed: {response.status}")
-    except Exception as e:
-        Actor.log.error(f"❌ Discord notification error: {e}")
+    async def close(self, timeout: float = DRAIN_TIMEOUT):
+        """Sends everything still queued (without lingering), then closes the session."""
+        self.closing = True
+        self._wake.set()
+        if self._worker is not None:
+            try:
+                await asyncio.wait_for(self._worker, timeout)
+            except asyncio.TimeoutError:
+                self.dropped += len(self.queue)
+                METRICS.inc("alerts_total", len(self.queue), outcome="dropped")
+                Actor.log.warning(f"⚠️ Discord drain timed out, {len(self.queue)} alerts not sent.")
+        if self._session is not None:
+            await self._session.close()
+        if self.messages or self.dropped:
+            Actor.log.info(f"📢 Discord: {self.sent} alerts in {self.messages} messages, {self.dropped} dropped.")
@@ -0,0 +1,457 @@
+import asyncio
+import time
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Callable, List, Optional
+from apify import Actor, Event
+from ..models import InputConfig, ArticleCandidate, DatasetRecord, AnalysisResult
+from .feeds import BalancedSelector
+from .scraper import scrape_article_content, configure_scraper, close_scraper, scrape_stats, SCRAPE_STATS
+from .search import brave_search_fallback, find_relevant_image, close_search_client, search_stats
+from .llm import analyze_content, close_llm_client, AnalysisBatcher, configure_token_budgets, max_token_budget
+from .notifications import AlertDispatcher
+from .ingestor import SupabaseIngestor
+from .db import configure_db, run_blocking, close_db
+from .cache import AnalysisCache, SearchCache, ImageCache
+from .prompts import PROMPTS
+from .context import reduce_context
+from .clustering import StoryClusterer
+from .urls import canonicalize_url
+from .checkpoint import RunCheckpoint
+from .metrics import METRICS
+
+VALID_NICHES = ['general', 'gaming', 'crypto', 'tech', 'nuclear', 'energy', 'education', 'foodtech', 'health', 'luxury', 'realestate', 'retail', 'social', 'vc', 'brics', 'politics', 'crime', 'sport', 'business', 'semiconductors']
+
+def resolve_niche(article: ArticleCandidate, config: InputConfig) -> str:
+    """Determines the working niche: article niche first, then config niche."""
+    niche = getattr(article, 'niche', None) or config.niche
+    # If niche is 'all', specific article niche should be set. If not, fallback to general.
+    if niche == 'all':
+        niche = 'general'
+    return niche
+
+async def dedup_articles(articles: List[ArticleCandidate], config: InputConfig, ingestor: SupabaseIngestor) -> List[ArticleCandidate]:
+    """
+    STRATEGY: Deduplication pre-pass.
+    Drops articles already stored in their target table before any scraping or LLM work.
+    Skipped when Force Refresh or Test Mode is ON.
+    """
+    if config.runTestMode or config.forceRefresh or not articles:
+        return articles
+
+    niches = [resolve_niche(a, config) for a in articles]
+    with METRICS.timer("stage_seconds", stage="dedup", call="filter_existing"):
+        fresh = await run_blocking(ingestor.filter_existing, articles, niches)
+    skipped = len(articles) - len(fresh)
+    if skipped:
+        Actor.log.info(f"⏭️ Skipping {skipped} duplicate articles already in the database.")
+    return fresh
+
+class ArticlePipeline:
+    """
+    Bounded-concurrency engine for the Scrape -> Fallback -> AI -> Save flow.
+
+    Every article runs as its own task. Each external stage (scrape, search, llm, db)
+    is guarded by its own semaphore, so the total work in flight is capped per service
+    instead of per article.
+    """
+
+    def __init__(self, config: InputConfig, ingestor: Optional[SupabaseIngestor] = None):
+        self.config = config
+        self.ingestor = ingestor or SupabaseIngestor()
+        self.limits = {
+            "scrape": asyncio.Semaphore(max(1, config.scrapeConcurrency)),
+            "search": asyncio.Semaphore(max(1, config.searchConcurrency)),
+            "llm": asyncio.Semaphore(max(1, config.llmConcurrency)),
+            "db": asyncio.Semaphore(max(1, config.dbConcurrency)),
+        }
+        configure_scraper(config.scrapeConcurrency, config.scrapePerHostConcurrency, config.scrapeMaxBytes)
+        configure_token_budgets(config.llmTokenBudget, config.llmModelTokenBudgets)
+        # Room for every db-stage call plus the background bulk flushes
+        configure_db(config.dbConcurrency * 2)
+        self.analysis_cache: Optional[AnalysisCache] = None
+        self.search_cache: Optional[SearchCache] = None
+        self.alerts = AlertDispatcher(config.discordWebhookUrl) if config.discordWebhookUrl else None
+        self.checkpoint: Optional[RunCheckpoint] = None
+        self.completed = False
+        self.image_cache: Optional[ImageCache] = None
+        self.batcher: Optional[AnalysisBatcher] = None
+        # Canonical dedup keys of every page taken on this run (feed URLs and rel=canonical targets)
+        self.seen_keys: set = set()
+
+    async def start(self):
+        """Loads persistent caches and precompiles prompts. Called once before processing begins."""
+        if not self.config.runTestMode:
+            PROMPTS.warm(VALID_NICHES)
+            self.analysis_cache = await AnalysisCache.load()
+            self.search_cache = await SearchCache.load()
+            self.image_cache = await ImageCache.load()
+            if self.config.llmBatchSize > 1:
+                self.batcher = AnalysisBatcher(self.config.llmBatchSize, self.limits["llm"], self.analysis_cache)
+            self.ingestor.enable_bulk_writes(self.config.dbBatchSize, self.config.dbFlushInterval)
+            if self.config.resumeInterruptedRuns:
+                self.checkpoint = await RunCheckpoint.load(self.config)
+                Actor.on(Event.PERSIST_STATE, self.persist_state)
+                Actor.on(Event.MIGRATING, self.persist_state)
+
+    async def resume(self) -> Optional[List[ArticleCandidate]]:
+        """
+        Unfinished articles of an interrupted run with the same input, or None if there is
+        nothing to resume. Records the interrupted run produced are pushed to this run's dataset.
+        """
+        if self.checkpoint is None or not self.checkpoint.resumed:
+            return None
+        self.checkpoint.resumed = False
+        articles = self.checkpoint.pending()
+        records = self.checkpoint.records_to_restore(Actor.configuration.actor_run_id)
+        if records:
+            await Actor.push_data(records)
+        Actor.log.info(
+            f"♻️ Resuming interrupted run ({self.checkpoint.stats()}): "
+            f"{len(articles)} articles left, {len(records)} records restored."
+        )
+        return articles
+
+    def track(self, articles: List[ArticleCandidate]):
+        """Adds articles about to be processed to the checkpoint queue."""
+        if self.checkpoint is not None:
+            self.checkpoint.track(articles)
+
+    def _mark(self, article: ArticleCandidate, stage: str, record: Optional[dict] = None):
+        if self.checkpoint is not None:
+            self.checkpoint.mark(article.url, stage, record)
+
+    async def persist_state(self, event_data: Any = None):
+        """PERSIST_STATE / MIGRATING handler: saves the checkpoint and the caches."""
+        if self.checkpoint is None:
+            return
+        snapshot = self.checkpoint.snapshot(Actor.configuration.actor_run_id)
+        # Rows of articles marked done may still be buffered: write them before the checkpoint says done
+        await self.ingestor.flush()
+        await self.checkpoint.save(snapshot)
+        for cache in (self.analysis_cache, self.search_cache, self.image_cache):
+            if cache is not None:
+                await cache.save()
+
+    async def complete(self):
+        """Marks the run as finished: its checkpoint is dropped instead of saved."""
+        self.completed = True
+        if self.checkpoint is not None:
+            await self.checkpoint.clear()
+
+    async def close(self):
+        """Flushes buffered writes, persists caches, reports their stats and releases shared network resources."""
+        if self.checkpoint is not None:
+            Actor.off(Event.PERSIST_STATE, self.persist_state)
+            Actor.off(Event.MIGRATING, self.persist_state)
+        await self.ingestor.close()
+        if self.checkpoint is not None and not self.completed:
+            # Interrupted (error/abort): keep what was finished for the next run
+            await self.checkpoint.save(self.checkpoint.snapshot(Actor.configuration.actor_run_id))
+            Actor.log.info(f"♻️ Checkpoint saved: {self.checkpoint.stats()}")
+        if self.alerts is not None:
+            await self.alerts.close()
+        if not self.config.runTestMode:
+            Actor.log.info(f"📉 Scraper downloads: {scrape_stats()}")
+            Actor.log.info(f"🦁 Brave keys: {search_stats()}")
+        if self.analysis_cache is not None:
+            Actor.log.info(f"🧠 Analysis cache: {self.analysis_cache.stats()}")
+            await self.analysis_cache.save()
+        for name, cache in (("Search", self.search_cache), ("Image", self.image_cache)):
+            if cache is not None:
+                Actor.log.info(f"🦁 {name} cache: {cache.stats()}")
+                await cache.save()
+        await close_scraper()
+        await close_llm_client()
+        await close_search_client()
+        await close_db()
+        await self._report_metrics()
+
+    async def _report_metrics(self):
+        """Folds run-level counters into METRICS, logs the slowest series and saves the report."""
+        METRICS.inc("scrape_pages_total", SCRAPE_STATS["pages"])
+        METRICS.inc("scrape_bytes_total", SCRAPE_STATS["bytes_read"], kind="read")
+        METRICS.inc("scrape_bytes_total", SCRAPE_STATS["bytes_saved"], kind="skipped")
+        METRICS.inc("scrape_bytes_total", SCRAPE_STATS["bytes_saved_estimated"], kind="skipped_estimated")
+        caches = (("analysis", self.analysis_cache), ("search", self.search_cache), ("image", self.image_cache))
+        for name, cache in caches:
+            if cache is not None:
+                METRICS.inc("cache_lookups_total", cache.hits, cache=name, result="hit")
+                METRICS.inc("cache_lookups_total", cache.misses, cache=name, result="miss")
+        METRICS.log_summary()
+        await METRICS.save()
+
+    async def _stage(self, stage: str, func: Callable, *args, **kwargs) -> Any:
+        """Runs a stage call under its concurrency limit. Blocking calls go to a worker thread (DB calls to the DB pool)."""
+        async with self.limits[stage]:
+            started = time.perf_counter()
+            try:
+                if asyncio.iscoroutinefunction(func):
+                    return await func(*args, **kwargs)
+                if stage == "db":
+                    return await run_blocking(func, *args, **kwargs)
+                return await asyncio.to_thread(func, *args, **kwargs)
+            finally:
+                METRICS.observe("stage_seconds", time.perf_counter() - started, stage=stage, call=func.__name__)
+
+    async def run(self, articles: List[ArticleCandidate]) -> List[DatasetRecord]:
+        """Processes all articles concurrently and returns the records that were produced."""
+        total = len(articles)
+        Actor.log.info(
+            f"⚙️ Processing {total} articles (scrape={self.config.scrapeConcurrency}, "
+            f"search={self.config.searchConcurrency}, llm={self.config.llmConcurrency}, db={self.config.dbConcurrency})"
+        )
+        results = await asyncio.gather(*(self.process(article, idx, total) for idx, article in enumerate(articles)))
+        return [r for r in results if r is not None]
+
+    async def run_stream(self, batches: AsyncIterator[List[ArticleCandidate]]) -> int:
+        """
+        Streaming mode: starts processing while feeds are still downloading.
+        Each arriving batch is deduplicated against the DB, passed through the
+        BalancedSelector, buffered to feed_items and dispatched immediately.
+        Returns the number of articles dispatched.
+        """
+        config = self.config
+        selector = BalancedSelector(config)
+        clusterer = StoryClusterer() if config.clusterNearDuplicates else None
+        tasks = []
+
+        async def dispatch(articles: List[ArticleCandidate]):
+            if not articles:
+                return
+            await self._stage("db", self.ingestor.ingest_raw_feed_items, articles)
+            self.track(articles)
+            for article in articles:
+                tasks.append(asyncio.create_task(self.process(article, len(tasks), config.maxArticles)))
+
+        async with aclosing(batches) as stream:
+            async for batch in stream:
+                fresh = await dedup_articles(batch, config, self.ingestor)
+                if clusterer is not None:
+                    # Later copies of an already dispatched story only add to its related_urls
+                    fresh = await asyncio.to_thread(clusterer.filter, fresh)
+                await dispatch(selector.offer(fresh))
+                if selector.full:
+                    Actor.log.info(f"🎯 Reached {config.maxArticles} articles, stopping feed stream early.")
+                    break
+
+        # Stream finished: fill remaining slots from the per-group reserve
+        await dispatch(selector.drain())
+        if clusterer is not None and clusterer.collapsed:
+            Actor.log.info(f"🧬 Collapsed {clusterer.collapsed} near-duplicate articles into existing stories.")
+        Actor.log.info(f"📚 Streamed {len(tasks)} articles into processing.")
+
+        await asyncio.gather(*tasks)
+        return len(tasks)
+
+    async def process(self, article: ArticleCandidate, idx: int = 0, total: int = 1) -> Optional[DatasetRecord]:
+        """Processes one article. Failures are contained and recorded against its feed item."""
+        self._mark(article, "scraping")
+        started = time.perf_counter()
+        try:
+            record = await self._process(article, idx, total)
+            METRICS.observe("stage_seconds", time.perf_counter() - started, stage="article", call="process")
+            self._mark(article, "done", record.model_dump(mode='json') if record else None)
+            return record
+        except Exception as e:
+            Actor.log.error(f"Analysis loop failed for {article.title}: {e}")
+            # Track failure in feed_items
+            error_analysis = AnalysisResult(
+                sentiment="Error",
+                summary=f"Processing failed: {str(e)}",
+                category="Error"
+            )
+            await self._stage("db", self.ingestor._update_feed_item_status, error_analysis, article)
+            self._mark(article, "failed")
+            return None
+
+    def _claim(self, url: str) -> bool:
+        """Registers a page for this run. False if it was already taken under any URL variant."""
+        key = canonicalize_url(url)
+        if key in self.seen_keys:
+            return False
+        self.seen_keys.add(key)
+        return True
+
+    async def _skip_duplicate(self, article: ArticleCandidate, canonical_url: str) -> None:
+        """Marks the feed item of a copy whose content is stored (or being stored) under another article."""
+        Actor.log.info(f"⏭️ Skipping duplicate of {canonical_url}: {article.title}")
+        duplicate = AnalysisResult(sentiment="Duplicate", category="Duplicate", summary=f"Duplicate of {canonical_url}")
+        await self._stage("db", self.ingestor._update_feed_item_status, duplicate, article)
+        return None
+
+    async def _process(self, article: ArticleCandidate, idx: int, total: int) -> Optional[DatasetRecord]:
+        config = self.config
+        Actor.log.info(f"👉 [{idx+1}/{total}] Processing: {article.title}")
+
+        # Duplicates were already dropped by the bulk pre-pass (see dedup_articles)
+        article_niche = resolve_niche(article, config)
+        if not self._claim(article.url):
+            return await self._skip_duplicate(article, article.url)
+
+        # 1. STRATEGY: Scrape First
+        page = await self._stage("scrape", scrape_article_content, article.url, config.runTestMode)
+        context = page.text
+        method = "scraped"
+
+        # The page's rel=canonical can reveal a copy already processed under another URL
+        if page.canonical_url and page.canonical_url != canonicalize_url(article.url):
+            article.canonical_url = page.canonical_url
+            if not self._claim(page.canonical_url):
+                return await self._skip_duplicate(article, page.canonical_url)
+            if not config.forceRefresh and await self._stage("db", self.ingestor.check_exists, page.canonical_url, article_niche):
+                # Stored by this same article on an earlier run (before its mapping was recorded):
+                # keep its analysis and record the mapping so the next pre-pass skips it
+                metadata = await self._stage("db", self.ingestor.feed_item_metadata, article)
+                if metadata is not None:
+                    Actor.log.info(f"⏭️ Already stored as {page.canonical_url}: {article.title}")
+                    await self._stage("db", self.ingestor.record_canonical, article, metadata)
+                    return None
+                return await self._skip_duplicate(article, page.canonical_url)
+
+        # Image Priority: Feed > Scraped > Brave Backfill
+        final_image_url = article.image_url or page.image_url
+
+        # 2. STRATEGY: Search Fallback
+        if not context:
+            Actor.log.info("⚠️ Scraping failed/blocked. Engaging Brave Search Fallback.")
+            context = await self._stage("search", brave_search_fallback, article.title, config.runTestMode, self.search_cache)
+            method = "search_fallback"
+
+        # 3. STRATEGY: Brave Image Backfill (If enabled and still no image)
+        if not final_image_url and config.enableBraveImageBackfill:
+            Actor.log.info(f"🖼️ Backfilling image for: {article.title}")
+            final_image_url = await self._stage("search", find_relevant_image, article.title, config.runTestMode, self.image_cache)
+
+        if not context:
+            # Scraping/Search failed case
+            Actor.log.warning(f"❌ Content extraction failed for: {article.title}")
+            error_analysis = AnalysisResult(
+                sentiment="Error",
+                summary="Failed to extract content (Scraping/Search blocked)",
+                category="Error"
+            )
+            await self._stage("db", self.ingestor._update_feed_item_status, error_analysis, article)
+            return None
+
+        # 4. Fit the context to the largest model token budget (lead + most relevant sentences);
+        # analyze_content trims it further per model. Search results have no page furniture to drop.
+        context = await asyncio.to_thread(
+            reduce_context, context, article.title, article_niche, max_token_budget(),
+            drop_boilerplate=method == "scraped"
+        )
+
+        # 5. STRATEGY: AI Analysis
+        self._mark(article, "analyzing")
+        if self.batcher is not None:
+            # The batcher takes the llm limit itself, once per request rather than per article
+            started = time.perf_counter()
+            analysis = await self.batcher.analyze(context, article_niche, article.title)
+            METRICS.observe("stage_seconds", time.perf_counter() - started, stage="llm", call="batch")
+        else:
+            analysis = await self._stage("llm", analyze_content, context, niche=article_niche, run_test_mode=config.runTestMode, cache=self.analysis_cache, title=article.title)
+
+        # --- DYNAMIC ROUTING ---
+        # If the LLM detects a better niche, we re-route.
+        if analysis.detected_niche:
+            clean_detected = analysis.detected_niche.lower().strip()
+            if clean_detected in VALID_NICHES and clean_detected != article_niche:
+                Actor.log.info(f"🔀 Re-routing article: '{article_niche}' -> '{clean_detected}'")
+                if not PROMPTS.get(article_niche).covers(clean_detected):
+                    # The trimmed schema had no fields for the target niche: ask again with its prompt
+                    analysis = await self._stage("llm", analyze_content, context, niche=clean_detected, run_test_mode=config.runTestMode, cache=self.analysis_cache, title=article.title)
+                    analysis.detected_niche = clean_detected
+                article_niche = clean_detected
+
+        # 6. 💰 MONETIZATION 💰
+        # We charge the user only when the 'summarize_snippets_with_llm' event succeeds.
+        if not config.runTestMode:
+            await Actor.charge(event_name="summarize_snippets_with_llm")
+
+        if analysis.sentiment == "Error" or "Analysis failed: <html>" in str(analysis.summary):
+            Actor.log.warning(f"⚠️ Analysis returned Error, skipping ingestion to DB: {article.title}")
+            # We still update the feed item status to reflect the error
+            await self._stage("db", self.ingestor._update_feed_item_status, analysis, article)
+        else:
+            # 7. INGESTION (to Feed Items & Specific Tables)
+            self._mark(article, "ingesting")
+            await self._stage("db", self.ingestor.ingest, analysis, article)
+
+        record = build_dataset_record(article, analysis, article_niche, final_image_url, method, context)
+
+        # Push to Apify Dataset
+        await Actor.push_data(record.model_dump(mode='json'))
+
+        # 8. 📢 NOTIFICATIONS
+        if self.alerts is not None and "High Hype" in record.sentiment:
+            self.alerts.send(record.model_dump())
+
+        return record
+
+def build_dataset_record(
+    article: ArticleCandidate,
+    analysis: AnalysisResult,
+    niche: str,
+    image_url: Optional[str],
+    method: str,
+    context: str
+) -> DatasetRecord:
+    """Creates the standardized dataset record for an analyzed article."""
+    return DatasetRecord(
+        niche=niche, # Use specific niche
+        source_feed=article.source,
+        title=article.title,
+        url=article.url,
+        image_url=image_url,
+        published=article.published,
+        method=method,
+        sentiment=analysis.sentiment,
+        category=analysis.category,
+        key_entities=analysis.key_entities,
+        ai_summary=analysis.summary,
+        location=analysis.location,
+        city=analysis.city,
+        country=analysis.country,
+        is_south_africa=analysis.is_south_africa,
+        raw_context_source=context[:200] + "...",
+        related_urls=article.related_urls,
+
+        # Rich Data (Dicts for dataset compatibility)
+        incidents=[i.model_dump() for i in analysis.incidents] if analysis.incidents else None,
+        people=[p.model_dump() for p in analysis.people] if analysis.people else None,
+        organizations=[o.model_dump() for o in analysis.organizations] if analysis.organizations else None,
+
+        # Niche Specific Mapping
+        game_studio=analysis.game_studio,
+        game_genre=analysis.game_genre,
+        platform=analysis.platform,
+        release_status=analysis.release_status,
+
+        property_type=analysis.property_type,
+        listing_price=analysis.listing_price,
+        sqft=analysis.sqft,
+        market_status=analysis.market_status,
+
+        company_name=analysis.company_name,
+        round_type=analysis.round_type,
+        funding_amount=analysis.funding_amount,
+        investor_list=analysis.investor_list,
+
+        token_symbol=analysis.token_symbol,
+        market_trend=analysis.market_trend,
+        regulatory_impact=analysis.regulatory_impact,
+
+        energy_type=analysis.energy_type,
+        infrastructure_project=analysis.infrastructure_project,
+        capacity=analysis.capacity,
+        status=analysis.status,
+
+        # Motoring
+        vehicle_make=analysis.vehicle_make,
+        vehicle_model=analysis.vehicle_model,
+        vehicle_type=analysis.vehicle_type,
+        price_range=analysis.price_range,
+
+        # Sport
+        sport_category=analysis.sport_category,
+        subcategories=analysis.subcategories
+    )
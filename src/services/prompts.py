@@ -0,0 +1,198 @@
+import hashlib
+from typing import Dict, List, Type
+from pydantic import BaseModel, create_model
+from apify import Actor
+from ..models import AnalysisResult
+from .tokens import count_tokens
+from langchain_core.output_parsers import PydanticOutputParser
+
+# Fields every niche extracts (see MANDATORY EXTRACTION / RICH INTELLIGENCE in the prompt)
+COMMON_FIELDS = [
+    "sentiment", "category", "key_entities", "summary", "location", "city", "country",
+    "is_south_africa", "detected_niche", "incidents", "people", "organizations", "niche_data"
+]
+
+# Niche-specific AnalysisResult fields. Niches not listed only get COMMON_FIELDS.
+NICHE_FIELDS: Dict[str, List[str]] = {
+    "gaming": ["game_studio", "game_genre", "platform", "release_status"],
+    "realestate": ["property_type", "listing_price", "sqft", "market_status"],
+    "vc": ["company_name", "round_type", "funding_amount", "investor_list"],
+    "crypto": ["token_symbol", "market_trend", "regulatory_impact"],
+    "energy": ["energy_type", "infrastructure_project", "capacity", "status"],
+    "motoring": ["vehicle_make", "vehicle_model", "vehicle_type", "price_range"],
+    "sport": ["sport_category", "subcategories"],
+}
+
+# Niches that keep the full schema: 'general' articles are the ones most often re-routed
+FULL_SCHEMA_NICHES = {"general"}
+
+BATCH_INSTRUCTIONS = """
+    BATCH MODE:
+    You will receive several articles, each introduced by a line "### ARTICLE <id>".
+    Analyze every article independently with the rules above.
+    Respond with ONE JSON object of the form {"results": [ ... ]} containing one entry per article.
+    Each entry is an object following the OUTPUT FORMAT above plus an "article_id" field set to the article's <id>.
+    """
+
+# --- HELPER: Niche Prompts ---
+
+def get_niche_instructions(niche: str) -> str:
+    niche = niche.lower()
+    
+    if niche == "gaming":
+        return """
+        EXTRACT GAMING INTEL:
+        - game_studio: Developer or Publisher name.
+        - game_genre: E.g., RPG, FPS, Strategy.
+        - platform: List of platforms (PC, PS5, Xbox, Switch, Mobile).
+        - release_status: Announced, Released, Delayed, Cancelled.
+        """
+    elif niche == "crime":
+        return """
+        EXTRACT CRIME & SAFETY INTEL:
+        - incidents: List of specific events (Robbery, Protest, Hijacking) with:
+            - type: The crime/incident type.
+            - description: Brief summary of what happened.
+            - location: Specific street/suburb/city.
+            - severity: 1 (Minor) to 3 (Critical/Fatal).
+        - people: Suspects (Wanted/Arrested), Victims, Officials.
+        - organizations: Gangs (e.g. 'Fast Guns'), Security Companies, Police Units.
+        """
+    elif niche == "politics" or niche == "gov":
+        return """
+        EXTRACT POLITICAL INTEL:
+        - people: Politicians, Government Officials.
+        - organizations: Political Parties (ANC, DA, EFF), Government Departments.
+        - sentiment: Analyze if this is positive/negative for the ruling party or opposition.
+        """
+    elif niche == "realestate":
+        return """
+        EXTRACT REAL ESTATE INTEL:
+        - property_type: Residential, Commercial, Industrial, etc.
+        - listing_price: Extracted price string (e.g., "$1.5M").
+        - sqft: Square footage/meterage size context.
+        - market_status: Hot, Cooling, Crash, Boom.
+        """
+    elif niche == "vc":
+        return """
+        EXTRACT VC / STARTUP INTEL:
+        - company_name: The main startup being funded or discussed.
+        - round_type: Seed, Series A, IPO, Acquisition.
+        - funding_amount: Amount raised (e.g., "$10M").
+        - investor_list: List of VC firms or angels mentioned.
+        """
+    elif niche == "crypto":
+        return """
+        EXTRACT CRYPTO INTEL:
+        - token_symbol: Ticker symbol (BTC, ETH, SOL).
+        - market_trend: Bullish, Bearish, Neutral.
+        - regulatory_impact: High, Medium, Low (regarding laws/sec).
+        """
+    elif niche == "energy":
+        return """
+        EXTRACT ENERGY INTEL:
+        - energy_type: Solar, Wind, Hydro, Coal, Nuclear, Gas, Grid.
+        - infrastructure_project: Name of power plant or project.
+        - capacity: Capacity in MW or GW (e.g. "500MW").
+        - status: Planned, Construction, Operational, Decommissioned.
+        - organizations: Energy companies (Eskom), IPPs.
+        """
+    elif niche == "motoring":
+        return """
+        EXTRACT MOTORING INTEL:
+        - vehicle_make: Toyota, BMW, Ford, etc.
+        - vehicle_model: Corolla, M3, F-150.
+        - vehicle_type: SUV, Sedan, EV, Truck, Hatchback.
+        - price_range: Estimated cost or listed price (e.g. "R500,000", "$30k").
+        """
+    elif niche == "sport":
+        return """
+        EXTRACT SPORT INTEL:
+        - sport_category: Classify the major domain (e.g., MMA, Boxing, BJJ, Karate, Football, Rugby).
+        - subcategories: Relevant tags (e.g., "Heavyweight", "Title Fight", "Submission Grappling", "Transfer").
+        """
+    
+    return "Extract People and Organizations mentioned."
+
+def response_schema(niche: str) -> Type[BaseModel]:
+    """Subset of AnalysisResult with the common fields plus the niche's own fields."""
+    if niche in FULL_SCHEMA_NICHES:
+        return AnalysisResult
+    names = COMMON_FIELDS + NICHE_FIELDS.get(niche, [])
+    fields = {name: (AnalysisResult.model_fields[name].annotation, AnalysisResult.model_fields[name]) for name in names}
+    return create_model(f"{niche.capitalize()}AnalysisResult", **fields)
+
+def build_system_prompt(niche: str, schema: Type[BaseModel] = AnalysisResult) -> str:
+    """Constructs the System Prompt for a niche."""
+    parser = PydanticOutputParser(pydantic_object=schema)
+    niche_instructions = get_niche_instructions(niche)
+
+    return f"""
+    You are an expert Intelligence Analyst designated to the '{niche}' sector. 
+    Your goal is to extract structured, actionable intelligence from the provided article content.
+
+    MANDATORY EXTRACTION:
+    1. Sentiment: Is this 'High Hype' (viral/major news) or 'Low Hype'?
+    2. Category: Thematic classification (Technology, Business, Politics, Sports, etc.).
+    3. Entities: Key organizations, people, or products.
+    4. Geolocation: Identify the location context (City, Country). If relevant to South Africa, flag is_south_africa=True.
+    5. Detected Niche: If the article clearly belongs to a specific niche different from '{niche}', specify it (e.g. 'gaming', 'crypto', 'tech', 'nuclear', 'energy', 'education', 'foodtech', 'health', 'luxury', 'realestate', 'retail', 'social', 'vc', 'web3', 'politics', 'crime', 'sport'). Otherwise, leave null or repeat '{niche}'.
+    
+    RICH INTELLIGENCE (Populate these lists if applicable):
+    - incidents: detailed list of crime/safety incidents (type, description, severity 1-3 from context).
+    - people: detailed list of key figures (name, role, status e.g. 'Suspect', 'Official').
+    - organizations: detailed list of companies/groups (name, type e.g. 'Syndicate', 'Party').
+
+    NICHE SPECIFIC INSTRUCTIONS:
+    {niche_instructions}
+
+    OUTPUT FORMAT:
+    {parser.get_format_instructions()}
+    """
+
+class NichePrompt:
+    """Precompiled prompt for one niche: text, trimmed schema, version hash and token count."""
+
+    def __init__(self, niche: str):
+        self.niche = niche
+        self.schema = response_schema(niche)
+        self.system_prompt = build_system_prompt(niche, self.schema)
+        self.batch_prompt = self.system_prompt + BATCH_INSTRUCTIONS
+        # Changes whenever the prompt text or schema changes, invalidating cached analyses
+        self.version = hashlib.sha256(self.system_prompt.encode()).hexdigest()[:12]
+        self.batch_version = hashlib.sha256(self.batch_prompt.encode()).hexdigest()[:12]
+        self.tokens = count_tokens(self.system_prompt)
+
+    def covers(self, niche: str) -> bool:
+        """True if this prompt's schema already asks for every field of another niche (safe to re-route without re-analysis)."""
+        return all(name in self.schema.model_fields for name in NICHE_FIELDS.get(niche, []))
+
+class PromptRegistry:
+    """
+    Builds each niche's prompt once and serves it for every analysis.
+    `warm()` precompiles a list of niches at startup; others are built on first use.
+    """
+
+    def __init__(self):
+        self.prompts: Dict[str, NichePrompt] = {}
+
+    def get(self, niche: str) -> NichePrompt:
+        niche = (niche or "general").lower()
+        if niche not in self.prompts:
+            self.prompts[niche] = NichePrompt(niche)
+        return self.prompts[niche]
+
+    def warm(self, niches: List[str]):
+        for niche in niches:
+            self.get(niche)
+        full = count_tokens(build_system_prompt("general"))
+        sizes = sorted(p.tokens for p in self.prompts.values())
+        Actor.log.info(
+            f"🧾 Prompt registry: {len(self.prompts)} niches, "
+            f"{sizes[0]}-{sizes[-1]} prompt tokens (full schema: {full})."
+        )
+
+PROMPTS = PromptRegistry()
+
+def get_prompt(niche: str) -> NichePrompt:
+    return PROMPTS.get(niche)
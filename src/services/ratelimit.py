@@ -0,0 +1,126 @@
+import asyncio
+import time
+from typing import Optional
+
+class TokenBucket:
+    """
+    Async token bucket. `rate` tokens are added per second up to `capacity`.
+    Callers reserve a slot up front (the balance may go negative), so concurrent
+    waiters are spaced out instead of all waking at once. Adapts to server feedback:
+    `observe()` drains the bucket when the provider reports no remaining quota and
+    holds it until the reported reset time.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, max_wait: Optional[float] = None) -> Optional[float]:
+        """
+        Takes a token and returns how long the caller must wait before using it.
+        Returns None (and takes nothing) if that wait would exceed max_wait.
+        """
+        self._refill()
+        wait = max(0.0, self.blocked_until - time.monotonic())
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        if max_wait is not None and wait > max_wait:
+            return None
+        self.tokens -= 1
+        return wait
+
+    def refund(self):
+        """Returns a reserved token that ended up unused."""
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    async def acquire(self, max_wait: Optional[float] = None) -> bool:
+        """Waits for a token. False if it would take longer than max_wait."""
+        wait = self.reserve(max_wait)
+        if wait is None:
+            return False
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return True
+
+    def observe(self, remaining: Optional[float] = None, reset_in: Optional[float] = None):
+        """Feeds rate-limit headers back into the bucket."""
+        if remaining is None:
+            return
+        self._refill()
+        self.tokens = min(self.tokens, max(0.0, remaining))
+        if remaining <= 0 and reset_in:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + reset_in)
+
+class CircuitBreaker:
+    """
+    Per-dependency breaker. Opens after `threshold` consecutive failures (or immediately
+    on `trip()`), rejects calls while cooling down, then lets a single probe through
+    (half-open). Each consecutive trip doubles the cooldown up to `max_cooldown`.
+    The caller that got the probe (`probing` is set right after its `allow()`) must end it
+    with record_success/record_failure/trip, or `release()` if it was interrupted.
+    """
+
+    def __init__(self, threshold: int = 3, cooldown: float = 60.0, max_cooldown: float = 900.0):
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.failures = 0
+        self.trips = 0
+        self.open_until = 0.0
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.open_until == 0.0:
+            return "closed"
+        if time.monotonic() < self.open_until:
+            return "open"
+        return "half-open"
+
+    def allow(self) -> bool:
+        """True if a call may proceed. In half-open state only one probe is allowed at a time."""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.trips = 0
+        self.open_until = 0.0
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.probing or self.failures >= self.threshold:
+            self.trip()
+
+    def release(self):
+        """
+        Ends a half-open probe that finished without an outcome (e.g. cancelled). Without it
+        the breaker would keep waiting for that probe and reject every later call.
+        """
+        self.probing = False
+
+    def trip(self, cooldown: Optional[float] = None):
+        """Opens the breaker. An explicit cooldown (e.g. from Retry-After) takes precedence."""
+        if cooldown is None:
+            cooldown = min(self.max_cooldown, self.base_cooldown * (2 ** self.trips))
+        self.trips += 1
+        self.failures = 0
+        self.probing = False
+        self.open_until = time.monotonic() + cooldown
+
+    def remaining(self) -> float:
+        return max(0.0, self.open_until - time.monotonic())
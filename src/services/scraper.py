@@ -1,125 +1,173 @@
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import httpx
 from apify import Actor
-import re
-import json
+from urllib.parse import urlparse
+from typing import Optional
+from .extraction import PageCollector, new_parser
+from .context import MAX_CONTEXT_CHARS
+from ..models import ScrapedPage
 
-def scrape_article_content(url: str, run_test_mode: bool) -> tuple[str | None, str | None]:
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# Shared connection pool (keep-alive + HTTP/2 where offered) and the per-host cap.
+# Many articles come from the same few hosts, so connection reuse matters more than raw parallelism.
+# Overall concurrency is capped by the pool size and the pipeline's "scrape" stage.
+MAX_CONNECTIONS = 20
+PER_HOST_LIMIT = 4
+# Bodies are streamed and parsed as they arrive; reading stops at this many bytes
+MAX_PAGE_BYTES = 2_000_000
+# Bytes buffered before each incremental parse step (one worker-thread hop per step)
+PARSE_CHUNK_BYTES = 64 * 1024
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+
+# Per-run download accounting, reported by ArticlePipeline.close().
+# bytes_saved: unread bytes known from Content-Length. bytes_saved_estimated: early stops on
+# chunked/compressed responses without one, counted up to the byte ceiling (an upper bound).
+SCRAPE_STATS = {"pages": 0, "bytes_read": 0, "bytes_saved": 0, "bytes_saved_estimated": 0, "early_stops": 0, "capped": 0, "rejected": 0}
+
+_client: Optional[httpx.AsyncClient] = None
+_host_limits: dict = {}
+
+def configure_scraper(max_connections: int = MAX_CONNECTIONS, per_host: int = PER_HOST_LIMIT, max_bytes: int = MAX_PAGE_BYTES):
+    """Sets the pool size, the per-host cap and the page byte ceiling. Must be called before the first scrape to affect the pool."""
+    global MAX_CONNECTIONS, PER_HOST_LIMIT, MAX_PAGE_BYTES, _host_limits
+    MAX_CONNECTIONS = max(1, max_connections)
+    PER_HOST_LIMIT = max(1, per_host)
+    MAX_PAGE_BYTES = max(64 * 1024, max_bytes)
+    _host_limits = {}
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=True,
+            headers=HEADERS,
+            timeout=httpx.Timeout(10.0),
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_CONNECTIONS,
+                keepalive_expiry=30.0
+            )
+        )
+    return _client
+
+def _get_host_limit(url: str) -> asyncio.Semaphore:
+    """Per-host semaphore for a URL."""
+    host = urlparse(url).netloc.lower()
+    if host not in _host_limits:
+        _host_limits[host] = asyncio.Semaphore(PER_HOST_LIMIT)
+    return _host_limits[host]
+
+def scrape_stats() -> str:
+    stats = SCRAPE_STATS
+    return (
+        f"{stats['pages']} pages, {stats['bytes_read'] / 1e6:.1f} MB read, "
+        f"{stats['bytes_saved'] / 1e6:.1f} MB skipped + up to {stats['bytes_saved_estimated'] / 1e6:.1f} MB "
+        f"without Content-Length ({stats['early_stops']} early stops, "
+        f"{stats['capped']} capped, {stats['rejected']} non-HTML rejected)"
+    )
+
+def _declared_length(response: httpx.Response) -> Optional[int]:
+    try:
+        return int(response.headers["content-length"])
+    except (KeyError, ValueError):
+        return None
+
+async def _read_page(response: httpx.Response) -> PageCollector:
+    """
+    Streams the body into the incremental parser. Stops as soon as the article body has been
+    closed or enough text is collected, and never reads past MAX_PAGE_BYTES.
+    """
+    collector = PageCollector()
+    parser = new_parser(collector, response.charset_encoding)
+    buffer = bytearray()
+    stop = None
+    # Decoded (decompressed) chunks go to the parser; the ceiling applies to bytes on the wire
+    async for chunk in response.aiter_bytes():
+        buffer += chunk
+        read = response.num_bytes_downloaded
+        if len(buffer) >= PARSE_CHUNK_BYTES or read >= MAX_PAGE_BYTES:
+            # Parsing is CPU-bound: keep it off the event loop
+            await asyncio.to_thread(parser.feed, bytes(buffer))
+            buffer.clear()
+            if collector.body_closed or collector.text_chars >= MAX_CONTEXT_CHARS:
+                stop = "early_stops"
+                break
+            if read >= MAX_PAGE_BYTES:
+                stop = "capped"
+                break
+    if buffer:
+        await asyncio.to_thread(parser.feed, bytes(buffer))
+
+    try:
+        parser.close()
+    except Exception:
+        pass # Truncated documents are expected when we stop early
+
+    SCRAPE_STATS["pages"] += 1
+    SCRAPE_STATS["bytes_read"] += response.num_bytes_downloaded
+    if stop:
+        SCRAPE_STATS[stop] += 1
+        read = response.num_bytes_downloaded
+        declared = _declared_length(response)
+        if declared:
+            SCRAPE_STATS["bytes_saved"] += max(0, declared - read)
+        elif stop == "early_stops":
+            # Unknown length: without the early stop we would have read on up to the ceiling
+            SCRAPE_STATS["bytes_saved_estimated"] += max(0, MAX_PAGE_BYTES - read)
+    return collector
+
+async def close_scraper():
+    """Closes the shared HTTP client. Called once at the end of the run."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+async def scrape_article_content(url: str, run_test_mode: bool) -> ScrapedPage:
     """
     Step A: Attempt to scrape the direct URL.
-    Returns (cleaned_text, image_url) or (None, None) if failed/blocked.
+    Returns a ScrapedPage (cleaned text, image, rel=canonical); text is None if failed/blocked.
     """
     if run_test_mode:
-        return (
-            "<p>Test Content: Valve announced Half-Life 3 today. It is a VR exclusive.</p>",
-            "https://placehold.co/600x400/png"
+        return ScrapedPage(
+            text="<p>Test Content: Valve announced Half-Life 3 today. It is a VR exclusive.</p>",
+            image_url="https://placehold.co/600x400/png"
         )
 
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
-
     try:
         Actor.log.info(f"🕷️ Attempting to scrape: {url}")
-        response = requests.get(url, headers=headers, timeout=10)
-        
-        # Check for soft blocks or errors
-        if response.status_code in [403, 429, 401]:
-            Actor.log.warning(f"🛡️ Anti-bot trigger ({response.status_code}) on {url}. Switching to Fallback.")
-            return None, None
-            
-        if response.status_code != 200:
-            return None, None
-
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # 1. Scrape Image (OpenGraph > Twitter > JSON-LD > Body Heuristic)
-        image_url = None
-        
-        # 1.1 OpenGraph
-        og_image = soup.find('meta', property='og:image')
-        if og_image:
-            image_url = og_image.get('content')
-            
-        # 1.2 Twitter Card
-        if not image_url:
-            twitter_image = soup.find('meta', name='twitter:image')
-            if twitter_image:
-                 image_url = twitter_image.get('content')
-                 
-        # 1.3 JSON-LD (Schema.org)
-        if not image_url:
-            try:
-                scripts = soup.find_all('script', type='application/ld+json')
-                for script in scripts:
-                    if not script.string: continue
-                    try:
-                        data = json.loads(script.string)
-                    except json.JSONDecodeError:
-                        continue
-                        
-                    # Handle both list and dict logic (some schemas are arrays)
-                    items = data if isinstance(data, list) else [data]
-                    
-                    for item in items:
-                        # Direct ImageObject or Article.image
-                        img = item.get('image')
-                        if img:
-                            if isinstance(img, str):
-                                image_url = img
-                                break
-                            elif isinstance(img, dict) and 'url' in img:
-                                image_url = img['url']
-                                break
-                            elif isinstance(img, list) and len(img) > 0:
-                                # Could be a list of strings or objects
-                                first = img[0]
-                                if isinstance(first, str):
-                                    image_url = first
-                                elif isinstance(first, dict) and 'url' in first:
-                                    image_url = first['url']
-                                break
-                        
-                        # Check nested "thumbnailUrl"
-                        thumb = item.get('thumbnailUrl')
-                        if thumb:
-                            image_url = thumb
-                            break
-                            
-                    if image_url: break
-            except Exception as e:
-                Actor.log.debug(f"JSON-LD parsing error: {e}")
-
-        # 1.4 Body Heuristic (First large image)
-        if not image_url:
-             article = soup.find('article') or soup.find('main') or soup.find(class_=re.compile(r'post|article|content'))
-             if article:
-                 images = article.find_all('img')
-                 for img in images:
-                     src = img.get('src')
-                     # Filter out common small icons/pixels
-                     if src and not src.endswith('.svg') and 'icon' not in src.lower() and 'logo' not in src.lower():
-                         image_url = src
-                         break
-        
-        # Heuristics for article body
-        article_body = soup.find('article') or soup.find('main') or soup.find(class_=re.compile(r'content|post|article'))
-        
-        if article_body:
-            text = article_body.get_text(separator=' ', strip=True)
-        else:
-            text = soup.get_text(separator=' ', strip=True)
-            
-        # Cleanup
-        clean_text = re.sub(r'\s+', ' ', text).strip()
-        
-        # Quality check: if text is too short, it's likely a cookie wall or error
-        if len(clean_text) < 300:
-            Actor.log.warning(f"⚠️ Scraped content too short ({len(clean_text)} chars). Likely failed.")
-            return None, None
-
-        return clean_text[:8000], image_url # Truncate for LLM context limits
+        return await _fetch_page(url)
 
     except Exception as e:
         Actor.log.warning(f"Scrape error on {url}: {e}")
-        return None, None
\ No newline at end of file
+        return ScrapedPage()
+
+async def _fetch_page(url: str) -> ScrapedPage:
+    # No global semaphore here: requests queued on one busy host would hold its slots
+    # and starve every other host
+    async with _get_host_limit(url):
+        async with _get_client().stream("GET", url) as response:
+            # Check for soft blocks or errors
+            if response.status_code in [403, 429, 401]:
+                Actor.log.warning(f"🛡️ Anti-bot trigger ({response.status_code}) on {url}. Switching to Fallback.")
+                return ScrapedPage()
+
+            if response.status_code != 200:
+                return ScrapedPage()
+
+            # PDFs, images, video, JSON APIs: reject before downloading the body
+            content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+            if content_type and not content_type.startswith(HTML_CONTENT_TYPES):
+                Actor.log.info(f"⏭️ Not an HTML page ({content_type}): {url}")
+                SCRAPE_STATS["rejected"] += 1
+                SCRAPE_STATS["bytes_saved"] += _declared_length(response) or 0
+                return ScrapedPage()
+
+            collector = await _read_page(response)
+            page_url = str(response.url)
+
+    return collector.result(page_url)
@@ -1,73 +1,191 @@
+import asyncio
 import os
-import requests
+import re
+import time
+import httpx
 from apify import Actor
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
+from .context import MAX_CONTEXT_CHARS
+from .ratelimit import TokenBucket, CircuitBreaker
+from .cache import SearchCache, ImageCache
+from .metrics import METRICS
 
-# --- Helper Logic for Key Rotation ---
-def perform_brave_request(endpoint: str, params: Dict[str, Any]) -> Optional[requests.Response]:
+BRAVE_API_BASE = os.getenv("BRAVE_API_BASE", "https://api.search.brave.com/res/v1")
+
+# Keys in priority order with their per-second plan limit:
+# BRAVE_API_KEY and BRAVE_FREE_AI are free (2k req/mo, 1 req/s), BRAVE_BASE_KEY is paid
+BRAVE_KEYS = [("BRAVE_API_KEY", 1.0), ("BRAVE_FREE_AI", 1.0), ("BRAVE_BASE_KEY", 20.0)]
+# Longest a call waits for a key's next slot before spilling over to the next key (seconds)
+MAX_KEY_WAIT = 2.0
+# Cooldown for keys rejected with 401/403 (revoked, wrong plan)
+AUTH_COOLDOWN = 3600.0
+
+_client: Optional[httpx.AsyncClient] = None
+_keys: Optional[List["BraveKey"]] = None
+
+class BraveKey:
+    """One subscription token with its own pacing, health and remaining monthly quota."""
+
+    def __init__(self, name: str, token: str, rate: float):
+        self.name = name
+        self.token = token
+        self.bucket = TokenBucket(rate=rate, capacity=1.0)
+        self.breaker = CircuitBreaker(threshold=3, cooldown=60.0)
+        self.quota: Optional[int] = None
+        self.requests = 0
+
+    def observe(self, headers, limited: bool = False) -> Optional[float]:
+        """
+        Reads Brave's rate-limit headers ("<per-second>, <per-month>" lists).
+        Paces the bucket on the per-second window and returns the cooldown to apply if a
+        window is exhausted: the monthly reset when the quota is used up, else the second.
+        """
+        try:
+            remaining = [int(v) for v in headers.get("x-ratelimit-remaining", "").split(",") if v.strip()]
+            reset = [float(v) for v in headers.get("x-ratelimit-reset", "").split(",") if v.strip()]
+        except ValueError:
+            return 1.0 if limited else None
+        if len(remaining) > 1:
+            self.quota = remaining[1]
+            if self.quota <= 0:
+                return reset[1] if len(reset) > 1 else AUTH_COOLDOWN
+        if remaining:
+            self.bucket.observe(remaining[0], reset[0] if reset else 1.0)
+        return (reset[0] if reset else 1.0) if limited else None
+
+    def status(self) -> str:
+        if self.breaker.state == "open":
+            return f"{self.name}: cooling down {self.breaker.remaining():.0f}s"
+        quota = f", {self.quota} left this month" if self.quota is not None else ""
+        return f"{self.name}: {self.requests} requests{quota}"
+
+def normalize_query(query: str) -> str:
+    """Cache key form of a query: case, quotes, punctuation and spacing don't change Brave's answer."""
+    return " ".join(re.sub(r"[^\w\s]", " ", query.lower()).split())
+
+def _get_keys() -> List[BraveKey]:
+    global _keys
+    if _keys is None:
+        # Strip whitespace just in case
+        _keys = [
+            BraveKey(name, (os.getenv(name) or "").strip(), rate)
+            for name, rate in BRAVE_KEYS if (os.getenv(name) or "").strip()
+        ]
+    return _keys
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=True,
+            headers={"Accept": "application/json"},
+            timeout=httpx.Timeout(10.0),
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=10, keepalive_expiry=30.0)
+        )
+    return _client
+
+async def close_search_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def search_stats() -> str:
+    """Per-key usage and health for the end-of-run log."""
+    return "; ".join(key.status() for key in _keys or []) or "no keys"
+
+async def perform_brave_request(endpoint: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """
-    Tries to execute a Brave API request using a specific key priority order:
-    1. BRAVE_API_KEY (Free, 2k req/mo, 1 req/s)
-    2. BRAVE_FREE_AI (Free, 2k req/mo, 1 req/s)
-    3. BRAVE_BASE_KEY (Paid)
-    
-    If a key fails with 429 (Rate Limit) or 401/403 (Auth), it rotates to the next.
+    Runs a Brave API request on the first healthy key that has a free slot, in priority order.
+    Each key is paced to its plan's per-second limit; keys that hit 429 or 401/403 are
+    skipped until their cooldown passes instead of being retried on every call.
+    Returns the parsed JSON body, or None if no key could serve the request.
     """
-    keys_to_try = ["BRAVE_API_KEY", "BRAVE_FREE_AI", "BRAVE_BASE_KEY"]
-    
-    for key_name in keys_to_try:
-        # Get key directly from env, stripping whitespace just in case
-        api_key = (os.getenv(key_name) or "").strip()
-        if not api_key:
+    keys = _get_keys()
+    for key in keys:
+        # Skip keys whose quota won't free up soon, or whose breaker is cooling down
+        wait = key.bucket.reserve(MAX_KEY_WAIT)
+        if wait is None:
             continue
-            
-        headers = {
-            "Accept": "application/json",
-            "X-Subscription-Token": api_key
-        }
-        
+        if not key.breaker.allow():
+            key.bucket.refund()
+            continue
+        probe = key.breaker.probing
         try:
-            # Actor.log.info(f"🔑 Trying Brave Key: {key_name}...") 
-            response = requests.get(
-                endpoint,
-                params=params,
-                headers=headers,
-                timeout=10
-            )
-            
+            if wait > 0:
+                await asyncio.sleep(wait)
+                # Another caller may have tripped the key while we waited for its slot
+                if key.breaker.state == "open":
+                    continue
+
+            started = time.perf_counter()
+            try:
+                key.requests += 1
+                response = await _get_client().get(
+                    f"{BRAVE_API_BASE}/{endpoint}", params=params, headers={"X-Subscription-Token": key.token}
+                )
+            except Exception as e:
+                METRICS.observe("brave_request_seconds", time.perf_counter() - started, endpoint=endpoint, status="error")
+                key.breaker.record_failure()
+                Actor.log.error(f"❌ Error using {key.name}: {e}")
+                continue
+
+            METRICS.observe("brave_request_seconds", time.perf_counter() - started, endpoint=endpoint, status=response.status_code)
+            METRICS.inc("brave_bytes_total", response.num_bytes_downloaded, endpoint=endpoint)
             if response.status_code == 200:
-                return response
-                
-            elif response.status_code in [401, 403, 429]:
-                 Actor.log.warning(f"⚠️ Key {key_name} failed with {response.status_code}. Rotating...")
-                 continue # Try next key
+                cooldown = key.observe(response.headers)
+                if cooldown:
+                    # That was the month's last request on this key
+                    key.breaker.trip(cooldown)
+                else:
+                    key.breaker.record_success()
+                try:
+                    return response.json()
+                except ValueError as e:
+                    Actor.log.error(f"Failed to parse Brave response: {e}")
+                    return None
+
+            if response.status_code == 429:
+                key.breaker.trip(key.observe(response.headers, limited=True))
+                Actor.log.warning(f"⏳ Key {key.name} rate limited. Cooling down for {key.breaker.remaining():.0f}s.")
+            elif response.status_code in (401, 403):
+                key.breaker.trip(AUTH_COOLDOWN)
+                Actor.log.warning(f"⚠️ Key {key.name} rejected with {response.status_code}. Disabled for {AUTH_COOLDOWN / 60:.0f} min.")
             else:
-                # Other server errors (500, etc) might not be solved by rotation, but let's try anyway or just log
-                Actor.log.warning(f"⚠️ Key {key_name} encountered error {response.status_code}.")
-                continue
+                # Server errors aren't the key's fault, but the next key may still get through
+                key.breaker.record_failure()
+                Actor.log.warning(f"⚠️ Key {key.name} encountered error {response.status_code}.")
+        finally:
+            if probe:
+                # Cancelled mid-probe: no outcome was recorded
+                key.breaker.release()
 
-        except Exception as e:
-            Actor.log.error(f"❌ Error using {key_name}: {e}")
-            continue
-            
-    Actor.log.error("❌ All Brave keys exhausted or failed.")
+    if keys:
+        Actor.log.error("❌ All Brave keys exhausted or failed.")
     return None
 
-def brave_search_fallback(query_title: str, run_test_mode: bool) -> str:
+async def brave_search_fallback(query_title: str, run_test_mode: bool, cache: Optional[SearchCache] = None) -> str:
     """
     Step B: Paid Fallback using Brave Search API.
-    Used when direct scraping fails.
+    Used when direct scraping fails. With a SearchCache, recent answers for the same query are reused.
     """
     if run_test_mode:
         return "Source A: Valve announces HL3. Source B: Release date set for 2026."
 
     # Clean title for query
     clean_query = query_title.replace('"', '').replace("'", "")
+
+    cache_key = SearchCache.make_key("web", normalize_query(clean_query))
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            Actor.log.info(f"🦁 Search cache hit for: {clean_query}")
+            return cached
     
     Actor.log.info(f"🦁 Brave Search Fallback for: {clean_query}")
     
-    response = perform_brave_request(
-        "https://api.search.brave.com/res/v1/web/search",
+    data = await perform_brave_request(
+        "web/search",
         params={
             "q": clean_query,
             "count": 5,
@@ -76,9 +194,8 @@ def brave_search_fallback(query_title: str, run_test_mode: bool) -> str:
         }
     )
         
-    if response and response.status_code == 200:
+    if data:
         try:
-            data = response.json()
             results = data.get('web', {}).get('results', [])
             
             # Aggregate snippets
@@ -88,25 +205,35 @@ def brave_search_fallback(query_title: str, run_test_mode: bool) -> str:
                 desc = item.get('description', '')
                 extra = " ".join(item.get('extra_snippets', []))
                 context += f"- Title: {title}\n  Snippet: {desc} {extra}\n\n"
-            
-            return context[:6000]
+
+            context = context[:MAX_CONTEXT_CHARS]
+            if cache is not None:
+                cache.put(cache_key, context)
+            return context
         except Exception as e:
             Actor.log.error(f"Failed to parse Brave response: {e}")
             return ""
     else:
         return ""
 
-def find_relevant_image(query: str, run_test_mode: bool) -> str | None:
+async def find_relevant_image(query: str, run_test_mode: bool, cache: Optional[ImageCache] = None) -> str | None:
     """
     Step C: Find a relevant image using Brave Search.
+    With an ImageCache, earlier lookups of the same query (including "no image") are reused.
     """
     if run_test_mode:
         return "https://placehold.co/600x400/png?text=Brave+Backfill"
         
     clean_query = query.replace('"', '').replace("'", "")
+
+    cache_key = ImageCache.make_key("images", normalize_query(clean_query))
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached or None
     
-    response = perform_brave_request(
-        "https://api.search.brave.com/res/v1/images/search",
+    data = await perform_brave_request(
+        "images/search",
         params={
             "q": clean_query,
             "count": 1,
@@ -114,12 +241,14 @@ def find_relevant_image(query: str, run_test_mode: bool) -> str | None:
         }
     )
     
-    if response and response.status_code == 200:
+    if data:
         try:
-            data = response.json()
             results = data.get('results', [])
-            if results:
-                return results[0].get('properties', {}).get('url') 
+            image_url = results[0].get('properties', {}).get('url') if results else None
+            # Only answered lookups are cached; a failed request may succeed on the next key
+            if cache is not None:
+                cache.put(cache_key, image_url or "")
+            return image_url
         except Exception as e:
              Actor.log.warning(f"Brave Image Parse failed: {e}")
              
@@ -0,0 +1,48 @@
+import math
+import re
+from typing import Optional
+
+try:
+    import tiktoken
+except ImportError: # Listed in requirements; the heuristic below keeps local scripts working without it
+    tiktoken = None
+
+# BPE vocabulary closest to each model family's tokenizer (by OpenRouter model-id prefix).
+# gpt-oss ships o200k; Llama 3 extends cl100k. Gemma/Gemini (SentencePiece, 256k vocab) and
+# Nemotron split prose into slightly fewer tokens than cl100k, so it errs on the safe side.
+MODEL_ENCODINGS = {
+    "openai/": "o200k_base",
+}
+DEFAULT_ENCODING = "cl100k_base"
+
+_encodings: dict = {}
+
+def encoding_name(model: Optional[str] = None) -> str:
+    for prefix, name in MODEL_ENCODINGS.items():
+        if model and model.startswith(prefix):
+            return name
+    return DEFAULT_ENCODING
+
+def _get_encoding(name: str):
+    if name not in _encodings and tiktoken is not None:
+        try:
+            _encodings[name] = tiktoken.get_encoding(name)
+        except Exception:
+            # Encoding files are downloaded on first use (baked into the image at build time);
+            # offline runs fall back to the heuristic
+            _encodings[name] = None
+    return _encodings.get(name)
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    Token count of `text` for `model` (see MODEL_ENCODINGS). Exact BPE counts with tiktoken,
+    otherwise an estimate from word and punctuation counts (~1.3 tokens per word for English prose).
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding(encoding_name(model))
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    words = len(re.findall(r"\w+", text))
+    symbols = len(re.findall(r"[^\w\s]", text))
+    return math.ceil(words * 1.3 + symbols)
@@ -0,0 +1,98 @@
+import hashlib
+import re
+from typing import Optional
+from urllib.parse import parse_qsl, quote, unquote, urlencode, urljoin, urlsplit, urlunsplit
+
+# Query parameters that only track the click, never select the content
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid", "_ga", "_gl",
+    "ref", "ref_src", "ref_url", "referrer", "cmpid", "ocid", "icid", "ito", "xtor",
+    "s_cid", "sr_share", "share", "smid", "guccounter", "spm", "amp", "outputtype", "__twitter_impression"
+}
+TRACKING_PREFIXES = ("utm_", "at_", "pk_", "mtm_", "hsa_", "vero_")
+
+# www / mobile / AMP subdomains served alongside the canonical host
+ALIAS_HOST_PREFIXES = ("www.", "m.", "mobile.", "amp.")
+# Characters left unescaped when re-quoting a path, so %-encoded and literal forms compare equal
+PATH_SAFE = "/:@!$&'()*+,;=~"
+# Google AMP cache: https://<host-with-dashes>.cdn.ampproject.org/c/s/<host>/<path>
+AMP_CACHE = re.compile(r"^/(?:[a-z]/)*(?:s/)?(?P<host>[^/]+)(?P<path>/.*)?$")
+
+def canonicalize_url(url: str) -> str:
+    """
+    Normalizes an article URL so that variants of one page compare equal. This is the one
+    identity of a page: feed dedup, the run's seen set, check_exists, the url/source_url
+    upsert conflict keys and feed_items.dedup_hash all use it. It is a key only: pages are
+    fetched, and reported, under the URL the feed gave (some sites serve only http or www).
+
+    https scheme, lowercase host without www/mobile/AMP prefix or default port, /amp paths
+    mapped to the canonical page, path escapes normalized, tracking parameters and fragments
+    dropped, remaining query sorted.
+    """
+    if not url:
+        return url
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return url
+    if not parts.netloc:
+        return url
+
+    scheme = parts.scheme.lower() or "https"
+    if scheme == "http":
+        scheme = "https"
+    host = (parts.hostname or "").lower()
+    path = parts.path or "/"
+
+    if host.endswith(".cdn.ampproject.org"):
+        match = AMP_CACHE.match(path)
+        if match:
+            host = match.group("host").lower()
+            path = match.group("path") or "/"
+
+    for prefix in ALIAS_HOST_PREFIXES:
+        if host.startswith(prefix) and host.count(".") >= 2:
+            host = host[len(prefix):]
+            break
+
+    # Keep non-default ports
+    if port and port not in (80, 443):
+        host = f"{host}:{port}"
+
+    # AMP paths: /amp, /amp/, /story.amp, /amp/story
+    path = re.sub(r"/amp/?$", "/", path)
+    path = re.sub(r"^/amp/", "/", path)
+    path = re.sub(r"\.amp(\.html)?$", r"\1", path)
+    path = re.sub(r"/{2,}", "/", path)
+    if len(path) > 1:
+        path = path.rstrip("/")
+    path = quote(unquote(path), safe=PATH_SAFE)
+
+    query = [
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in TRACKING_PARAMS and not k.lower().startswith(TRACKING_PREFIXES)
+    ]
+    return urlunsplit((scheme, host, path, urlencode(sorted(query)), ""))
+
+def dedup_hash(url: str) -> str:
+    """
+    feed_items conflict key: hash of the canonical URL without its scheme prefix
+    (the form hashed since canonical keys were introduced, so existing rows keep their hash).
+    """
+    return hashlib.md5(canonicalize_url(url).split("://", 1)[-1].encode()).hexdigest()
+
+def resolve_canonical(page_url: str, declared: Optional[str]) -> Optional[str]:
+    """
+    Canonicalized rel=canonical / og:url of a fetched page, if it points at a real article URL.
+    Home-page canonicals (a common CMS misconfiguration) are ignored.
+    """
+    if not declared:
+        return None
+    absolute = urljoin(page_url, declared.strip())
+    if not absolute.startswith(("http://", "https://")):
+        return None
+    canonical = canonicalize_url(absolute)
+    if urlsplit(canonical).path in ("", "/"):
+        return None
+    return canonical
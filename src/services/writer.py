@@ -0,0 +1,129 @@
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from apify import Actor
+from .db import execute
+from .metrics import METRICS
+
+GroupKey = Tuple[str, str, str, Tuple[str, ...]]
+
+class WriteBehind(ABC):
+    """
+    Flush scheduling shared by the write-behind buffers (BulkWriter, EntitySink).
+
+    Subclasses queue work in `add()`, spawn a flush when a batch is full and otherwise call
+    `_flush_soon()`, so queued work is written at least every `max_delay` seconds. `_send()`
+    writes rows with retries and splits failing batches in half.
+    """
+
+    def __init__(self, client, max_delay: float = 5.0, retries: int = 2):
+        self.client = client
+        self.max_delay = max_delay
+        self.retries = retries
+        self.pending: set = set()
+        self._timer: Optional[asyncio.Task] = None
+        self.round_trips = 0
+        self.rows_failed = 0
+
+    @abstractmethod
+    async def flush(self):
+        """Writes everything queued so far."""
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+    def _flush_soon(self):
+        if self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.max_delay)
+        # Tracked like size-triggered flushes, so close() waits for it instead of cancelling mid-write
+        self._spawn(self.flush())
+
+    async def _send(self, label: str, query_for: Callable[[List[Dict[str, Any]]], Any], rows: List[Dict[str, Any]], retries: Optional[int] = None) -> List[Tuple[List[Dict[str, Any]], Any]]:
+        """
+        Executes `query_for(rows)`, retrying with backoff; a batch that still fails is split in half
+        so a single bad row can't sink its neighbours. Returns (rows, response) of every batch written.
+        """
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            try:
+                self.round_trips += 1
+                return [(rows, await execute(query_for(rows)))]
+            except Exception as e:
+                error = e
+                if attempt < retries:
+                    await asyncio.sleep(0.5 * 2 ** attempt)
+
+        if len(rows) > 1:
+            # Isolate the offending row(s); transient errors were already retried above
+            middle = len(rows) // 2
+            return (await self._send(label, query_for, rows[:middle], retries=0)
+                    + await self._send(label, query_for, rows[middle:], retries=0))
+        self.rows_failed += 1
+        Actor.log.warning(f"Bulk write failed for {label}: {error}")
+        return []
+
+    async def close(self):
+        """Final flush: waits for in-flight writes, then writes whatever is still buffered."""
+        if self._timer is not None and not self._timer.done():
+            self._timer.cancel()
+        if self.pending:
+            await asyncio.gather(*list(self.pending), return_exceptions=True)
+        await self.flush()
+
+class BulkWriter(WriteBehind):
+    """
+    Write-behind buffer for Supabase upserts.
+
+    Rows are grouped by (schema, table, conflict column, column set): PostgREST bulk
+    upserts need identical keys in every row. A group is flushed as one upsert when it
+    reaches `max_rows`, and every group is flushed at least every `max_delay` seconds.
+    Failed chunks are retried with backoff, then split in half so a single bad row
+    can't sink its neighbours. `close()` performs the final flush.
+    """
+
+    def __init__(self, client, max_rows: int = 50, max_delay: float = 5.0, retries: int = 2):
+        super().__init__(client, max_delay=max_delay, retries=retries)
+        self.max_rows = max(1, max_rows)
+        self.groups: Dict[GroupKey, Dict[Any, Dict[str, Any]]] = {}
+        self.rows_written = 0
+
+    def add(self, schema: str, table: str, row: Dict[str, Any], on_conflict: str):
+        """Queues a row. A later row with the same conflict value replaces the earlier one."""
+        key = (schema, table, on_conflict, tuple(sorted(row)))
+        group = self.groups.setdefault(key, {})
+        # One statement can't upsert the same conflict key twice (Postgres rejects it)
+        group[row.get(on_conflict, id(row))] = row
+
+        if len(group) >= self.max_rows:
+            self._spawn(self._flush_group(key))
+        else:
+            self._flush_soon()
+
+    async def flush(self):
+        """Writes every buffered group now."""
+        await asyncio.gather(*(self._flush_group(key) for key in list(self.groups)))
+
+    async def _flush_group(self, key: GroupKey):
+        group = self.groups.pop(key, None)
+        if not group:
+            return
+        schema, table, on_conflict, _ = key
+        rows = list(group.values())
+        for start in range(0, len(rows), self.max_rows):
+            await self._write(schema, table, rows[start:start + self.max_rows], on_conflict)
+
+    async def _write(self, schema: str, table: str, rows: List[Dict[str, Any]], on_conflict: str):
+        query_for = lambda batch: self.client.schema(schema).table(table).upsert(batch, on_conflict=on_conflict)
+        for written, _ in await self._send(f"{schema}.{table}", query_for, rows):
+            self.rows_written += len(written)
+            METRICS.inc("db_rows_total", len(written), table=f"{schema}.{table}")
+            Actor.log.info(f"💾 Upserted {len(written)} rows to {schema}.{table}")
+
+    def stats(self) -> str:
+        failed = f", {self.rows_failed} failed" if self.rows_failed else ""
+        return f"{self.rows_written} rows in {self.round_trips} round-trips{failed}"
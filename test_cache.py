@@ -0,0 +1,91 @@
+import asyncio
+import json
+import time
+
+import src.services.llm as llm
+from src.services.cache import TTLCache, AnalysisCache, ImageCache
+from src.services.prompts import get_prompt
+from src.services.search import normalize_query
+
+def test_ttl_and_lru():
+    print("\n--- Testing TTLCache (TTL + LRU) ---")
+
+    class SmallCache(TTLCache):
+        MAX_ENTRIES = 2
+
+    cache = SmallCache()
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1 # 'a' is now most recently used
+    cache.put("c", 3)          # evicts 'b' (least recently used)
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    print("✅ LRU eviction passed.")
+
+    cache.data["a"]["at"] = time.time() - SmallCache.TTL_SECONDS - 1
+    assert cache.get("a") is None
+    reloaded = SmallCache(dict(cache.data))
+    assert "a" not in reloaded.data
+    print("✅ TTL expiry passed.")
+
+def test_hit_rate_stats():
+    print("\n--- Testing hit-rate stats ---")
+    cache = AnalysisCache()
+    key = AnalysisCache.make_key("crypto", "v1", "model", "content")
+    assert key == AnalysisCache.make_key("crypto", "v1", "model", "content")
+    assert cache.get_any([key, "other"]) is None
+    cache.put(key, {"sentiment": "Low Hype"})
+    assert cache.get_any(["other", key]) == {"sentiment": "Low Hype"}
+    assert (cache.hits, cache.misses) == (1, 1)
+    print(f"Stats: {cache.stats()}")
+    print("✅ Stats passed.")
+
+def test_search_query_keys():
+    print("\n--- Testing search cache keys ---")
+    assert normalize_query('Eskom: "Stage 6" load-shedding!') == normalize_query("eskom stage 6  load shedding")
+    key = ImageCache.make_key("images", normalize_query("Eskom stage 6"))
+    assert key != ImageCache.make_key("web", normalize_query("Eskom stage 6"))
+    cache = ImageCache()
+    cache.put(key, "")  # searched, no image: still a hit
+    assert cache.get(key) == ""
+    print("✅ Search cache keys passed.")
+
+async def test_batch_cache_keys():
+    print("\n--- Testing batch analysis cache keys ---")
+    calls = []
+
+    async def fake_complete(system_prompt, user_content):
+        model = llm.MODELS_SEQUENCE[0]
+        calls.append(user_content(model))
+        return json.dumps({"results": [{"article_id": "a1", "summary": "Batched."}]}), model, None
+
+    actor, complete = llm.Actor, llm._complete
+    llm.Actor = type('Actor', (), {'log': type('Log', (), {'info': print, 'warning': print})()})
+    llm._complete = fake_complete
+    try:
+        cache = AnalysisCache()
+        content = "Eskom said stage 6 would run until Friday.\n\n\n" + "Rolling blackouts continue across Gauteng. " * 5
+        title = "Eskom escalates load shedding"
+        results = await llm.analyze_batch({"a1": content}, "energy", cache, titles={"a1": title})
+        assert results["a1"].summary == "Batched."
+
+        # Stored under the batch prompt's version and the context that was actually sent
+        prompt = get_prompt("energy")
+        fitted = llm.fit_context(content, title, "energy")
+        model = llm.MODELS_SEQUENCE[0]
+        assert fitted[model] in calls[0]
+        assert cache.get(llm._cache_keys("energy", prompt.batch_version, fitted)[model]) is not None
+        assert cache.get_any(list(llm._cache_keys("energy", prompt.version, fitted).values())) is None
+
+        # Same article again: answered from the cache, no request
+        await llm.analyze_batch({"a2": content}, "energy", cache, titles={"a2": title})
+        assert len(calls) == 1
+    finally:
+        llm.Actor, llm._complete = actor, complete
+    print("✅ Batch results keyed on the batch prompt and fitted input.")
+
+if __name__ == "__main__":
+    test_ttl_and_lru()
+    test_hit_rate_stats()
+    test_search_query_keys()
+    asyncio.run(test_batch_cache_keys())
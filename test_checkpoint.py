@@ -0,0 +1,43 @@
+from src.models import InputConfig, ArticleCandidate
+from src.services.checkpoint import RunCheckpoint, MAX_FAILURES
+
+def test_resume_only_unfinished():
+    print("\n--- Testing RunCheckpoint ---")
+    config = InputConfig(source="all", maxArticles=3)
+    assert RunCheckpoint.key_for(config) == RunCheckpoint.key_for(InputConfig(source="all", maxArticles=3))
+    assert RunCheckpoint.key_for(config) != RunCheckpoint.key_for(InputConfig(source="all", maxArticles=4))
+
+    checkpoint = RunCheckpoint(RunCheckpoint.key_for(config))
+    articles = [ArticleCandidate(title=f"Story {i}", url=f"https://example.com/{i}", source="Test") for i in range(3)]
+    checkpoint.track(articles)
+    checkpoint.mark(articles[0].url, "done", {"url": articles[0].url})
+    checkpoint.mark(articles[1].url, "analyzing")
+    checkpoint.mark(articles[2].url, "failed")
+
+    # The next run (different run id) loads the saved snapshot
+    restored = RunCheckpoint(checkpoint.key, checkpoint.snapshot("run-1"))
+    assert restored.resumed
+    # Unfinished and failed articles are redone (the failure may be the interruption itself)
+    assert [a.url for a in restored.pending()] == [articles[1].url, articles[2].url]
+    assert restored.records_to_restore("run-2") == [{"url": articles[0].url}]
+    # Same run after a migration: the records are in its dataset already
+    assert restored.records_to_restore("run-1") == []
+    print(f"✅ {restored.stats()}")
+
+def test_failed_retries_capped():
+    print("\n--- Testing RunCheckpoint failure cap ---")
+    checkpoint = RunCheckpoint("CHECKPOINT_test")
+    article = ArticleCandidate(title="Broken story", url="https://example.com/broken", source="Test")
+    checkpoint.track([article])
+    for attempt in range(1, MAX_FAILURES + 1):
+        assert [a.url for a in checkpoint.pending()] == [article.url], attempt
+        # Each resume retries it and it fails again
+        checkpoint = RunCheckpoint(checkpoint.key, checkpoint.snapshot(f"run-{attempt}"))
+        checkpoint.mark(article.url, "scraping")
+        checkpoint.mark(article.url, "failed")
+    assert checkpoint.pending() == []
+    print(f"✅ Given up after {MAX_FAILURES} failures: {checkpoint.stats()}")
+
+if __name__ == "__main__":
+    test_resume_only_unfinished()
+    test_failed_retries_capped()
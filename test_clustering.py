@@ -0,0 +1,60 @@
+from src.models import ArticleCandidate
+from src.services.clustering import StoryClusterer
+
+def article(title, url, summary=None):
+    return ArticleCandidate(title=title, url=url, source="test", original_summary=summary)
+
+def test_wire_story_collapsed():
+    print("\n--- Testing near-duplicate clustering ---")
+    clusterer = StoryClusterer()
+    rep = article(
+        "Eskom announces stage 6 load shedding from 4pm", "https://iol.co.za/a",
+        "Eskom has announced that stage 6 load shedding will be implemented from 4pm on Tuesday "
+        "after the loss of several generating units at Kusile and Medupi power stations overnight."
+    )
+    kept = clusterer.filter([
+        rep,
+        article(
+            "Eskom implements Stage 6 loadshedding from 4pm today", "https://citizen.co.za/b",
+            "Stage 6 load shedding will be implemented from 4pm today, Eskom said, citing the loss "
+            "of generating units at Medupi and Kusile power stations and low emergency reserves."
+        ),
+        article("Springboks beat All Blacks in Rugby Championship thriller", "https://news24.com/c"),
+        article("Police arrest two suspects in Soweto robbery", "https://news24.com/d"),
+        article("Police arrest suspects in Cape Town hijacking", "https://iol.co.za/e"),
+    ])
+    assert [a.url for a in kept] == ["https://iol.co.za/a", "https://news24.com/c", "https://news24.com/d", "https://iol.co.za/e"]
+    assert rep.related_urls == ["https://citizen.co.za/b"]
+    print("✅ Title clustering passed.")
+
+    # Incremental (streaming): a later batch joins the existing cluster
+    lede = "The power utility said breakdowns at several units forced it to escalate rolling blackouts across the country from this afternoon until further notice."
+    assert clusterer.add(article("Load shedding escalated", "https://ewn.co.za/f", lede))
+    assert not clusterer.add(article("Rolling blackouts ramped up again", "https://timeslive.co.za/g", lede))
+    print("✅ Summary clustering passed.")
+
+def test_distinct_stories_kept():
+    print("\n--- Testing that similar titles of different stories stay apart ---")
+    pairs = [
+        ("Police arrest two suspects in Soweto robbery", "Police arrest three suspects in Durban robbery"),
+        ("Ramaphosa addresses nation on energy crisis", "Ramaphosa addresses nation on water crisis"),
+        ("Eskom announces stage 4 load shedding from 5pm", "Eskom announces stage 2 load shedding on Sunday"),
+    ]
+    for first, second in pairs:
+        clusterer = StoryClusterer()
+        kept = clusterer.filter([article(first, "https://iol.co.za/x"), article(second, "https://news24.com/y")])
+        assert len(kept) == 2, (first, second)
+
+    # Different figures are a different story even when the summaries read alike
+    generic = "Eskom said load shedding would be implemented until further notice as it works to recover generating capacity across its fleet."
+    clusterer = StoryClusterer()
+    kept = clusterer.filter([
+        article(pairs[2][0], "https://iol.co.za/x", generic),
+        article(pairs[2][1], "https://news24.com/y", generic.replace("until further notice", "over the weekend")),
+    ])
+    assert len(kept) == 2
+    print("✅ Distinct stories kept.")
+
+if __name__ == "__main__":
+    test_wire_story_collapsed()
+    test_distinct_stories_kept()
@@ -0,0 +1,62 @@
+from src.services.context import reduce_context, clean_blocks
+from src.services.tokens import count_tokens
+from src.services.llm import MODELS_SEQUENCE, configure_token_budgets, fit_context
+
+def test_boilerplate_removed():
+    print("\n--- Testing boilerplate removal ---")
+    text = (
+        "Home\nWorld News\nBusiness\nThe central bank raised rates by half a point on Tuesday.\n"
+        "Subscribe to our newsletter!\nWe use cookies.\nWorld News\nBusiness\nShare"
+    )
+    assert clean_blocks(text) == ["The central bank raised rates by half a point on Tuesday."]
+    print("✅ Boilerplate removal passed.")
+
+    # Subheadings and datelines are short and unpunctuated too, but neither a label nor repeated
+    article = "JOHANNESBURG\nThe central bank raised rates on Tuesday.\nWhat happens next\nEconomists expect one more hike."
+    assert clean_blocks(article) == article.split("\n")
+    print("✅ Subheadings and datelines kept.")
+
+def test_prose_and_search_results_kept():
+    print("\n--- Testing that article prose and search results survive ---")
+    prose = "Residents said they would not sign up for the new scheme."
+    credit = "Photo © Reuters / Siphiwe Sibeko. The minister addressed Parliament on Tuesday afternoon."
+    assert clean_blocks(f"{prose}\n{credit}") == [prose, credit]
+
+    results = "- Title: Eskom announces stage 4\n  Snippet: Load shedding resumes at 5pm.\n- Title: Read more"
+    assert len(clean_blocks(results, drop_boilerplate=False)) == 3
+    assert reduce_context(results, drop_boilerplate=False).count("- Title:") == 2
+    print("✅ Prose and search results kept.")
+
+def test_budget_keeps_lead_and_relevant():
+    print("\n--- Testing token-budgeted reduction ---")
+    lead = "Bitcoin surged to a record on Monday after regulators approved a spot ETF."
+    noise = [f"Residents enjoyed afternoon number {i} walking through the quiet park by the river." for i in range(80)]
+    relevant = "Bitcoin exchange volumes doubled as traders reacted to the ETF approval."
+    text = "\n".join([lead] + noise[:40] + [relevant] + noise[40:])
+
+    reduced = reduce_context(text, title="Bitcoin hits record after ETF approval", niche="crypto", budget=300)
+    assert count_tokens(reduced) <= 300
+    assert reduced.startswith(lead)
+    assert relevant in reduced
+    print(f"{count_tokens(text)} -> {count_tokens(reduced)} tokens")
+    print("✅ Budgeted reduction passed.")
+
+def test_per_model_budgets():
+    print("\n--- Testing per-model token budgets ---")
+    text = "\n".join(f"Bitcoin traders moved {i} million dollars through the exchange on day {i}." for i in range(200))
+    small, *others = MODELS_SEQUENCE
+    configure_token_budgets(400, {small: 100})
+    try:
+        fitted = fit_context(text, title="Bitcoin exchange volumes", niche="crypto")
+    finally:
+        configure_token_budgets(2500)
+    assert count_tokens(fitted[small], small) <= 100
+    for model_name in others:
+        assert 100 < count_tokens(fitted[model_name], model_name) <= 400
+    print("✅ Per-model budgets passed.")
+
+if __name__ == "__main__":
+    test_boilerplate_removed()
+    test_prose_and_search_results_kept()
+    test_budget_keeps_lead_and_relevant()
+    test_per_model_budgets()
@@ -0,0 +1,41 @@
+import asyncio
+from src.services.entities import EntitySink
+from fake_supabase import FakeClient
+
+async def test_batched_resolution():
+    print("\n--- Testing EntitySink ---")
+    client = FakeClient({"master_identities": [{"id": 1, "full_name": "Known Person"}]})
+    sink = EntitySink(client, max_names=100, max_delay=60)
+    for article in range(5):
+        for name in ["Known Person", "New Person A", "New Person B"]:
+            sink.add("person", name, {"full_name": name})
+        sink.add("organization", "Acme", {"registered_name": "Acme"})
+        sink.add("syndicate", "The Gang", {"name": "The Gang"})
+    await sink.close()
+
+    # people: select + touch + insert; orgs and syndicates: select + insert
+    assert len(client.calls) == 7, client.calls
+    assert ("master_identities", "update", 0) in client.calls
+    assert len(client.rows["master_identities"]) == 3
+
+    # The same name in a later article: served from the name -> id cache
+    sink.add("person", "New Person A", {"full_name": "New Person A"})
+    await sink.close()
+    assert len(client.calls) == 7
+    print(f"✅ {sink.stats()}")
+
+async def test_bad_row_isolated():
+    print("\n--- Testing EntitySink insert split retry ---")
+    client = FakeClient()
+    sink = EntitySink(client, max_names=100, max_delay=60, retries=0)
+    for i in range(6):
+        sink.add("organization", f"Org {i}", {"registered_name": f"Org {i}", "bad": i == 4})
+    await sink.close()
+    # The failing batch is split until only the bad row is left; the other five are stored and cached
+    assert len(client.rows["organizations"]) == 5 and sink.rows_failed == 1
+    assert len(sink.ids["organization"]) == 5 and "Org 4" not in sink.ids["organization"]
+    print(f"✅ {sink.stats()}")
+
+if __name__ == "__main__":
+    asyncio.run(test_batched_resolution())
+    asyncio.run(test_bad_row_isolated())
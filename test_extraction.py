@@ -0,0 +1,42 @@
+from src.services.extraction import extract_page
+
+PAGE = """<html><head>
+<meta name="twitter:image" content="https://cdn.example.com/card.jpg">
+<link rel="canonical" href="/news/story-1?utm_source=rss">
+<script type="application/ld+json">{"@type": "NewsArticle", "image": {"url": "https://cdn.example.com/ld.jpg"}}</script>
+<script>var tracking = "not article text";</script>
+</head><body>
+<nav><a href="/">Home</a><a href="/world">World</a></nav>
+<article><h1>Eskom escalates load shedding</h1>
+<img src="/static/logo.png"><img src="/photos/station.jpg">
+<p>The power utility said several <b>generating units</b> broke down overnight, forcing it to escalate rolling blackouts.</p>
+<p>Stage 6 will be implemented from 16:00 until further notice, the utility said in a statement on Tuesday morning.</p>
+<p>Households and businesses have been urged to reduce consumption during the evening peak to help stabilise the grid.</p>
+<aside>Related: more stories</aside>
+</article><footer>All rights reserved</footer></body></html>"""
+
+def test_single_pass_extraction():
+    print("\n--- Testing single-pass extraction ---")
+    page = extract_page(PAGE.encode(), "https://m.example.com/amp/story-1")
+    assert page.image_url == "https://cdn.example.com/card.jpg"
+    assert page.canonical_url == "https://example.com/news/story-1"
+    assert page.text.startswith("Eskom escalates load shedding\nThe power utility said several generating units broke down")
+    assert "tracking" not in page.text and "Related" not in page.text and "World" not in page.text
+    print("✅ Meta, canonical and body text passed.")
+
+    no_meta = PAGE.replace('<meta name="twitter:image" content="https://cdn.example.com/card.jpg">', "")
+    assert extract_page(no_meta.encode()).image_url == "https://cdn.example.com/ld.jpg"
+    no_ld = no_meta.replace('"image": {"url": "https://cdn.example.com/ld.jpg"}', '"headline": "x"')
+    assert extract_page(no_ld.encode()).image_url == "/photos/station.jpg"
+    print("✅ Image fallbacks passed.")
+
+    # ASP.NET WebForms: the whole body sits inside one <form>
+    webforms = PAGE.replace("<body>", '<body><form id="aspnetForm" method="post">').replace("</body>", "</form></body>")
+    assert extract_page(webforms.encode()).text == page.text
+    print("✅ Form-wrapped page passed.")
+
+    assert extract_page(b"<html><body><p>Please enable cookies.</p></body></html>").text is None
+    print("✅ Short-page rejection passed.")
+
+if __name__ == "__main__":
+    test_single_pass_extraction()
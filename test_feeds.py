@@ -0,0 +1,38 @@
+import asyncio
+import src.services.feeds as feeds
+from src.models import ArticleCandidate, InputConfig
+
+class MockLog:
+    def info(self, msg): print(f"[INFO] {msg}")
+    def warning(self, msg): print(f"[WARN] {msg}")
+    def error(self, msg): print(f"[ERR] {msg}")
+
+feeds.Actor = type('Actor', (), {'log': MockLog()})
+
+async def test_stream_closes_early():
+    print("\n--- Testing early close of stream_feed_data ---")
+    config = InputConfig(niche="gaming", feedConcurrency=2)
+
+    async def fake_fetch(client, target, config, limit, cache):
+        if target["url"].endswith("-slow"):
+            await asyncio.sleep(10)
+        return [ArticleCandidate(title=target["url"], url=target["url"], source="Test")]
+
+    targets, fetch = feeds.get_feed_targets, feeds.fetch_feed
+    feeds.get_feed_targets = lambda config: [
+        {"url": f"https://example.com/{i}" + ("-slow" if i % 2 else ""), "niche": "gaming"} for i in range(50)
+    ]
+    feeds.fetch_feed = fake_fetch
+    try:
+        stream = feeds.stream_feed_data(config)
+        first = await stream.__anext__()
+        await asyncio.sleep(0.05)  # fast producers fill the queue, slow ones are still downloading
+        # What run_stream does once maxArticles is reached: cancelling the downloads must not hang
+        await asyncio.wait_for(stream.aclose(), timeout=5)
+    finally:
+        feeds.get_feed_targets, feeds.fetch_feed = targets, fetch
+    assert len(first) == 1
+    print("✅ Stream closed with a full queue.")
+
+if __name__ == "__main__":
+    asyncio.run(test_stream_closes_early())
@@ -12,6 +12,7 @@ sys.modules["supabase.client"] = mock_supabase
 
 from src.services.ingestor import SupabaseIngestor
 from src.models import ArticleCandidate, AnalysisResult
+from src.services.urls import dedup_hash
 
 # Mock Actor
 class MockLog:
@@ -91,5 +92,44 @@ async def test_ingestion_plumbing():
 
     print("\n🎉 Logic Verification Complete!")
 
+def test_prepass_uses_recorded_canonical():
+    print("\n--- Testing pre-pass with a recorded rel=canonical ---")
+    feed_url = "https://example.com/feed-link"
+    stored = {
+        ("ai_intelligence", "feed_items"): [
+            {"dedup_hash": dedup_hash(feed_url), "metadata": {"canonical_url": "https://example.com/story"}}
+        ],
+        ("ai_intelligence", "tech"): [{"url": "https://example.com/story"}],
+    }
+
+    class Query:
+        def __init__(self, rows):
+            self.rows = rows
+        def select(self, columns):
+            return self
+        def in_(self, column, values):
+            self.rows = [r for r in self.rows if r.get(column) in values]
+            return self
+        def execute(self):
+            return type("Res", (), {"data": self.rows})
+
+    class Client:
+        def schema(self, name):
+            self.name = name
+            return self
+        def table(self, name):
+            return Query(stored.get((self.name, name), []))
+
+    ingestor = SupabaseIngestor()
+    ingestor.supabase = Client()
+    articles = [
+        ArticleCandidate(title="Seen before", url=feed_url, source="TestRss"),
+        ArticleCandidate(title="New", url="https://example.com/other", source="TestRss"),
+    ]
+    fresh = ingestor.filter_existing(articles, ["tech", "tech"])
+    assert [a.title for a in fresh] == ["New"], fresh
+    print("✅ Article stored under its canonical URL was skipped.")
+
 if __name__ == "__main__":
     asyncio.run(test_ingestion_plumbing())
+    test_prepass_uses_recorded_canonical()
@@ -18,7 +18,7 @@ def main():
     
     print("Testing LLM analysis with GitHub Models...")
     try:
-        result = analyze_content(test_content, niche="politics")
+        result = asyncio.run(analyze_content(test_content, niche="politics"))
         print("\n--- Result ---")
         print(f"Sentiment: {result.sentiment}")
         print(f"Category: {result.category}")
@@ -0,0 +1,29 @@
+from src.services.metrics import Metrics
+
+def test_report_and_prometheus():
+    print("\n--- Testing Metrics ---")
+    metrics = Metrics()
+    for seconds in (0.02, 0.04, 0.3, 1.2):
+        metrics.observe("llm_request_seconds", seconds, model="gemma:free", outcome="ok")
+    metrics.observe("db_seconds", 0.01, table="ai_intelligence.feed_items", method="POST")
+    metrics.inc("llm_tokens_total", 900, model="gemma:free", kind="prompt")
+    metrics.inc("cache_lookups_total", 3, cache="analysis", result="hit")
+    metrics.inc("cache_lookups_total", 1, cache="analysis", result="miss")
+
+    report = metrics.report()
+    llm = report["latency"]["llm_request_seconds"]["model=gemma:free,outcome=ok"]
+    assert llm["count"] == 4 and llm["max_ms"] == 1200.0
+    assert report["counters"]["llm_tokens_total"] == {"kind=prompt,model=gemma:free": 900}
+    assert report["cache_hit_rate"] == {"analysis": 0.75}
+
+    text = metrics.prometheus()
+    assert '# TYPE niche_llm_request_seconds histogram' in text
+    # Cumulative buckets: two samples at or under 50 ms, all four under +Inf
+    assert 'niche_llm_request_seconds_bucket{model="gemma:free",outcome="ok",le="0.05"} 2' in text
+    assert 'niche_llm_request_seconds_bucket{model="gemma:free",outcome="ok",le="+Inf"} 4' in text
+    assert 'niche_llm_request_seconds_count{model="gemma:free",outcome="ok"} 4' in text
+    assert 'niche_llm_tokens_total{kind="prompt",model="gemma:free"} 900' in text
+    print(f"✅ {len(text.splitlines())} Prometheus lines, hit rate {report['cache_hit_rate']}")
+
+if __name__ == "__main__":
+    test_report_and_prometheus()
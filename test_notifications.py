@@ -0,0 +1,41 @@
+import asyncio
+from aiohttp import web
+import src.services.notifications as notifications
+from src.services.notifications import AlertDispatcher
+
+class MockLog:
+    def info(self, msg): print(f"[INFO] {msg}")
+    def warning(self, msg): print(f"[WARN] {msg}")
+    def error(self, msg): print(f"[ERR] {msg}")
+
+notifications.Actor = type('Actor', (), {'log': MockLog()})
+
+async def test_malformed_reset_header_not_reposted():
+    print("\n--- Testing Discord rate-limit headers after a delivered message ---")
+    posts = []
+
+    async def webhook(request):
+        posts.append(await request.json())
+        # Bucket empty, with a reset value that isn't a number
+        return web.Response(status=204, headers={"X-RateLimit-Remaining": "0", "X-RateLimit-Reset-After": "soon"})
+
+    app = web.Application()
+    app.router.add_post("/webhook", webhook)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    try:
+        dispatcher = AlertDispatcher(f"http://127.0.0.1:{port}/webhook", linger=0)
+        dispatcher.send({"category": "Launch", "sentiment": "High Hype", "url": "https://example.com/1"})
+        await dispatcher.close(timeout=5)
+    finally:
+        await runner.cleanup()
+    # Delivered once; the bad header only falls back to a 1s pause
+    assert len(posts) == 1, len(posts)
+    assert dispatcher.sent == 1 and dispatcher.dropped == 0
+    print(f"✅ One post, {dispatcher.messages} message sent.")
+
+if __name__ == "__main__":
+    asyncio.run(test_malformed_reset_header_not_reposted())
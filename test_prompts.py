@@ -0,0 +1,28 @@
+from src.services.prompts import PromptRegistry, NICHE_FIELDS
+
+def test_trimmed_schemas():
+    print("\n--- Testing per-niche prompt registry ---")
+    registry = PromptRegistry()
+    crypto = registry.get("crypto")
+    general = registry.get("general")
+
+    assert "token_symbol" in crypto.schema.model_fields
+    assert "vehicle_make" not in crypto.schema.model_fields
+    assert "listing_price" not in crypto.system_prompt
+    assert all(f in general.schema.model_fields for fields in NICHE_FIELDS.values() for f in fields)
+    assert crypto.tokens < general.tokens
+    print(f"crypto={crypto.tokens} tokens, general={general.tokens} tokens")
+    print("✅ Trimmed schemas passed.")
+
+    # Re-routing a tech article to crypto needs the crypto fields; 'general' already has them
+    assert not registry.get("tech").covers("crypto")
+    assert general.covers("crypto") and crypto.covers("crime")
+    print("✅ Re-route coverage passed.")
+
+    # Built once: the same object is served again, with a stable version
+    assert registry.get("CRYPTO") is crypto
+    assert PromptRegistry().get("crypto").version == crypto.version
+    print("✅ Registry caching passed.")
+
+if __name__ == "__main__":
+    test_trimmed_schemas()
@@ -0,0 +1,72 @@
+import asyncio
+import time
+import httpx
+
+import src.services.search as search
+from src.services.ratelimit import TokenBucket, CircuitBreaker
+from src.services.search import BraveKey
+
+def test_token_bucket_spacing():
+    print("\n--- Testing TokenBucket ---")
+    bucket = TokenBucket(rate=2.0, capacity=1.0)
+    assert bucket.reserve() == 0.0                 # burst token
+    assert abs(bucket.reserve() - 0.5) < 0.05      # next slot in 1/rate seconds
+    assert bucket.reserve(max_wait=0.5) is None    # would wait ~1s: refused, nothing taken
+    bucket.observe(remaining=0, reset_in=30)
+    assert bucket.reserve(max_wait=5) is None      # provider says quota is exhausted
+    print("✅ Token bucket passed.")
+
+def test_circuit_breaker_recovers():
+    print("\n--- Testing CircuitBreaker ---")
+    breaker = CircuitBreaker(threshold=2, cooldown=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()          # half-open probe
+    assert not breaker.allow()      # only one probe at a time
+    breaker.record_success()
+    assert breaker.state == "closed"
+    print("✅ Circuit breaker passed.")
+
+def test_brave_quota_headers():
+    print("\n--- Testing Brave quota headers ---")
+    key = BraveKey("BRAVE_API_KEY", "token", rate=1.0)
+    assert key.observe({"x-ratelimit-remaining": "1, 1500", "x-ratelimit-reset": "1, 86400"}) is None
+    assert key.quota == 1500
+    # Monthly quota used up: cool down until the monthly reset
+    assert key.observe({"x-ratelimit-remaining": "0, 0", "x-ratelimit-reset": "1, 86400"}) == 86400
+    # Per-second 429: short cooldown
+    assert key.observe({"x-ratelimit-remaining": "0, 900", "x-ratelimit-reset": "1, 86400"}, limited=True) == 1.0
+    print("✅ Brave quota headers passed.")
+
+async def test_cancelled_probe_released():
+    print("\n--- Testing a cancelled half-open probe ---")
+    key = BraveKey("BRAVE_API_KEY", "token", rate=100.0)
+    key.breaker.trip(0.01)
+    await asyncio.sleep(0.02)
+
+    async def hang(request):
+        await asyncio.sleep(60)
+
+    keys, client = search._keys, search._client
+    search._keys, search._client = [key], httpx.AsyncClient(transport=httpx.MockTransport(hang))
+    try:
+        probe = asyncio.create_task(search.perform_brave_request("web/search", {"q": "x"}))
+        await asyncio.sleep(0.05)
+        assert key.breaker.probing
+        probe.cancel()
+        await asyncio.gather(probe, return_exceptions=True)
+    finally:
+        await search._client.aclose()
+        search._keys, search._client = keys, client
+    # The interrupted probe must not leave the breaker rejecting everything
+    assert key.breaker.allow()
+    print("✅ Cancelled probe released.")
+
+if __name__ == "__main__":
+    test_token_bucket_spacing()
+    test_circuit_breaker_recovers()
+    test_brave_quota_headers()
+    asyncio.run(test_cancelled_probe_released())
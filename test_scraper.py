@@ -0,0 +1,92 @@
+import asyncio
+import httpx
+import src.services.scraper as scraper
+from src.services.scraper import scrape_article_content, configure_scraper, SCRAPE_STATS
+
+class MockLog:
+    def info(self, msg): print(f"[INFO] {msg}")
+    def warning(self, msg): print(f"[WARN] {msg}")
+    def error(self, msg): print(f"[ERR] {msg}")
+
+scraper.Actor = type('Actor', (), {'log': MockLog()})
+
+CHUNK = 16 * 1024
+ARTICLE = "<html><body><article>" + "".join(
+    f"<p>Paragraph {i}: the minister said the new rail line would open next year.</p>" for i in range(20)
+) + "</article>"
+
+def page_stream(head: str, filler_chunks: int):
+    """A chunked (no Content-Length) body: `head`, then filler the scraper should not need."""
+    async def chunks():
+        yield head.encode()
+        for _ in range(filler_chunks):
+            yield b"<script>" + b"x" * (CHUNK - 17) + b"</script>"
+    return chunks()
+
+def use_transport(handler):
+    scraper._client = httpx.AsyncClient(transport=httpx.MockTransport(handler), follow_redirects=True)
+    for key in SCRAPE_STATS:
+        SCRAPE_STATS[key] = 0
+
+async def test_byte_ceiling_and_early_stop():
+    print("\n--- Testing scraper byte ceiling and early stop ---")
+    configure_scraper(max_bytes=64 * 1024)
+    total = 64 * CHUNK # 1 MB, far past the 64 KB ceiling
+
+    # No closing </article>: reading stops at the ceiling
+    use_transport(lambda request: httpx.Response(200, headers={"content-type": "text/html"}, content=page_stream("<html><body><div>", 64)))
+    await scrape_article_content("https://news.example/capped", run_test_mode=False)
+    assert SCRAPE_STATS["capped"] == 1
+    assert 64 * 1024 <= SCRAPE_STATS["bytes_read"] < 64 * 1024 + 4 * CHUNK, SCRAPE_STATS
+    print(f"✅ Capped after {SCRAPE_STATS['bytes_read']} of {total} bytes.")
+
+    # Article body closed early: stops at the first parse step, well before the ceiling,
+    # and estimates what it skipped (no Content-Length)
+    configure_scraper(max_bytes=512 * 1024)
+    use_transport(lambda request: httpx.Response(200, headers={"content-type": "text/html"}, content=page_stream(ARTICLE, 64)))
+    page = await scrape_article_content("https://news.example/early", run_test_mode=False)
+    assert page.text and "rail line" in page.text
+    assert SCRAPE_STATS["early_stops"] == 1 and SCRAPE_STATS["bytes_read"] < 128 * 1024
+    assert SCRAPE_STATS["bytes_saved_estimated"] == 512 * 1024 - SCRAPE_STATS["bytes_read"]
+    print(f"✅ Early stop: {scraper.scrape_stats()}")
+    await scraper.close_scraper()
+    configure_scraper()
+
+async def test_non_html_rejected():
+    print("\n--- Testing content-type rejection ---")
+    pdf = b"%PDF-1.7" + b"0" * 500_000
+    use_transport(lambda request: httpx.Response(200, headers={"content-type": "application/pdf"}, content=pdf))
+    page = await scrape_article_content("https://news.example/report.pdf", run_test_mode=False)
+    assert page.text is None
+    assert SCRAPE_STATS["rejected"] == 1 and SCRAPE_STATS["bytes_read"] == 0
+    assert SCRAPE_STATS["bytes_saved"] == len(pdf)
+    print("✅ Non-HTML rejected before the body was read.")
+    await scraper.close_scraper()
+
+async def test_busy_host_does_not_block_others():
+    print("\n--- Testing per-host limits without head-of-line blocking ---")
+    configure_scraper(max_connections=2, per_host=1)
+
+    async def handler(request):
+        if request.url.host == "busy.example":
+            await asyncio.sleep(0.2)
+        return httpx.Response(200, headers={"content-type": "text/html"}, content=ARTICLE.encode() + b"</body></html>")
+
+    use_transport(handler)
+    loop = asyncio.get_running_loop()
+    busy = [asyncio.create_task(scrape_article_content(f"https://busy.example/{i}", run_test_mode=False)) for i in range(6)]
+    await asyncio.sleep(0)
+    started = loop.time()
+    page = await scrape_article_content("https://quiet.example/story", run_test_mode=False)
+    waited = loop.time() - started
+    # Requests queued on the busy host hold no slot the quiet host needs
+    assert page.text and waited < 0.15, waited
+    await asyncio.gather(*busy)
+    print(f"✅ Quiet host answered after {waited * 1000:.0f} ms while the busy host was queued.")
+    await scraper.close_scraper()
+    configure_scraper()
+
+if __name__ == "__main__":
+    asyncio.run(test_byte_ceiling_and_early_stop())
+    asyncio.run(test_non_html_rejected())
+    asyncio.run(test_busy_host_does_not_block_others())
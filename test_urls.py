@@ -0,0 +1,47 @@
+import feedparser
+from src.services.feeds import parse_feed_entries
+from src.services.urls import canonicalize_url, dedup_hash, resolve_canonical
+
+def test_variants_share_key():
+    print("\n--- Testing URL canonicalization ---")
+    base = "https://www.news24.com/news24/southafrica/news/eskom-stage-6-20250101"
+    variants = [
+        "http://news24.com/news24/southafrica/news/eskom-stage-6-20250101",
+        "https://www.news24.com/news24/southafrica/news/eskom%2Dstage%2D6%2D20250101",
+        base + "?utm_source=rss&utm_medium=feed",
+        base + "/#comments",
+        "http://m.news24.com/news24/southafrica/news/eskom-stage-6-20250101",
+        base + "/amp",
+        "https://www-news24-com.cdn.ampproject.org/c/s/www.news24.com/news24/southafrica/news/eskom-stage-6-20250101/amp",
+    ]
+    for url in variants:
+        assert canonicalize_url(url) == canonicalize_url(base), url
+        assert dedup_hash(url) == dedup_hash(base)
+    canonical = "https://news24.com/news24/southafrica/news/eskom-stage-6-20250101"
+    assert canonicalize_url(base) == canonical
+    assert canonicalize_url(base + "?utm_campaign=x&page=2&id=7") == canonical + "?id=7&page=2"
+    assert canonicalize_url(base + "?id=7") != canonicalize_url(base + "?id=8")
+    print("✅ Variants share one key.")
+
+def test_rel_canonical():
+    print("\n--- Testing rel=canonical resolution ---")
+    assert resolve_canonical("https://iol.co.za/amp/x", "/news/x?utm_source=tw") == "https://iol.co.za/news/x"
+    assert resolve_canonical("https://iol.co.za/news/x", "https://iol.co.za/") is None
+    print("✅ rel=canonical passed.")
+
+def test_feed_link_kept():
+    print("\n--- Testing feed links are fetched as given ---")
+    link = "http://www.example.co.za/news/story-1?utm_source=rss"
+    feed = feedparser.parse(
+        f"<rss><channel><title>T</title><item><title>Story</title><link>{link}</link></item></channel></rss>"
+    )
+    [article] = parse_feed_entries(feed, "general")
+    # http-only or www-only sites must get the link the feed gave; the canonical form is a key only
+    assert article.url == link
+    assert canonicalize_url(article.url) == "https://example.co.za/news/story-1"
+    print("✅ Feed link kept; canonical key derived from it.")
+
+if __name__ == "__main__":
+    test_variants_share_key()
+    test_rel_canonical()
+    test_feed_link_kept()
@@ -0,0 +1,33 @@
+import asyncio
+from src.services.writer import BulkWriter
+from fake_supabase import FakeClient
+
+async def test_grouping_and_dedup():
+    print("\n--- Testing BulkWriter grouping ---")
+    client = FakeClient()
+    writer = BulkWriter(client, max_rows=50, max_delay=60)
+    for i in range(10):
+        writer.add("ai_intelligence", "feed_items", {"dedup_hash": f"h{i}", "summary": "s"}, "dedup_hash")
+    # Same conflict key again: the later row wins, one statement
+    writer.add("ai_intelligence", "feed_items", {"dedup_hash": "h0", "summary": "newer"}, "dedup_hash")
+    writer.add("crime_intelligence", "incidents", {"source_url": "u1", "title": "t"}, "source_url")
+    await writer.close()
+    assert sorted(client.calls) == [("feed_items", "upsert", 10), ("incidents", "upsert", 1)], client.calls
+    assert any(row["summary"] == "newer" for row in client.rows["feed_items"] if row["dedup_hash"] == "h0")
+    print(f"✅ {writer.stats()}")
+
+async def test_full_batch_and_bad_row():
+    print("\n--- Testing BulkWriter size flush and split retry ---")
+    client = FakeClient()
+    writer = BulkWriter(client, max_rows=8, max_delay=60, retries=0)
+    for i in range(8):
+        writer.add("ai_intelligence", "feed_items", {"dedup_hash": f"h{i}", "bad": i == 5}, "dedup_hash")
+    await asyncio.sleep(0.1)  # full batch is written without waiting for close()
+    assert client.calls and client.calls[0] == ("feed_items", "upsert", 8)
+    await writer.close()
+    assert len(client.rows["feed_items"]) == 7 and writer.rows_failed == 1
+    print(f"✅ {writer.stats()}")
+
+if __name__ == "__main__":
+    asyncio.run(test_grouping_and_dedup())
+    asyncio.run(test_full_batch_and_bad_row())
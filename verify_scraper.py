@@ -23,10 +23,10 @@ def test_scraper():
     # Or just use the Test Mode = True
     
     print("1. Testing Test Mode...")
-    content, img = scrape_article_content("http://foo.bar", run_test_mode=True)
-    print(f"Content: {content}")
-    print(f"Image: {img}")
-    assert img == "https://placehold.co/600x400/png"
+    page = asyncio.run(scrape_article_content("http://foo.bar", run_test_mode=True))
+    print(f"Content: {page.text}")
+    print(f"Image: {page.image_url}")
+    assert page.image_url == "https://placehold.co/600x400/png"
     print("✅ Test Mode Passed")
 
     # If we could run real mode, we would.
@@ -35,7 +35,7 @@ def test_scraper():
 
 def test_brave_backfill():
     print("\n--- Testing Brave Backfill (Test Mode) ---")
-    img = find_relevant_image("Test Query", run_test_mode=True)
+    img = asyncio.run(find_relevant_image("Test Query", run_test_mode=True))
     print(f"Brave Image: {img}")
     assert "placehold.co" in img
     print("✅ Brave Test Mode Passed")